@@ -0,0 +1,124 @@
+"""
+Async HTTP fetch engine for the requests/BeautifulSoup scraper
+- One shared aiohttp connection pool for every URL
+- Per-host pacing and concurrency from rate_control.RateController, which
+  adapts to each host's latency and 429/5xx responses (AIMD)
+- Retry with exponential backoff (honours Retry-After on 429/503)
+- Optional shared HttpCache: fresh pages skip the network, stale ones are
+  revalidated with conditional headers
+"""
+
+import asyncio
+import random
+
+import aiohttp
+
+from http_cache import entry_text
+from rate_control import RateController, retry_after_of
+
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class AsyncFetcher:
+    """
+    Fetch many pages concurrently while staying polite per host
+    - concurrency: total open connections
+    - per_host: most concurrent requests to one host
+    - rate / burst: starting requests per second and requests in flight per
+      host, when no rate_control is given (it adapts from there)
+    - rate_control: a shared RateController, e.g. rate_control.shared()
+    - retries / backoff: attempts after the first, base delay in seconds
+    """
+
+    def __init__(self, headers=None, concurrency=10, per_host=4, rate=2.0, burst=4,
+                 retries=3, backoff=1.0, timeout=15, cache=None, rate_control=None):
+        self.headers = headers or {}
+        self.concurrency = concurrency
+        self.per_host = per_host
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.cache = cache
+        self.rate_control = rate_control or RateController(
+            start_delay=1.0 / rate, min_delay=min(0.25, 1.0 / rate),
+            start_concurrency=min(burst, per_host), max_concurrency=per_host
+        )
+
+    def retry_delay(self, attempt, response=None):
+        """Retry-After when the server sent one, else exponential backoff with jitter"""
+        if response is not None:
+            retry_after = response.headers.get('Retry-After', '')
+            if retry_after.isdigit():
+                return float(retry_after)
+        return self.backoff * (2 ** attempt) + random.uniform(0, self.backoff)
+
+    async def fetch(self, session, url):
+        """HTML for one URL, None once every attempt has failed"""
+        entry = self.cache.get(url) if self.cache else None
+        if entry is not None and self.cache.is_fresh(entry):
+            print(f"📦 cached {url}")
+            return entry_text(entry)
+        conditional = self.cache.conditional_headers(entry) if self.cache else {}
+        
+        for attempt in range(self.retries + 1):
+            response = None
+            try:
+                async with self.rate_control.request_async(url) as outcome:
+                    async with session.get(url, allow_redirects=True, headers=conditional) as response:
+                        outcome['status'] = response.status
+                        outcome['retry_after'] = retry_after_of(response.headers)
+                        if response.status == 304 and entry is not None:
+                            self.cache.refresh(url, dict(response.headers))
+                            print(f"✅ 304 {url} (cached copy still current)")
+                            return entry_text(entry)
+                        if response.status in RETRY_STATUSES:
+                            raise aiohttp.ClientResponseError(
+                                response.request_info, response.history,
+                                status=response.status, message=response.reason
+                            )
+                        response.raise_for_status()
+                        html = await response.text()
+                        if self.cache:
+                            self.cache.store(url, response.status, dict(response.headers), await response.read())
+                        print(f"✅ {response.status} {url} ({len(html):,} chars)")
+                        return html
+            except aiohttp.ClientResponseError as e:
+                if e.status not in RETRY_STATUSES or attempt == self.retries:
+                    print(f"❌ HTTP Error {e.status}: {url}")
+                    return None
+                error = f"HTTP {e.status}"
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                if attempt == self.retries:
+                    print(f"❌ Failed: {url} ({type(e).__name__})")
+                    return None
+                error = type(e).__name__
+            delay = self.retry_delay(attempt, response)
+            print(f"   ↻ {error} on {url}, retry {attempt + 1}/{self.retries} in {delay:.1f}s")
+            await asyncio.sleep(delay)
+        return None
+
+    async def fetch_each_async(self, urls, on_page):
+        connector = aiohttp.TCPConnector(limit=self.concurrency, limit_per_host=self.per_host)
+        timeout = aiohttp.ClientTimeout(total=self.timeout)
+        async with aiohttp.ClientSession(headers=self.headers, connector=connector, timeout=timeout) as session:
+            async def fetch_one(url):
+                return url, await self.fetch(session, url)
+            for done in asyncio.as_completed([fetch_one(url) for url in urls]):
+                url, html = await done
+                on_page(url, html)
+
+    def fetch_each(self, urls, on_page):
+        """
+        Fetch every URL concurrently and call on_page(url, html or None) as
+        soon as each one completes, so a page is handled and dropped instead of
+        waiting in memory for the slowest fetch. on_page runs on the event
+        loop: keep it to parsing and saving the page
+        """
+        asyncio.run(self.fetch_each_async(list(urls), on_page))
+
+    def fetch_all(self, urls):
+        """{url: html or None} for every URL, fetched concurrently"""
+        pages = {}
+        self.fetch_each(urls, pages.__setitem__)
+        return pages
@@ -0,0 +1,112 @@
+"""
+Measure what a page load profile saves per store page load
+
+Loads each store URL several times with every profile (load_profile.PROFILES)
+the way the scraper does - driver.get, page ready, coupon buttons stable -
+and reports milliseconds, bytes over the wire (CDP Network.loadingFinished
+encodedDataLength, so cross-origin responses count too), requests and
+blocked requests per load, plus the saving of each profile against 'full'.
+
+Usage:
+    python benchmarks/bench_load_profile.py URL [URL ...] [--loads 3] [--show-browser]
+    python benchmarks/bench_load_profile.py --fixtures    # offline corpus (no images, mostly a smoke test)
+"""
+
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+from load_profile import PROFILES
+from metrics import percentile
+from scraper_fixed_modal import OFFER_BUTTON_XPATH, PROMO_BUTTON_XPATH, create_driver
+from waits import Waiter
+
+
+def network_totals(driver):
+    """Bytes, finished and blocked requests since the last call (drains the performance log)"""
+    received = 0
+    requests = 0
+    blocked = 0
+    for entry in driver.get_log('performance'):
+        message = json.loads(entry['message'])['message']
+        if message['method'] == 'Network.loadingFinished':
+            received += message['params'].get('encodedDataLength', 0)
+            requests += 1
+        elif message['method'] == 'Network.loadingFailed' and message['params'].get('blockedReason'):
+            blocked += 1
+    return received, requests, blocked
+
+
+def measure(profile, urls, loads, headless):
+    """{url: [(ms, bytes, requests, blocked) per load]} for one profile"""
+    driver = create_driver(headless=headless, profile=profile, network_log=True)
+    results = {}
+    try:
+        wait = Waiter(driver)
+        for url in urls:
+            network_totals(driver)
+            runs = []
+            for _ in range(loads):
+                started = time.perf_counter()
+                driver.get(url)
+                wait.page_ready()
+                wait.count_stable(PROMO_BUTTON_XPATH + " | " + OFFER_BUTTON_XPATH, settle=0.5)
+                elapsed = (time.perf_counter() - started) * 1000
+                runs.append((elapsed,) + network_totals(driver))
+            results[url] = runs
+    finally:
+        driver.quit()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare page load profiles on store pages")
+    parser.add_argument('urls', nargs='*', help="store page URLs")
+    parser.add_argument('--fixtures', action='store_true', help="use the offline fixture corpus")
+    parser.add_argument('--loads', type=int, default=3, help="loads per URL and profile (the first one is cold)")
+    parser.add_argument('--profiles', nargs='+', default=sorted(PROFILES), choices=sorted(PROFILES))
+    parser.add_argument('--show-browser', action='store_true', help="run Chrome with a visible window")
+    args = parser.parse_args()
+
+    server = None
+    urls = args.urls
+    if args.fixtures:
+        from fixture_server import FixtureServer
+        server = FixtureServer().start()
+        urls = urls + server.store_urls()
+    if not urls:
+        parser.error("give store URLs or --fixtures")
+
+    try:
+        totals = {}
+        print(f"{'profile':8s} {'p50 ms':>8s} {'mean ms':>8s} {'KB/load':>9s} {'requests':>9s} {'blocked':>8s}  url")
+        for name in args.profiles:
+            results = measure(name, urls, args.loads, not args.show_browser)
+            runs = [run for url_runs in results.values() for run in url_runs]
+            totals[name] = (sum(r[0] for r in runs) / len(runs), sum(r[1] for r in runs) / len(runs))
+            for url, url_runs in results.items():
+                n = len(url_runs)
+                print(f"{name:8s} {percentile([r[0] for r in url_runs], 50):8.0f} "
+                      f"{sum(r[0] for r in url_runs) / n:8.0f} {sum(r[1] for r in url_runs) / n / 1024:9.1f} "
+                      f"{sum(r[2] for r in url_runs) / n:9.1f} {sum(r[3] for r in url_runs) / n:8.1f}  {url}")
+    finally:
+        if server:
+            server.stop()
+
+    print("\nStore tab loads only. The scraper applies the same blocking to every voucher tab it opens "
+          "(setBlockedURLs per tab; images also blocked browser-wide), so those loads save as well.")
+    if 'full' in totals:
+        full_ms, full_bytes = totals['full']
+        print()
+        for name, (ms, received) in totals.items():
+            if name != 'full':
+                print(f"{name}: saves {full_ms - ms:.0f} ms and {(full_bytes - received) / 1024:.1f} KB per page load "
+                      f"({(1 - received / full_bytes) * 100 if full_bytes else 0:.0f}% of bytes)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,104 @@
+"""
+Benchmark TravelokaScraper.parse_items on large pages
+
+Compares the lxml single-pass parser against the previous BeautifulSoup
+version (kept below as the baseline) and checks both extract the same items.
+
+Usage:
+    python benchmarks/bench_parse_items.py                  # synthetic pages
+    python benchmarks/bench_parse_items.py saved_page.html  # saved store pages
+"""
+
+import io
+import re
+import sys
+import time
+from contextlib import redirect_stdout
+from pathlib import Path
+
+from bs4 import BeautifulSoup
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from main_old import TravelokaScraper
+
+
+def baseline_parse_items(scraper, html):
+    """parse_items as it was before the lxml rewrite (html.parser + ancestor get_text)"""
+    soup = BeautifulSoup(html, 'html.parser')
+    for h3 in soup.find_all('h3'):
+        description = h3.get_text(strip=True)
+        if not description or len(description) < 10:
+            continue
+        parent = h3
+        full_text = description
+        for _ in range(10):
+            parent = parent.find_parent()
+            if not parent:
+                break
+            parent_text = parent.get_text()
+            if re.search(r'\d{1,2}/\d{1,2}/\d{4}', parent_text):
+                full_text = parent_text
+                break
+        code = scraper._extract_code(description, full_text)
+        date_match = re.search(r'(\d{1,2}/\d{1,2}/\d{4})', full_text)
+        expiry = date_match.group(1) if date_match else 'N/A'
+        if code != 'N/A' and expiry != 'N/A':
+            scraper.coupons.append({'type': 'coupon', 'description': description, 'code': code,
+                                    'expiry_date': expiry, 'scraped_at': ''})
+        elif code != 'N/A':
+            scraper.offers.append({'type': 'offer', 'description': description, 'discount': code,
+                                   'scraped_at': ''})
+    scraper._remove_duplicates()
+
+
+def synthetic_page(cards, depth=8):
+    """Store-like page: `cards` coupon cards, each nested `depth` divs deep"""
+    parts = ['<html><head><title>Store</title><script>var x = "1/1/2020";</script></head><body>']
+    parts.append('<div class="page"><div class="list">')
+    for i in range(cards):
+        parts.append('<div class="_6tavkoa">' + '<div class="w">' * depth)
+        parts.append(f'<span>{10 + i % 40}% OFF</span>')
+        parts.append(f'<h3>Enjoy {10 + i % 40}% off on booking number {i}</h3>')
+        parts.append('<p>' + 'Terms and conditions apply to this offer. ' * 5 + '</p>')
+        if i % 3:
+            parts.append(f'<span class="az57m4c">Expiry: {1 + i % 28}/{1 + i % 12}/2025</span>')
+        parts.append('<div role="button">SEE PROMO CODE</div>')
+        parts.append('</div>' * depth + '</div>')
+    parts.append('</div></div></body></html>')
+    return ''.join(parts)
+
+
+def run_parser(parse, html, repeat):
+    """Best-of-`repeat` wall time and the scraper holding the results"""
+    best = None
+    for _ in range(repeat):
+        scraper = TravelokaScraper()
+        started = time.perf_counter()
+        with redirect_stdout(io.StringIO()):
+            parse(scraper, html)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best, scraper
+
+
+def items(scraper):
+    return ([(c['description'], c['code'], c['expiry_date']) for c in scraper.coupons],
+            [(o['description'], o['discount']) for o in scraper.offers])
+
+
+def bench(name, html, repeat=3):
+    old_time, old = run_parser(baseline_parse_items, html, repeat)
+    new_time, new = run_parser(lambda s, h: s.parse_items(h), html, repeat)
+    same = "same" if items(old) == items(new) else "DIFFERENT"
+    print(f"{name:28s} {len(html) / 1024:9.0f} KB  bs4 {old_time * 1000:9.1f} ms  "
+          f"lxml {new_time * 1000:8.1f} ms  x{old_time / new_time:6.1f}  "
+          f"{len(new.coupons):4d} coupons {len(new.offers):4d} offers  results {same}")
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1:
+        for path in sys.argv[1:]:
+            bench(Path(path).name, Path(path).read_text(encoding='utf-8', errors='replace'))
+    else:
+        for cards in (50, 200, 800):
+            bench(f"synthetic {cards} cards", synthetic_page(cards))
@@ -0,0 +1,113 @@
+"""
+Benchmark TravelokaCouponSpider.parse_with_text on large pages
+
+Compares the single-pass version against the previous per-title lookahead
+loop (kept below as the baseline), reports items/sec and checks both yield
+the same items.
+
+Usage:
+    python benchmarks/bench_parse_with_text.py                  # synthetic pages
+    python benchmarks/bench_parse_with_text.py saved_page.html  # saved store pages
+"""
+
+import sys
+import time
+from pathlib import Path
+
+from scrapy.http import HtmlResponse, Request
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from extraction_rules import DISCOUNT_MARKER, TITLE_KEYWORDS
+from traveloka.spiders.traveloka_spider import TravelokaCouponSpider
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+from bench_parse_items import synthetic_page
+
+
+def baseline_parse_with_text(response):
+    """parse_with_text as it was before the single-pass rewrite"""
+    from datetime import datetime
+    all_text = response.xpath('//text()').getall()
+    coupon_patterns = []
+    offer_patterns = []
+    for i, text in enumerate(all_text):
+        text_lower = text.lower().strip()
+        if TITLE_KEYWORDS.search(text_lower):
+            if len(text) > 10 and len(text) < 250:
+                code = 'N/A'
+                expiry = 'N/A'
+                for j in range(i+1, min(i+10, len(all_text))):
+                    next_text = all_text[j].strip()
+                    if DISCOUNT_MARKER.search(next_text):
+                        code = next_text
+                        break
+                    if '/' in next_text and len(next_text) <= 15:
+                        expiry = next_text
+                if code != 'N/A' and expiry != 'N/A':
+                    coupon_patterns.append({'type': 'coupon', 'description': text.strip(), 'code': code,
+                                            'expiry_date': expiry, 'scraped_at': datetime.now().isoformat()})
+                elif code != 'N/A':
+                    offer_patterns.append({'type': 'offer', 'description': text.strip(), 'discount': code,
+                                           'scraped_at': datetime.now().isoformat()})
+    seen = set()
+    unique_items = []
+    for item in coupon_patterns + offer_patterns:
+        key = (item['type'], item['description'], item.get('code', item.get('discount')))
+        if key not in seen:
+            seen.add(key)
+            unique_items.append(item)
+    return unique_items
+
+
+def text_page(cards):
+    """Cards laid out so the title comes before its discount and expiry"""
+    parts = ['<html><body><div class="list">']
+    for i in range(cards):
+        parts.append('<div class="card">')
+        parts.append(f'<h3>Save {10 + i % 40}% on hotel booking number {i}</h3>')
+        parts.append('<p>Limited time offer for new and returning users</p>')
+        if i % 3:
+            parts.append(f'<span>Expiry: </span><span>{1 + i % 28}/{1 + i % 12}/2025</span>')
+        parts.append(f'<span>{10 + i % 40}% OFF</span>')
+        parts.append('<div role="button">SEE PROMO CODE</div></div>')
+    parts.append('</div></body></html>')
+    return ''.join(parts)
+
+
+def key(item):
+    return (item['type'], item['description'], item.get('code', item.get('discount')), item.get('expiry_date'))
+
+
+def timed(parse, html, repeat):
+    """Best-of-`repeat` wall time and the items of the last run"""
+    best = None
+    for _ in range(repeat):
+        # Fresh response each time, so parsing the HTML is part of the cost
+        url = 'https://www.cuponation.com.sg/bench'
+        response = HtmlResponse(url=url, body=html.encode('utf-8'), encoding='utf-8', request=Request(url))
+        started = time.perf_counter()
+        items = list(parse(response))
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best, items
+
+
+def bench(name, html, repeat=3):
+    spider = TravelokaCouponSpider()
+    old_time, old = timed(baseline_parse_with_text, html, repeat)
+    new_time, new = timed(spider.parse_with_text, html, repeat)
+    same = "same" if [key(i) for i in old] == [key(i) for i in new] else "DIFFERENT"
+    print(f"{name:24s} {len(html) / 1024:7.0f} KB  old {old_time * 1000:8.1f} ms "
+          f"({len(old) / old_time:8.0f} items/s)  new {new_time * 1000:7.1f} ms "
+          f"({len(new) / new_time:8.0f} items/s)  x{old_time / new_time:5.1f}  "
+          f"{len(new):4d} items  results {same}")
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1:
+        for path in sys.argv[1:]:
+            bench(Path(path).name, Path(path).read_text(encoding='utf-8', errors='replace'))
+    else:
+        for cards in (50, 200, 800):
+            bench(f"text layout {cards} cards", text_page(cards))
+            bench(f"card layout {cards} cards", synthetic_page(cards))
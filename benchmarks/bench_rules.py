@@ -0,0 +1,95 @@
+"""
+Micro-benchmark for the shared extraction rules
+
+Runs the discount, expiry and title-line rules over a corpus of card texts
+(benchmarks/card_texts.txt by default) and reports texts/sec per field,
+next to the inline re.search chains the scrapers used before, checking
+both give the same answers.
+
+Usage:
+    python benchmarks/bench_rules.py [corpus.txt] [--rounds N]
+"""
+
+import argparse
+import re
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from extraction_rules import extract_discount, extract_expiry, is_title_line
+
+
+def baseline_discount(combined):
+    """main_old._extract_code before the rule table"""
+    pct = re.search(r'(\d+)%\s*(?:OFF|off|savings)', combined)
+    if pct:
+        return f"{pct.group(1)}%OFF"
+    dollar = re.search(r'\$(\d+)\s*(?:OFF|off|savings)', combined)
+    if dollar:
+        return f"${dollar.group(1)}OFF"
+    if 'CREDITS' in combined:
+        credits = re.search(r'\$(\d+)\s*CREDITS', combined)
+        return f"${credits.group(1)}CREDITS" if credits else '$8CREDITS'
+    if 'GIFTCARD' in combined or 'GIFT CARD' in combined:
+        return 'GIFTCARD'
+    return 'N/A'
+
+
+def baseline_expiry(text):
+    match = re.search(r'(\d{1,2}/\d{1,2}/\d{4})', text)
+    return match.group(1) if match else 'N/A'
+
+
+def baseline_title_line(line):
+    """Selenium section fallback before the rule table"""
+    if re.match(r'^Expiry:', line):
+        return False
+    if re.match(r'^\d+%?\s*OFF', line):
+        return False
+    if 'Verified' in line or 'arrow' in line or 'SEE PROMO' in line:
+        return False
+    return len(line) > 20
+
+
+def load_corpus(path):
+    text = Path(path).read_text(encoding='utf-8')
+    lines = [l for l in text.splitlines() if not l.startswith('#')]
+    return [block.strip() for block in '\n'.join(lines).split('---') if block.strip()]
+
+
+def throughput(fn, inputs, rounds):
+    started = time.perf_counter()
+    for _ in range(rounds):
+        for item in inputs:
+            fn(item)
+    elapsed = time.perf_counter() - started
+    return len(inputs) * rounds / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('corpus', nargs='?', default=Path(__file__).parent / 'card_texts.txt')
+    parser.add_argument('--rounds', type=int, default=2000)
+    args = parser.parse_args()
+
+    cards = load_corpus(args.corpus)
+    lines = [l.strip() for card in cards for l in card.splitlines() if l.strip()]
+    print(f"Corpus: {len(cards)} cards, {len(lines)} lines, {args.rounds} rounds\n")
+
+    fields = [
+        ('discount', cards, baseline_discount, extract_discount),
+        ('expiry', cards, baseline_expiry, extract_expiry),
+        ('title_line', lines, baseline_title_line, is_title_line),
+    ]
+    print(f"{'field':12s} {'inline/s':>12s} {'rules/s':>12s} {'speedup':>8s}  results")
+    for name, inputs, old, new in fields:
+        mismatches = [i for i in inputs if old(i) != new(i)]
+        old_rate = throughput(old, inputs, args.rounds)
+        new_rate = throughput(new, inputs, args.rounds)
+        status = "same" if not mismatches else f"{len(mismatches)} DIFFERENT"
+        print(f"{name:12s} {old_rate:12,.0f} {new_rate:12,.0f} {new_rate / old_rate:7.2f}x  {status}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,242 @@
+"""
+Offline regression benchmark for all three scrapers
+
+Starts the fixture server (benchmarks/fixture_server.py) and runs every
+extraction path against the fixture corpus, without touching the network:
+    parse_items        main_old.TravelokaScraper on each store page
+    parse_with_text    the Scrapy spider's text parser on each store page
+    async_fetch        AsyncFetcher pulling store pages from the server
+    voucher_http       VoucherResolver fetching every voucher page
+    selenium           TravelokaCodeScraper end to end (--selenium, needs Chrome)
+For each stage it reports pages/sec, items/sec and p50/p95 latency, and
+compares the items found with benchmarks/fixtures/expected.json so changes
+in results show up next to changes in speed.
+
+Usage:
+    python benchmarks/bench_suite.py [--rounds N] [--delay S] [--selenium]
+    python benchmarks/bench_suite.py --update-expected   # after an intended change
+"""
+
+import argparse
+import io
+import json
+import sys
+import tempfile
+import time
+from contextlib import redirect_stdout
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+from fixture_server import FIXTURES, STORES, FixtureServer
+from metrics import RunMetrics, percentile
+from rate_control import RateController
+
+
+EXPECTED = FIXTURES / 'expected.json'
+# The local server needs no politeness; pacing would only hide extraction speed
+UNPACED = RateController(start_delay=0, min_delay=0, max_concurrency=100, jitter=0)
+
+
+class Stage:
+    """Timings and results of one benchmark stage"""
+
+    def __init__(self, name):
+        self.name = name
+        self.latencies = []
+        self.items = 0
+        self.pages = 0
+        self.results = {}
+        self.notes = ''
+
+    def add(self, seconds, items, key=None, result=None):
+        self.latencies.append(seconds)
+        self.pages += 1
+        self.items += items
+        if key is not None:
+            self.results[key] = result
+
+    def row(self, expected):
+        total = sum(self.latencies) or 1e-9
+        if self.name not in expected:
+            check = 'new'
+        else:
+            check = 'same' if expected[self.name] == self.results else 'DIFFERENT'
+        return (f"{self.name:16s} {self.pages:6d} {self.items:6d} {total:8.2f} "
+                f"{self.pages / total:9.1f} {self.items / total:9.1f} "
+                f"{percentile(self.latencies, 50) * 1000:8.1f} {percentile(self.latencies, 95) * 1000:8.1f}  "
+                f"{check}{'  ' + self.notes if self.notes else ''}")
+
+
+def store_pages():
+    return {path.stem: path.read_text(encoding='utf-8') for path in sorted(STORES.glob('*.html'))
+            if not path.name.endswith('.more.html')}
+
+
+def bench_parse_items(pages, rounds):
+    from main_old import TravelokaScraper
+
+    stage = Stage('parse_items')
+    for _ in range(rounds):
+        for slug, html in pages.items():
+            scraper = TravelokaScraper(use_cache=False)
+            started = time.perf_counter()
+            with redirect_stdout(io.StringIO()):
+                scraper.parse_items(html)
+            elapsed = time.perf_counter() - started
+            found = sorted([c['description'], c['code'], c['expiry_date']] for c in scraper.coupons)
+            found += sorted([o['description'], o['discount']] for o in scraper.offers)
+            stage.add(elapsed, len(found), slug, found)
+    return stage
+
+
+def bench_parse_with_text(pages, rounds, server):
+    from scrapy.http import HtmlResponse, Request
+    from traveloka.spiders.traveloka_spider import TravelokaCouponSpider
+
+    stage = Stage('parse_with_text')
+    spider = TravelokaCouponSpider()
+    for _ in range(rounds):
+        for slug, html in pages.items():
+            url = server.store_url(slug)
+            response = HtmlResponse(url=url, body=html.encode('utf-8'), encoding='utf-8', request=Request(url))
+            started = time.perf_counter()
+            items = list(spider.parse_with_text(response))
+            elapsed = time.perf_counter() - started
+            found = [[i['type'], i['description'], i.get('code', i.get('discount'))] for i in items]
+            stage.add(elapsed, len(found), slug, found)
+    return stage
+
+
+def bench_async_fetch(server, rounds):
+    from async_fetcher import AsyncFetcher
+
+    stage = Stage('async_fetch')
+    # Distinct URLs per round so every request really goes to the server
+    urls = [f"{url}?round={r}" for r in range(rounds) for url in server.store_urls()]
+    fetcher = AsyncFetcher(concurrency=10, per_host=10, rate=1000, burst=100, retries=0)
+    started = time.perf_counter()
+    with redirect_stdout(io.StringIO()):
+        pages = fetcher.fetch_all(urls)
+    elapsed = time.perf_counter() - started
+    # One gather: per-page latency is not observable, spread the wall time
+    ok = sum(1 for html in pages.values() if html)
+    for url in urls:
+        stage.add(elapsed / len(urls), 1 if pages.get(url) else 0)
+    stage.results = {'fetched': ok == len(urls)}
+    stage.notes = f"wall {elapsed:.2f}s for {len(urls)} pages"
+    return stage
+
+
+def bench_voucher_http(server, rounds):
+    from voucher_resolver import VoucherResolver
+
+    stage = Stage('voucher_http')
+    resolver = VoucherResolver(referer=server.base_url, rate=UNPACED)
+    for _ in range(rounds):
+        for slug, store in server.manifest.items():
+            found = {}
+            for n in sorted(store['vouchers'], key=int):
+                started = time.perf_counter()
+                with redirect_stdout(io.StringIO()):
+                    code = resolver.fetch_code(f"{server.base_url}/voucher/{slug}/{n}")
+                stage.add(time.perf_counter() - started, 1 if code else 0)
+                found[n] = code
+            # Client-rendered vouchers come back None (browser fallback)
+            stage.results[slug] = found
+    return stage
+
+
+def bench_selenium(server, tabs, direct):
+    from scraper_fixed_modal import TravelokaCodeScraper, create_driver
+
+    stage = Stage('selenium')
+    driver = create_driver(headless=True)
+    waits = {}
+    try:
+        for slug in server.manifest:
+            with tempfile.TemporaryDirectory() as out:
+                scraper = TravelokaCodeScraper(tab_batch_size=tabs, output_dir=out, headless=True,
+                                               direct_http=direct, incremental=False, metrics=RunMetrics(),
+                                               rate=UNPACED, http_rate=UNPACED,
+                                               # Fixture coupons stay out of the real .cache stores
+                                               state_path=Path(out) / 'cards.sqlite',
+                                               dedupe_path=Path(out) / 'dedupe.sqlite',
+                                               cache_path=Path(out) / 'http.sqlite')
+                scraper.driver = driver
+                scraper.save = lambda: None  # reports are not part of the benchmark
+                started = time.perf_counter()
+                with redirect_stdout(io.StringIO()):
+                    scraper.scrape_store(server.store_url(slug))
+                elapsed = time.perf_counter() - started
+            codes = [c['code'] for c in scraper.coupons]
+            stage.add(elapsed, len(codes), slug, codes)
+            for step, s in (scraper.wait.stats if scraper.wait else {}).items():
+                w = waits.setdefault(step, {'count': 0, 'total': 0.0, 'timeouts': 0})
+                w['count'] += s['count']
+                w['total'] += s['total']
+                w['timeouts'] += s['timeouts']
+    finally:
+        driver.quit()
+    stage.waits = waits
+    return stage
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run every scraper against the offline fixture corpus")
+    parser.add_argument('--rounds', type=int, default=20, help="passes over the corpus for the parser stages")
+    parser.add_argument('--delay', type=float, default=0.0, help="fixture server latency per request, seconds")
+    parser.add_argument('--selenium', action='store_true', help="also run the Selenium scraper (needs Chrome)")
+    parser.add_argument('--tabs', type=int, default=1, help="Selenium: coupons clicked per page load")
+    parser.add_argument('--direct', action='store_true', help="Selenium: resolve vouchers over HTTP")
+    parser.add_argument('--update-expected', action='store_true',
+                        help="store this run's results as the new expected.json")
+    args = parser.parse_args()
+
+    expected = json.loads(EXPECTED.read_text(encoding='utf-8')) if EXPECTED.exists() else {}
+    pages = store_pages()
+
+    with FixtureServer(delay=args.delay) as server:
+        stages = [
+            bench_parse_items(pages, args.rounds),
+            bench_parse_with_text(pages, args.rounds, server),
+            bench_async_fetch(server, args.rounds),
+            bench_voucher_http(server, 1),
+        ]
+        if args.selenium:
+            stages.append(bench_selenium(server, args.tabs, args.direct))
+            # The fixture manifest is the ground truth for the browser path
+            truth = {slug: store['codes'] for slug, store in server.manifest.items()}
+            expected['selenium'] = truth
+        requests_served = dict(server.requests)
+
+    # Parser results are per page, so one round is enough to compare
+    for stage in stages:
+        if stage.name in ('parse_items', 'parse_with_text'):
+            stage.results = {slug: stage.results[slug] for slug in sorted(stage.results)}
+
+    print(f"Fixture corpus: {len(pages)} store pages, server delay {args.delay * 1000:.0f} ms")
+    print(f"{'stage':16s} {'pages':>6s} {'items':>6s} {'total s':>8s} {'pages/s':>9s} {'items/s':>9s} "
+          f"{'p50 ms':>8s} {'p95 ms':>8s}  results")
+    for stage in stages:
+        print(stage.row(expected))
+
+    for stage in stages:
+        if getattr(stage, 'waits', None):
+            print("\nSelenium wait steps")
+            for step, w in sorted(stage.waits.items(), key=lambda kv: -kv[1]['total']):
+                print(f"  {step:16s} {w['count']:5d} waits {w['total']:7.2f}s  "
+                      f"mean {w['total'] / w['count'] * 1000:7.1f} ms  timeouts {w['timeouts']}")
+    print(f"\nRequests served: {requests_served}")
+
+    if args.update_expected:
+        results = {stage.name: stage.results for stage in stages if stage.name != 'selenium'}
+        EXPECTED.write_text(json.dumps(results, indent=1, ensure_ascii=False) + '\n', encoding='utf-8')
+        print(f"Updated {EXPECTED}")
+    elif any(stage.name in expected and expected[stage.name] != stage.results for stage in stages):
+        print("\nResults differ from expected.json")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
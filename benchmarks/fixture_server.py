@@ -0,0 +1,174 @@
+"""
+Local stand-in for cuponation.com.sg serving the fixture corpus
+
+Routes (everything under benchmarks/fixtures):
+    /<store>                 store page (stores/<store>.html)
+    /<store>/more            cards added by the Load More button
+    /voucher/<store>/<n>     voucher modal for card n (server-rendered, or
+                             client-rendered when its code is "js:..." in
+                             manifest.json), a redirect page for deals
+    /sitemap.xml             every store page, for the Scrapy spider
+    /robots.txt              allow all
+
+Store pages send an ETag and answer If-None-Match with 304, so the HTTP
+cache can be exercised too. --delay adds a fixed latency per request.
+
+Usage:
+    python benchmarks/fixture_server.py [--port 8765] [--delay 0.05]
+"""
+
+import hashlib
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from string import Template
+
+
+FIXTURES = Path(__file__).resolve().parent / 'fixtures'
+STORES = FIXTURES / 'stores'
+
+
+def load_manifest():
+    """{store slug: {name, vouchers, codes, offers}} describing the corpus"""
+    return json.loads((STORES / 'manifest.json').read_text(encoding='utf-8'))
+
+
+class FixtureHandler(BaseHTTPRequestHandler):
+    server_version = 'FixtureServer/1.0'
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        server = self.server
+        if server.delay:
+            time.sleep(server.delay)
+        path = self.path.split('?')[0].split('#')[0].strip('/')
+        parts = path.split('/') if path else []
+
+        if not parts:
+            links = ''.join(f'<li><a href="/{slug}">{store["name"]}</a></li>' for slug, store in server.manifest.items())
+            return self.send_page(200, f'<html><body><ul>{links}</ul></body></html>', 'index')
+        if parts == ['robots.txt']:
+            return self.send_page(200, 'User-agent: *\nAllow: /\n', 'robots', 'text/plain')
+        if parts == ['sitemap.xml']:
+            base = f'http://{self.headers.get("Host")}'
+            urls = ''.join(f'<url><loc>{base}/{slug}</loc></url>' for slug in server.manifest)
+            xml = ('<?xml version="1.0" encoding="UTF-8"?>'
+                   f'<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">{urls}</urlset>')
+            return self.send_page(200, xml, 'sitemap', 'application/xml')
+        if len(parts) == 3 and parts[0] == 'voucher' and parts[1] in server.manifest:
+            return self.send_voucher(parts[1], parts[2])
+        if parts[0] in server.manifest and len(parts) == 1:
+            return self.send_file(STORES / f'{parts[0]}.html', 'store')
+        if parts[0] in server.manifest and parts[1:] == ['more']:
+            return self.send_file(STORES / f'{parts[0]}.more.html', 'more')
+        self.send_page(404, '<html><body>Not found</body></html>', 'not_found')
+
+    def send_voucher(self, slug, n):
+        store = self.server.manifest[slug]
+        voucher = store['vouchers'].get(n)
+        if voucher is None:
+            template, route, values = 'deal.html', 'deal', {'store': store['name']}
+        else:
+            code = voucher['code']
+            js = code.startswith('js:')
+            template = 'voucher_js.html' if js else 'voucher.html'
+            route = 'voucher_js' if js else 'voucher'
+            values = {'store': store['name'], 'title': voucher['title'], 'code': code.replace('js:', '')}
+        html = Template((FIXTURES / template).read_text(encoding='utf-8')).substitute(values)
+        self.send_page(200, html, route)
+
+    def send_file(self, path, route):
+        if not path.exists():
+            return self.send_page(404, '<html><body>Not found</body></html>', 'not_found')
+        body = path.read_bytes()
+        etag = '"' + hashlib.md5(body).hexdigest() + '"'
+        if self.headers.get('If-None-Match') == etag:
+            self.server.count(route + '_304')
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.end_headers()
+            return
+        self.send_page(200, body, route, etag=etag)
+
+    def send_page(self, status, body, route, content_type='text/html', etag=None):
+        self.server.count(route)
+        if isinstance(body, str):
+            body = body.encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', f'{content_type}; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        if etag:
+            self.send_header('ETag', etag)
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class FixtureServer(ThreadingHTTPServer):
+    """
+    Fixture site on 127.0.0.1 in a background thread
+        with FixtureServer() as server:
+            server.store_url('traveloka-promo-code')
+    port=0 picks a free port; delay is seconds added to every response
+    """
+    daemon_threads = True
+    # The default backlog of 5 makes concurrent clients wait on SYN retries
+    request_queue_size = 128
+
+    def __init__(self, port=0, delay=0.0):
+        super().__init__(('127.0.0.1', port), FixtureHandler)
+        self.delay = delay
+        self.manifest = load_manifest()
+        self.requests = {}
+        self.lock = threading.Lock()
+        self.thread = None
+
+    @property
+    def base_url(self):
+        return f'http://127.0.0.1:{self.server_address[1]}'
+
+    def store_url(self, slug):
+        return f'{self.base_url}/{slug}'
+
+    def store_urls(self):
+        return [self.store_url(slug) for slug in self.manifest]
+
+    def count(self, route):
+        with self.lock:
+            self.requests[route] = self.requests.get(route, 0) + 1
+
+    def start(self):
+        self.thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Serve the fixture corpus as a local Cuponation stand-in")
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--delay', type=float, default=0.0, help="seconds of latency added per request")
+    args = parser.parse_args()
+
+    server = FixtureServer(port=args.port, delay=args.delay)
+    print(f"Serving {len(server.manifest)} stores on {server.base_url}")
+    for url in server.store_urls():
+        print(f"  {url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,42 @@
+"""
+Record a live store page into the fixture corpus
+
+Saves the server-rendered HTML of each store URL as
+benchmarks/fixtures/stores/<store>.html and adds it to manifest.json
+(without voucher codes - fill those in by hand if the Selenium stage should
+check them). Run bench_suite.py --update-expected afterwards.
+
+Usage:
+    python benchmarks/record_fixture.py https://www.cuponation.com.sg/agoda-promo-code [...]
+"""
+
+import json
+import sys
+from pathlib import Path
+from urllib.parse import urlparse
+
+import requests
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from voucher_resolver import USER_AGENTS
+from fixture_server import STORES
+
+
+def record(url, manifest):
+    slug = urlparse(url).path.strip('/').replace('/', '_') or 'report'
+    response = requests.get(url, headers={'User-Agent': USER_AGENTS[0]}, timeout=30)
+    response.raise_for_status()
+    (STORES / f'{slug}.html').write_text(response.text, encoding='utf-8')
+    manifest.setdefault(slug, {'name': slug, 'vouchers': {}, 'codes': [], 'offers': 0})
+    print(f"Recorded {url} -> fixtures/stores/{slug}.html ({len(response.text) / 1024:.0f} KB)")
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2:
+        print(__doc__)
+        sys.exit(1)
+    manifest_path = STORES / 'manifest.json'
+    manifest = json.loads(manifest_path.read_text(encoding='utf-8'))
+    for url in sys.argv[1:]:
+        record(url, manifest)
+    manifest_path.write_text(json.dumps(manifest, indent=2) + '\n', encoding='utf-8')
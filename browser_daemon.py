@@ -0,0 +1,164 @@
+"""
+Warm browser daemon
+Keeps one Chrome running with remote debugging on a local port, so short
+scrape jobs attach to it instead of launching a browser each time. A job
+gets a tab of its own, scrapes, closes its tabs and leaves Chrome running
+for the next job. Jobs are meant to run one after another; for many stores
+at once use browser_pool.py.
+
+Usage:
+    python browser_daemon.py [--port 9333] [--show-browser]   # keep running
+    python scraper_fixed_modal.py --attach                     # in another shell
+"""
+
+import json
+import os
+import socket
+import time
+from datetime import datetime
+from pathlib import Path
+
+from selenium.webdriver.chrome.options import Options
+
+from load_profile import DEFAULT_PROFILE, PROFILES, get_profile
+from scraper_fixed_modal import create_driver, start_chrome
+
+
+STATE_FILE = Path('.cache') / 'browser_daemon.json'
+DEFAULT_PORT = 9333
+
+
+def port_open(address):
+    """True if something accepts connections on host:port"""
+    host, port = address.rsplit(':', 1)
+    try:
+        with socket.create_connection((host, int(port)), timeout=1):
+            return True
+    except OSError:
+        return False
+
+
+def daemon_address():
+    """host:port of the running daemon's Chrome, None if none is up"""
+    try:
+        address = json.loads(STATE_FILE.read_text(encoding='utf-8'))['address']
+    except (OSError, ValueError, KeyError):
+        return None
+    return address if port_open(address) else None
+
+
+def attach_driver(address=None, profile=DEFAULT_PROFILE):
+    """WebDriver session on the daemon's Chrome, switched to a new tab of its own"""
+    address = address or daemon_address()
+    if not address:
+        raise RuntimeError("No browser daemon running - start one with: python browser_daemon.py")
+    profile = get_profile(profile)
+    options = Options()
+    options.debugger_address = address
+    options.page_load_strategy = profile.page_load_strategy
+    driver = start_chrome(options)
+    # close_extra_windows() and detach_driver() leave these alone
+    driver.keep_windows = set(driver.window_handles)
+    driver.switch_to.new_window('tab')
+    profile.apply_driver(driver)
+    return driver
+
+
+def detach_driver(driver):
+    """Close the tabs a job opened and end its session; Chrome keeps running"""
+    keep = getattr(driver, 'keep_windows', set())
+    try:
+        for handle in driver.window_handles:
+            if handle not in keep:
+                driver.switch_to.window(handle)
+                driver.close()
+    except:
+        pass
+    try:
+        # With debuggerAddress chromedriver did not launch Chrome, so it does not close it
+        driver.quit()
+    except:
+        pass
+
+
+class BrowserDaemon:
+    """
+    One long-lived Chrome for attached jobs
+    - port: remote debugging port jobs attach to
+    - profile: load_profile of the browser (attached jobs apply their own blocking)
+    """
+
+    def __init__(self, port=DEFAULT_PORT, headless=True, profile=DEFAULT_PROFILE,
+                 user_data_dir=Path('.cache') / 'chrome-daemon'):
+        self.port = port
+        self.headless = headless
+        self.profile = profile
+        self.user_data_dir = Path(user_data_dir).resolve()
+        self.driver = None
+
+    @property
+    def address(self):
+        return f'127.0.0.1:{self.port}'
+
+    def start(self):
+        """Launch Chrome and publish its address in STATE_FILE"""
+        if port_open(self.address):
+            raise RuntimeError(f"Port {self.port} is already in use - is a daemon running?")
+        self.driver = create_driver(headless=self.headless, profile=self.profile, args=[
+            f'--remote-debugging-port={self.port}',
+            f'--user-data-dir={self.user_data_dir}',
+        ])
+        STATE_FILE.parent.mkdir(parents=True, exist_ok=True)
+        STATE_FILE.write_text(json.dumps({
+            'address': self.address,
+            'pid': os.getpid(),
+            'started_at': datetime.now().isoformat()
+        }), encoding='utf-8')
+        print(f"Browser daemon ready on {self.address}")
+
+    def alive(self):
+        try:
+            self.driver.window_handles
+            return True
+        except:
+            return False
+
+    def serve(self, check_every=5):
+        """Keep Chrome up until interrupted, relaunching it if it dies"""
+        self.start()
+        try:
+            while True:
+                time.sleep(check_every)
+                if not self.alive():
+                    print("[WARN] Browser died - restarting")
+                    self.stop()
+                    self.start()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.stop()
+
+    def stop(self):
+        if self.driver:
+            try:
+                self.driver.quit()
+            except:
+                pass
+            self.driver = None
+        try:
+            STATE_FILE.unlink()
+        except OSError:
+            pass
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Keep a Chrome running for scrape jobs to attach to")
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT, help="remote debugging port")
+    parser.add_argument('--show-browser', action='store_true', help="run Chrome with a visible window")
+    parser.add_argument('--profile', choices=sorted(PROFILES), default=DEFAULT_PROFILE,
+                        help="page load profile of the browser")
+    args = parser.parse_args()
+
+    BrowserDaemon(port=args.port, headless=not args.show_browser, profile=args.profile).serve()
@@ -0,0 +1,260 @@
+"""
+Browser worker pool - crawl many Cuponation store pages concurrently
+Each worker thread owns one long-lived Chrome and reuses it across stores,
+recycling it after a fixed number of pages to keep memory in check
+
+Batch entry point for the whole catalog, e.g. from cron:
+    python browser_pool.py stores.txt --workers 4
+    cat stores.txt | python browser_pool.py - --order input
+Stores are handed out soonest-expiring first (from the cards remembered in
+.cache/cards.sqlite, stores never scraped before go first), each gets its
+own output/<store>/ folder and the run ends with output/summary.json and
+output/unique_coupons.json (each coupon once, with every store it is on)
+"""
+
+import json
+import queue
+import sys
+import threading
+import time
+from datetime import date, datetime
+from pathlib import Path
+from urllib.parse import urlparse
+
+from card_state import DEFAULT_PATH as CARD_STATE_PATH, CardStateStore
+from checkpoint import Checkpoint
+from dedupe_index import write_unique
+from load_profile import DEFAULT_PROFILE, PROFILES
+from metrics import RunMetrics
+from rate_control import shared as shared_rate_control, shared_browser
+from scraper_fixed_modal import TravelokaCodeScraper, create_driver
+
+
+def store_slug(url):
+    """traveloka-promo-code style name for a store URL"""
+    path = urlparse(url).path.strip('/')
+    return path.replace('/', '_') if path else 'report'
+
+
+class BrowserWorkerPool:
+    """
+    N worker threads fed from one URL queue
+    - workers: number of browsers running at the same time
+    - pages_per_browser: quit and relaunch a worker's Chrome after this many stores
+    - profile: load_profile name for every browser ('lean' / 'full')
+    - resume: skip stores a previous run finished and continue half-done ones
+      from <output_root>/checkpoint.json
+    Stage timings of every store go to <output_root>/metrics.jsonl
+    """
+
+    def __init__(self, workers=2, pages_per_browser=20, tab_batch_size=1, output_root='output', headless=True,
+                 resume=False, profile=DEFAULT_PROFILE):
+        self.workers = max(1, workers)
+        self.pages_per_browser = max(1, pages_per_browser)
+        self.tab_batch_size = tab_batch_size
+        self.output_root = Path(output_root)
+        self.headless = headless
+        self.resume = resume
+        self.profile = profile
+        self.checkpoint = Checkpoint(self.output_root / 'checkpoint.json', resume=resume)
+        # Page loads of all workers share one controller that allows one load per browser from the start
+        self.rate = shared_browser(self.workers)
+        self.metrics = RunMetrics(self.output_root / 'metrics.jsonl')
+        # (priority, input position, url) - lowest first
+        self.urls = queue.PriorityQueue()
+        self.results = []
+        self.results_lock = threading.Lock()
+
+    def launch_browser(self, worker_id):
+        """Start a fresh Chrome for a worker, None if it failed"""
+        # chromedriver_path() resolves the driver once under its own lock,
+        # so workers can launch their browsers at the same time
+        try:
+            driver = create_driver(headless=self.headless, profile=self.profile)
+            print(f"[worker {worker_id}] Browser started")
+            return driver
+        except Exception as e:
+            print(f"[worker {worker_id}] [ERROR] Driver setup failed: {e}")
+            return None
+
+    def quit_browser(self, worker_id, driver):
+        """Quit a worker's Chrome, ignoring an already-dead session"""
+        try:
+            driver.quit()
+        except:
+            pass
+        print(f"[worker {worker_id}] Browser closed")
+
+    def browser_alive(self, driver):
+        """True if the WebDriver session still answers"""
+        try:
+            driver.window_handles
+            return True
+        except:
+            return False
+
+    def worker(self, worker_id):
+        """Take store URLs off the queue until it is empty"""
+        driver = None
+        pages = 0
+
+        while True:
+            try:
+                _, _, url = self.urls.get_nowait()
+            except queue.Empty:
+                break
+
+            try:
+                if driver is not None and (pages >= self.pages_per_browser or not self.browser_alive(driver)):
+                    self.quit_browser(worker_id, driver)
+                    driver = None
+
+                if driver is None:
+                    driver = self.launch_browser(worker_id)
+                    pages = 0
+
+                ok = False
+                scraper = TravelokaCodeScraper(
+                    tab_batch_size=self.tab_batch_size,
+                    output_dir=self.output_root / store_slug(url),
+                    checkpoint=self.checkpoint,
+                    metrics=self.metrics,
+                    profile=self.profile,
+                    rate=self.rate
+                )
+                started = time.time()
+                if driver is not None:
+                    scraper.driver = driver
+                    ok = scraper.scrape_store(url)
+                    pages += 1
+                self.metrics.record('store', time.time() - started, url, ok=ok, worker=worker_id)
+
+                with self.results_lock:
+                    self.results.append({
+                        'url': url,
+                        'ok': ok,
+                        'coupons': len(scraper.coupons),
+                        'offers': len(scraper.offers),
+                        'seconds': round(time.time() - started, 1),
+                        'worker': worker_id
+                    })
+            finally:
+                self.urls.task_done()
+
+        if driver is not None:
+            self.quit_browser(worker_id, driver)
+
+    def run(self, urls, priorities=None):
+        """
+        Scrape every URL and return one result dict per store
+        priorities: {url: sortable key}, lower keys are scraped first; URLs
+        without one (or priorities=None) keep their input order
+        """
+        self.results = []
+        if self.resume:
+            remaining = self.checkpoint.pending(urls)
+            print(f"Resuming: {len(urls) - len(remaining)} of {len(urls)} stores already done")
+            urls = remaining
+        priorities = priorities or {}
+        for position, url in enumerate(urls):
+            self.urls.put((priorities.get(url, ()), position, url))
+
+        threads = []
+        for worker_id in range(1, min(self.workers, self.urls.qsize()) + 1):
+            t = threading.Thread(target=self.worker, args=(worker_id,), daemon=True)
+            t.start()
+            threads.append(t)
+
+        for t in threads:
+            t.join()
+
+        return self.results
+
+
+def read_urls(path):
+    """Store URLs from a text file ('-' = stdin), one per line (# comments allowed), duplicates dropped"""
+    text = sys.stdin.read() if path == '-' else Path(path).read_text(encoding='utf-8')
+    urls = []
+    for line in text.splitlines():
+        line = line.strip()
+        if line and not line.startswith('#') and line not in urls:
+            urls.append(line)
+    return urls
+
+
+def expiry_priorities(urls, state_path=CARD_STATE_PATH):
+    """
+    {url: priority} that puts stores with no upcoming expiry on record (never
+    scraped before) first, then the stores whose soonest coupon expiry is nearest
+    """
+    if not Path(state_path).exists():
+        return {}
+    state = CardStateStore(state_path)
+    try:
+        soonest = state.soonest_expiries(urls)
+    finally:
+        state.close()
+    today = date.today()
+    return {url: (1, (soonest[url] - today).days) if url in soonest else (0, 0) for url in urls}
+
+
+def write_summary(output_root, results):
+    """output/summary.json: one entry per store of this run, for cron jobs to check"""
+    path = Path(output_root) / 'summary.json'
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps({
+        'finished_at': datetime.now().isoformat(),
+        'stores': len(results),
+        'succeeded': sum(1 for r in results if r['ok']),
+        'results': results
+    }, indent=2), encoding='utf-8')
+    return path
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Scrape many Cuponation store pages with a pool of browsers")
+    parser.add_argument('url_file', nargs='?', default='-',
+                        help="text file with one store URL per line (default / '-': read stdin)")
+    parser.add_argument('--workers', type=int, default=2, help="browsers running at the same time")
+    parser.add_argument('--recycle', type=int, default=20, help="relaunch a browser after this many stores")
+    parser.add_argument('--tabs', type=int, default=1, help="coupons to click per store page load")
+    parser.add_argument('--output', default='output', help="root folder for per-store output")
+    parser.add_argument('--show-browser', action='store_true', help="run Chrome with a visible window")
+    parser.add_argument('--resume', action='store_true', help="continue an interrupted run from its checkpoint")
+    parser.add_argument('--profile', choices=sorted(PROFILES), default=DEFAULT_PROFILE,
+                        help="page load profile: 'lean' skips images/fonts/media/trackers")
+    parser.add_argument('--order', choices=['expiry', 'input'], default='expiry',
+                        help="scrape new and soonest-expiring stores first, or keep the file order")
+    args = parser.parse_args()
+
+    urls = read_urls(args.url_file)
+    if not urls:
+        parser.error("no store URLs given")
+
+    pool = BrowserWorkerPool(
+        workers=args.workers,
+        pages_per_browser=args.recycle,
+        tab_batch_size=args.tabs,
+        output_root=args.output,
+        headless=not args.show_browser,
+        resume=args.resume,
+        profile=args.profile
+    )
+    results = pool.run(urls, expiry_priorities(urls) if args.order == 'expiry' else None)
+
+    print("\n" + "="*60)
+    for r in results:
+        status = "OK " if r['ok'] else "ERR"
+        print(f"[{status}] {r['coupons']:3d} coupons {r['offers']:3d} offers {r['seconds']:6.1f}s  {r['url']}")
+    print(f"Stores: {len(results)}, succeeded: {sum(1 for r in results if r['ok'])}")
+    print(f"Summary: {write_summary(args.output, results)}")
+    unique_path, unique = write_unique(args.output, urls)
+    print(f"Unique coupons: {len(unique)} ({sum(1 for c in unique if len(c['stores']) > 1)} on several stores) "
+          f"-> {unique_path}")
+    pool.metrics.report()
+    pool.metrics.close()
+    pool.rate.report()
+    shared_rate_control().report()
+    print(f"Stage timings: {pool.metrics.path}")
@@ -0,0 +1,182 @@
+"""
+Single-pass card extraction for the Selenium scraper
+One execute_script call walks every GET DEAL / SEE PROMO CODE button up to
+its card and returns all card fields at once, instead of several WebDriver
+round trips per ancestor and per field. Each card also gets a key that
+finds its button again after a reload, so clicks go by key in one script
+call instead of re-querying every button from Python.
+"""
+
+import json
+
+from extraction_rules import EXPIRY_DATE
+
+
+CARD_CLASS = '_6tavkoa'
+
+# Attributes that identify a card on their own when the site sets them
+ID_ATTRS = ['data-id', 'data-voucher-id', 'data-offer-id', 'data-voucher']
+
+# Shared by the snapshot and click scripts; expects cardClass and idAttrs
+CARD_JS = """
+function buttons(xpath) {
+    const found = document.evaluate(xpath, document, null, XPathResult.ORDERED_NODE_SNAPSHOT_TYPE, null);
+    const out = [];
+    for (let i = 0; i < found.snapshotLength; i++) out.push(found.snapshotItem(i));
+    return out;
+}
+
+function dataAttrs(el) {
+    const out = {};
+    if (!el || !el.attributes) return out;
+    for (const attr of el.attributes) {
+        if (attr.name.startsWith('data-')) out[attr.name.slice(5)] = attr.value;
+    }
+    return out;
+}
+
+function cardOf(btn) {
+    // Same walk as the old Python loop: up to 10 levels looking for the card class
+    let node = btn;
+    for (let i = 0; i < 10; i++) {
+        if ((node.getAttribute && node.getAttribute('class') || '').includes(cardClass)) break;
+        if (!node.parentElement) break;
+        node = node.parentElement;
+    }
+    return node;
+}
+
+function cardKeys(btns, type) {
+    // An id attribute when there is one, else type + title + occurrence of that
+    // title, so the key does not depend on where the card sits in the list
+    const seen = {};
+    return btns.map(btn => {
+        const card = cardOf(btn);
+        for (const name of idAttrs) {
+            const value = btn.getAttribute(name) || (card.getAttribute && card.getAttribute(name));
+            if (value) return type + ':' + name + '=' + value;
+        }
+        const heading = card.querySelector('h3, h4');
+        const title = (heading ? heading.innerText : card.innerText.slice(0, 200))
+            .replace(/\\s+/g, ' ').trim().toLowerCase();
+        seen[title] = (seen[title] || 0) + 1;
+        return type + ':' + title + '#' + seen[title];
+    });
+}
+"""
+
+SNAPSHOT_JS = """
+const [codeXPath, dealXPath, cardClass, idAttrs] = arguments;
+""" + CARD_JS + """
+function describe(btn, type, typeIndex, key) {
+    const card = cardOf(btn);
+    const heading = card.querySelector('h3, h4');
+    const expiry = Array.from(card.querySelectorAll('span')).find(s =>
+        (s.getAttribute('class') || '').includes('az57m4c') ||
+        Array.from(s.childNodes).some(n => n.nodeType === Node.TEXT_NODE && n.textContent.includes('Expiry')));
+    return {
+        type: type,
+        type_index: typeIndex,
+        key: key,
+        title: heading ? heading.innerText.trim() : '',
+        expiry_text: expiry ? expiry.innerText.trim() : '',
+        card_text: card.innerText,
+        data: Object.assign(dataAttrs(card), dataAttrs(btn)),
+        button_title: btn.getAttribute('title') || '',
+        _pos: btn
+    };
+}
+
+const cards = [];
+for (const [xpath, type] of [[codeXPath, 'code'], [dealXPath, 'deal']]) {
+    const found = buttons(xpath);
+    const keys = cardKeys(found, type);
+    found.forEach((b, i) => cards.push(describe(b, type, i, keys[i])));
+}
+
+// Overall card index follows document order, whichever button type it has
+cards.sort((a, b) => a._pos.compareDocumentPosition(b._pos) & Node.DOCUMENT_POSITION_FOLLOWING ? -1 : 1);
+cards.forEach((c, i) => { c.index = i; delete c._pos; });
+return JSON.stringify(cards);
+"""
+
+CLICK_JS = """
+const [xpath, type, keys, cardClass, idAttrs] = arguments;
+""" + CARD_JS + """
+const found = buttons(xpath);
+const byKey = new Map();
+cardKeys(found, type).forEach((key, i) => byKey.set(key, found[i]));
+const clicked = [];
+for (const key of keys) {
+    const btn = byKey.get(key);
+    if (!btn) continue;
+    btn.scrollIntoView({block: 'center'});
+    btn.click();
+    clicked.push(key);
+}
+return clicked;
+"""
+
+BUTTONS_JS = """
+const [xpath, type, keys, cardClass, idAttrs] = arguments;
+""" + CARD_JS + """
+const found = buttons(xpath);
+const byKey = new Map();
+cardKeys(found, type).forEach((key, i) => byKey.set(key, found[i]));
+return keys.map(key => byKey.get(key) || null);
+"""
+
+KEYS_JS = """
+const [xpath, type, cardClass, idAttrs] = arguments;
+""" + CARD_JS + """
+return cardKeys(buttons(xpath), type);
+"""
+
+
+def snapshot_cards(driver, code_xpath, deal_xpath):
+    """
+    Return every card on the page as a dict:
+    index, type ('code' or 'deal'), type_index, key, title, expiry_text,
+    expiry, card_text, data (data-* attributes of card and button), button_title
+    Cards of one type keep the same order as find_elements(By.XPATH, xpath)
+    """
+    raw = driver.execute_script(SNAPSHOT_JS, code_xpath, deal_xpath, CARD_CLASS, ID_ATTRS)
+    cards = json.loads(raw or '[]')
+    for card in cards:
+        match = EXPIRY_DATE.search(card['expiry_text'])
+        card['expiry'] = match.group(1) if match else 'N/A'
+    return cards
+
+
+def card_id(card):
+    """'data-id=...' style id of a snapshot card when the site sets one (see ID_ATTRS), else None"""
+    for name in ID_ATTRS:
+        value = card['data'].get(name[len('data-'):])
+        if value:
+            return f'{name}={value}'
+    return None
+
+
+def cards_of_type(cards, card_type):
+    """Cards of one button type, ordered by type_index"""
+    return sorted((c for c in cards if c['type'] == card_type), key=lambda c: c['type_index'])
+
+
+def card_keys(driver, button_xpath, card_type='code'):
+    """Snapshot keys of the buttons currently on the page, in document order"""
+    return driver.execute_script(KEYS_JS, button_xpath, card_type, CARD_CLASS, ID_ATTRS) or []
+
+
+def card_buttons(driver, button_xpath, keys, card_type='code'):
+    """Button element of the card with each snapshot key (same order), None where the card is missing"""
+    return driver.execute_script(BUTTONS_JS, button_xpath, card_type, list(keys), CARD_CLASS, ID_ATTRS) or []
+
+
+def click_cards(driver, button_xpath, keys, card_type='code'):
+    """
+    Click the buttons of the cards with these snapshot keys, in this order,
+    in one script call (one JS task, so a navigation started by the first
+    click cannot detach the others). Returns the keys that were found and
+    clicked; a card missing from the current page is skipped.
+    """
+    return driver.execute_script(CLICK_JS, button_xpath, card_type, list(keys), CARD_CLASS, ID_ATTRS) or []
@@ -0,0 +1,127 @@
+"""
+Card fingerprint store for incremental Selenium runs
+Remembers, per store page, a fingerprint of every SEE PROMO CODE card
+(title, expiry, position) and the code last read from it. A later run only
+clicks cards whose fingerprint is new or changed and reuses the stored code
+for the rest, so run time follows how many coupons changed, not how many
+the store has.
+"""
+
+import hashlib
+import sqlite3
+import threading
+import time
+from datetime import date, datetime
+from pathlib import Path
+
+
+DEFAULT_PATH = '.cache/cards.sqlite'
+# Re-click unchanged cards after this long anyway, in case the code behind
+# an identical card was swapped
+DEFAULT_MAX_AGE_DAYS = 7
+
+
+def expiry_date(expiry):
+    """date of a dd/mm/yyyy expiry as shown on the cards, None if it does not parse"""
+    try:
+        return datetime.strptime(expiry.strip(), '%d/%m/%Y').date()
+    except (AttributeError, ValueError):
+        return None
+
+
+def card_fingerprint(card):
+    """Stable hash of what identifies a coupon card (snapshot_cards entry)"""
+    parts = [
+        ' '.join(card['title'].split()).lower(),
+        card['expiry'],
+        str(card['type_index']),
+    ]
+    return hashlib.sha1('\x1f'.join(parts).encode('utf-8')).hexdigest()
+
+
+class CardStateStore:
+    """
+    (store URL, card fingerprint) -> last code, title and expiry in SQLite
+    One file can be shared by several scrapers/threads
+    """
+
+    def __init__(self, path=DEFAULT_PATH, max_age_days=DEFAULT_MAX_AGE_DAYS):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_age = max_age_days * 86400
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(str(self.path), timeout=30, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("""
+            CREATE TABLE IF NOT EXISTS cards (
+                store_url TEXT,
+                fingerprint TEXT,
+                code TEXT,
+                title TEXT,
+                expiry TEXT,
+                extracted_at REAL,
+                last_seen REAL,
+                PRIMARY KEY (store_url, fingerprint)
+            )
+        """)
+        self.db.commit()
+
+    def known_codes(self, store_url, fingerprints):
+        """{fingerprint: code} for cards of this store still young enough to reuse"""
+        cutoff = time.time() - self.max_age
+        with self.lock:
+            rows = self.db.execute(
+                "SELECT fingerprint, code FROM cards WHERE store_url = ? AND extracted_at >= ?",
+                (store_url, cutoff)
+            ).fetchall()
+        wanted = set(fingerprints)
+        return {fp: code for fp, code in rows if fp in wanted}
+
+    def record(self, store_url, fingerprint, code, title, expiry):
+        """Save the code just read from a card"""
+        now = time.time()
+        with self.lock:
+            self.db.execute(
+                "INSERT OR REPLACE INTO cards VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (store_url, fingerprint, code, title, expiry, now, now)
+            )
+            self.db.commit()
+
+    def sync_store(self, store_url, fingerprints):
+        """Mark these cards as seen and forget the ones no longer on the page"""
+        now = time.time()
+        fingerprints = list(fingerprints)
+        with self.lock:
+            self.db.executemany(
+                "UPDATE cards SET last_seen = ? WHERE store_url = ? AND fingerprint = ?",
+                [(now, store_url, fp) for fp in fingerprints]
+            )
+            placeholders = ','.join('?' * len(fingerprints))
+            self.db.execute(
+                f"DELETE FROM cards WHERE store_url = ? AND fingerprint NOT IN ({placeholders})",
+                [store_url] + fingerprints
+            )
+            self.db.commit()
+
+    def soonest_expiries(self, store_urls):
+        """{store URL: earliest expiry still to come among its remembered cards}, stores without one left out"""
+        store_urls = list(store_urls)
+        if not store_urls:
+            return {}
+        placeholders = ','.join('?' * len(store_urls))
+        with self.lock:
+            rows = self.db.execute(
+                f"SELECT store_url, expiry FROM cards WHERE store_url IN ({placeholders})",
+                store_urls
+            ).fetchall()
+        today = date.today()
+        soonest = {}
+        for store_url, expiry in rows:
+            day = expiry_date(expiry)
+            if day and day >= today and (store_url not in soonest or day < soonest[store_url]):
+                soonest[store_url] = day
+        return soonest
+
+    def close(self):
+        with self.lock:
+            self.db.close()
@@ -0,0 +1,93 @@
+"""
+Checkpoint/resume for long Selenium runs
+Records, per store URL, which coupon cards have been handled and whether
+the store finished. Results themselves live in each store's results.jsonl
+(result_sink), so a resumed run reloads them from there and only clicks the
+cards that were still left when the previous run died.
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+from pathlib import Path
+
+
+class Checkpoint:
+    """
+    JSON file of {store URL: status, page key, handled card indices}
+    - resume=False starts from scratch (the old file is replaced on first save)
+    - Safe to share between the threads of a browser pool
+    """
+
+    def __init__(self, path, resume=False):
+        self.path = Path(path)
+        self.lock = threading.Lock()
+        self.stores = {}
+        if resume and self.path.exists():
+            try:
+                self.stores = json.loads(self.path.read_text(encoding='utf-8')).get('stores', {})
+            except ValueError:
+                print(f"[WARN] Unreadable checkpoint {self.path}, starting over")
+
+    def save(self):
+        """Write the checkpoint atomically (never leaves a half-written file)"""
+        with self.lock:
+            data = json.dumps({'stores': self.stores}, ensure_ascii=False, indent=1)
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = self.path.with_name(self.path.name + '.tmp')
+            tmp.write_text(data, encoding='utf-8')
+            os.replace(tmp, self.path)
+
+    def is_done(self, url):
+        with self.lock:
+            return self.stores.get(url, {}).get('status') == 'done'
+
+    def has_progress(self, url):
+        """True if an earlier run handled some cards of this store but did not finish"""
+        with self.lock:
+            store = self.stores.get(url, {})
+            return store.get('status') == 'in_progress' and bool(store.get('done'))
+
+    def pending(self, urls):
+        """URLs not finished yet, in the given order"""
+        return [url for url in urls if not self.is_done(url)]
+
+    def start_store(self, url, fingerprints):
+        """
+        Begin (or resume) a store whose coupon cards have these fingerprints
+        Returns the card indices already handled, empty if the page changed
+        since the checkpoint or the store is new
+        """
+        page_key = hashlib.sha1('|'.join(fingerprints).encode('utf-8')).hexdigest()
+        with self.lock:
+            store = self.stores.get(url)
+            if store and store.get('page_key') == page_key and store.get('status') == 'in_progress':
+                done = set(store.get('done', []))
+            else:
+                done = set()
+            self.stores[url] = {
+                'status': 'in_progress',
+                'page_key': page_key,
+                'done': sorted(done),
+                'updated_at': time.time()
+            }
+        self.save()
+        return done
+
+    def mark(self, url, coupon_num):
+        """Card handled; kept in memory until the next save()"""
+        with self.lock:
+            store = self.stores.setdefault(url, {'status': 'in_progress', 'done': []})
+            if coupon_num not in store['done']:
+                store['done'].append(coupon_num)
+            store['updated_at'] = time.time()
+
+    def finish_store(self, url, ok=True):
+        """Store finished; a failed store stays resumable"""
+        with self.lock:
+            store = self.stores.setdefault(url, {'done': []})
+            store['status'] = 'done' if ok else 'in_progress'
+            store['updated_at'] = time.time()
+        self.save()
@@ -0,0 +1,91 @@
+"""
+Clipboard-free promo code capture
+Reads the code straight from the voucher modal's DOM, and if that fails
+clicks COPY with navigator.clipboard / execCommand('copy') hooked so the
+copied text lands in a page variable instead of the OS clipboard.
+Nothing here touches the machine clipboard, so it works headless and with
+many browsers running side by side.
+"""
+
+from extraction_rules import PROMO_CODE
+
+# Value shown next to the COPY button: an input/textarea, or the nearest
+# short text element inside the same modal container
+READ_DOM_JS = """
+const copyBtn = Array.from(document.querySelectorAll('button'))
+    .find(b => Array.from(b.childNodes).some(n => n.nodeType === Node.TEXT_NODE && n.textContent.toLowerCase().includes('copy')));
+if (!copyBtn) return null;
+
+const candidates = [];
+let box = copyBtn.parentElement;
+for (let i = 0; box && i < 4; i++, box = box.parentElement) {
+    box.querySelectorAll('input, textarea').forEach(el => candidates.push({text: el.value, leaf: false}));
+    box.querySelectorAll('h4, code').forEach(el => candidates.push({text: el.innerText, leaf: false}));
+    box.querySelectorAll('span, div, p').forEach(el => {
+        if (el.children.length === 0 && !el.contains(copyBtn) && !copyBtn.contains(el)) candidates.push({text: el.innerText, leaf: true});
+    });
+    if (candidates.length) break;
+}
+return candidates.map(c => ({text: (c.text || '').trim(), leaf: c.leaf})).filter(c => c.text);
+"""
+
+INSTALL_HOOK_JS = """
+window.__capturedCode = null;
+const remember = t => { window.__capturedCode = String(t == null ? '' : t); };
+try {
+    const clip = navigator.clipboard || {};
+    clip.writeText = t => { remember(t); return Promise.resolve(); };
+    if (!navigator.clipboard) Object.defineProperty(navigator, 'clipboard', {value: clip});
+} catch (e) {}
+if (!document.__execCopyHooked) {
+    const exec = document.execCommand.bind(document);
+    document.execCommand = function (cmd) {
+        if (String(cmd).toLowerCase() === 'copy') {
+            const active = document.activeElement;
+            const selected = String(window.getSelection() || '');
+            remember(selected || (active && active.value) || '');
+            return true;
+        }
+        return exec.apply(document, arguments);
+    };
+    document.__execCopyHooked = true;
+}
+"""
+
+CLICK_COPY_JS = """
+const copyBtn = Array.from(document.querySelectorAll('button'))
+    .find(b => Array.from(b.childNodes).some(n => n.nodeType === Node.TEXT_NODE && n.textContent.toLowerCase().includes('copy')));
+if (copyBtn) copyBtn.click();
+return !!copyBtn;
+"""
+
+
+def looks_like_code(text, leaf=False):
+    """
+    Short alphanumeric token, same rule as the old h4 fallback
+    Plain text leaves must also be upper case, so labels like 'Verified' are skipped
+    """
+    if not text or not 3 <= len(text) <= 20 or not PROMO_CODE.match(text):
+        return False
+    return not leaf or text == text.upper()
+
+
+def read_code_from_dom(driver):
+    """Code text displayed in the modal, or None"""
+    for candidate in driver.execute_script(READ_DOM_JS) or []:
+        if looks_like_code(candidate['text'], leaf=candidate['leaf']):
+            return candidate['text']
+    return None
+
+
+def read_code_via_copy_hook(driver, wait, timeout=1):
+    """Click COPY with the clipboard APIs hooked and return what the page tried to copy"""
+    driver.execute_script(INSTALL_HOOK_JS)
+    if not driver.execute_script(CLICK_COPY_JS):
+        return None
+    captured = wait.until(
+        'copy_hook',
+        lambda d: d.execute_script("return window.__capturedCode;"),
+        timeout=timeout
+    )
+    return captured.strip() if captured else None
@@ -0,0 +1,219 @@
+"""
+Coupon dedupe index across runs and stores
+The same code shows up on many store pages (platform-wide codes) and day
+after day. Every coupon is keyed by a hash of its normalized (code, title,
+expiry) and the index remembers which stores it was seen on, so:
+- a multi-store run reads a voucher's code once and reuses it on every other
+  store page linking the same voucher instead of clicking it
+- unique_coupons.json lists each coupon once with all the stores it applies to
+
+Each entry records where its code came from. Only codes read from a voucher
+modal or voucher page (SOURCE_VOUCHER) are ever reused, and only for the
+same voucher identity (the card's data-* id or its voucher URL, see
+voucher_identity) - never for a card that merely looks alike. Discount
+labels read off the store page HTML (SOURCE_PAGE, the requests scraper and
+the spider's page pass) only count towards the store memberships.
+"""
+
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+from urllib.parse import parse_qs, urlparse
+
+from card_state import DEFAULT_MAX_AGE_DAYS, expiry_date
+
+
+DEFAULT_PATH = '.cache/dedupe.sqlite'
+UNIQUE_FILE = 'unique_coupons.json'
+
+SOURCE_VOUCHER = 'voucher'
+SOURCE_PAGE = 'page'
+
+# Query parameters that carry the voucher id in a voucher URL
+VOUCHER_PARAMS = ('voucherId', 'voucher_id', 'voucher', 'couponId', 'coupon_id')
+
+
+def normalize_code(code):
+    """Code without whitespace, upper case (codes are case-insensitive at checkout)"""
+    return ''.join((code or '').split()).upper()
+
+
+def normalize_title(title):
+    """Title with collapsed whitespace, lower case; '' for a missing (N/A) title"""
+    title = ' '.join((title or '').split()).lower()
+    return '' if title == 'n/a' else title
+
+
+def normalize_expiry(expiry):
+    """ISO date of a dd/mm/yyyy expiry, else the text as is; '' for a missing (N/A) expiry"""
+    day = expiry_date(expiry)
+    if day:
+        return day.isoformat()
+    expiry = ' '.join((expiry or '').split()).lower()
+    return '' if expiry == 'n/a' else expiry
+
+
+def coupon_key(code, title, expiry):
+    """Hash identifying one coupon wherever it appears"""
+    parts = [normalize_code(code), normalize_title(title), normalize_expiry(expiry)]
+    return hashlib.sha1('\x1f'.join(parts).encode('utf-8')).hexdigest()
+
+
+def voucher_identity(voucher_url):
+    """
+    Stable id of a voucher URL: its voucher id query parameter when it has
+    one (the same voucher linked from several store pages), else the URL
+    without its fragment; None for no URL
+    """
+    if not voucher_url:
+        return None
+    parsed = urlparse(voucher_url)
+    query = parse_qs(parsed.query)
+    for name in VOUCHER_PARAMS:
+        if query.get(name):
+            return f'{name}={query[name][0]}'
+    return parsed._replace(fragment='').geturl()
+
+
+class DedupeIndex:
+    """
+    coupon key -> code, title, expiry, voucher identity, provenance and the
+    stores it is on, in SQLite. One file can be shared by several scrapers/threads
+    - max_age_days: only reuse a code read this recently (see card_state)
+    """
+
+    def __init__(self, path=DEFAULT_PATH, max_age_days=DEFAULT_MAX_AGE_DAYS):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_age = max_age_days * 86400
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(str(self.path), timeout=30, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        columns = [row[1] for row in self.db.execute("PRAGMA table_info(coupons)")]
+        if columns and 'source' not in columns:
+            # Written before provenance was recorded: none of its codes can be trusted for reuse
+            self.db.execute("DROP TABLE coupons")
+            self.db.execute("DROP TABLE IF EXISTS stores")
+        self.db.execute("""
+            CREATE TABLE IF NOT EXISTS coupons (
+                key TEXT PRIMARY KEY,
+                voucher TEXT,
+                code TEXT,
+                title TEXT,
+                expiry TEXT,
+                source TEXT,
+                read_at REAL,
+                last_seen REAL
+            )
+        """)
+        self.db.execute("CREATE INDEX IF NOT EXISTS coupons_voucher ON coupons (voucher)")
+        self.db.execute("""
+            CREATE TABLE IF NOT EXISTS stores (
+                key TEXT,
+                store_url TEXT,
+                last_seen REAL,
+                PRIMARY KEY (key, store_url)
+            )
+        """)
+        self.db.commit()
+
+    def known_code(self, voucher):
+        """
+        Code recently read from this voucher (a voucher_identity or card id)
+        on any store, None if there is none, or several different ones
+        """
+        if not voucher:
+            return None
+        cutoff = time.time() - self.max_age
+        with self.lock:
+            rows = self.db.execute(
+                "SELECT DISTINCT code FROM coupons WHERE voucher = ? AND source = ? AND read_at >= ?",
+                (voucher, SOURCE_VOUCHER, cutoff)
+            ).fetchall()
+        return rows[0][0] if len(rows) == 1 else None
+
+    def record(self, store_url, code, title, expiry, voucher=None, source=SOURCE_VOUCHER, read=True):
+        """
+        Note a coupon on a store page and return its key
+        - voucher: stable voucher identity, if known
+        - source: SOURCE_VOUCHER for a code read from a voucher, SOURCE_PAGE
+          for a discount label off the store page (never reused)
+        - read: the code was just read from the site, not reused from this
+          index or the card state; this makes it reusable for max_age_days
+        """
+        key = f'{source}:{coupon_key(code, title, expiry)}'
+        now = time.time()
+        read_at = now if read and source == SOURCE_VOUCHER else None
+        with self.lock:
+            self.db.execute(
+                "INSERT INTO coupons VALUES (?, ?, ?, ?, ?, ?, ?, ?) ON CONFLICT (key) DO UPDATE SET "
+                "voucher = COALESCE(excluded.voucher, coupons.voucher), title = excluded.title, "
+                "read_at = COALESCE(excluded.read_at, coupons.read_at), last_seen = excluded.last_seen",
+                (key, voucher, code, title, expiry, source, read_at, now)
+            )
+            self.db.execute(
+                "INSERT OR REPLACE INTO stores VALUES (?, ?, ?)",
+                (key, store_url, now)
+            )
+            self.db.commit()
+        return key
+
+    def sync_store(self, store_url, keys):
+        """Forget the store's coupons that are no longer on its page"""
+        keys = list(keys)
+        placeholders = ','.join('?' * len(keys))
+        with self.lock:
+            self.db.execute(
+                f"DELETE FROM stores WHERE store_url = ? AND key NOT IN ({placeholders})",
+                [store_url] + keys
+            )
+            self.db.commit()
+
+    def unique(self, store_urls=None):
+        """
+        Each coupon on any of store_urls (default: every store) once, with
+        every store it is on: [{'code' (or 'discount' for a store page label),
+        'title', 'expiry', 'stores'}]
+        """
+        with self.lock:
+            rows = self.db.execute("""
+                SELECT c.key, c.code, c.title, c.expiry, c.source, s.store_url
+                FROM coupons c JOIN stores s ON s.key = c.key
+                ORDER BY c.title, c.code, s.store_url
+            """).fetchall()
+        coupons = {}
+        for key, code, title, expiry, source, store_url in rows:
+            if key not in coupons:
+                coupons[key] = {'code' if source == SOURCE_VOUCHER else 'discount': code,
+                                'title': title, 'expiry': expiry, 'stores': []}
+            coupons[key]['stores'].append(store_url)
+        if store_urls is not None:
+            wanted = set(store_urls)
+            return [c for c in coupons.values() if wanted.intersection(c['stores'])]
+        return list(coupons.values())
+
+    def close(self):
+        with self.lock:
+            self.db.close()
+
+
+def write_unique(output_root, store_urls=None, path=DEFAULT_PATH):
+    """<output_root>/unique_coupons.json for these stores; returns (file, coupons)"""
+    index = DedupeIndex(path)
+    try:
+        coupons = index.unique(store_urls)
+    finally:
+        index.close()
+    out = Path(output_root) / UNIQUE_FILE
+    out.parent.mkdir(parents=True, exist_ok=True)
+    out.write_text(json.dumps({
+        'generated_at': datetime.now().isoformat(),
+        'coupons': len(coupons),
+        'shared': sum(1 for c in coupons if len(c['stores']) > 1),
+        'results': coupons
+    }, ensure_ascii=False, indent=2), encoding='utf-8')
+    return out, coupons
@@ -0,0 +1,95 @@
+"""
+Extraction rules shared by all three scrapers
+(main_old.py, scraper_fixed_modal.py and the Scrapy spider)
+
+Every field is one ordered rule table compiled at import into a single
+alternation regex. One search finds the leftmost candidate; only when a
+higher-priority rule could still match further right is that rule checked
+on its own, so the rule listed first wins - the same precedence the old
+chains of separate re.search calls had.
+"""
+
+import re
+
+
+class FieldRule:
+    """
+    Ordered (name, pattern, value, needle) rules compiled into one regex
+    value(match) builds the field value from a rule's match
+    needle is a literal every match of the rule contains (or None), used to
+    skip the rule cheaply on text that cannot match it
+    """
+
+    def __init__(self, rules, flags=0):
+        self.names = [name for name, _, _, _ in rules]
+        self.values = {name: value for name, _, value, _ in rules}
+        self.needles = [needle for _, _, _, needle in rules]
+        self.rank = {name: i for i, name in enumerate(self.names)}
+        self.pattern = re.compile('|'.join(f'(?P<{name}>{pattern})' for name, pattern, _, _ in rules), flags)
+        # Each rule on its own too, for the rare card where a lower-priority
+        # rule matches before a higher-priority one
+        self.single = [re.compile(pattern, flags) for _, pattern, _, _ in rules]
+
+    def first(self, text):
+        """Value of the highest-priority rule that matches anywhere in text, else None"""
+        match = self.pattern.search(text)
+        if match is None:
+            return None
+        rank = self.rank[match.lastgroup]
+        # Nothing matches left of the leftmost match, so higher-priority
+        # rules only need checking from there on
+        for higher in range(rank):
+            needle = self.needles[higher]
+            if needle is not None and needle not in text:
+                continue
+            better = self.single[higher].search(text, match.start())
+            if better:
+                return self.values[self.names[higher]](better)
+        return self.values[match.lastgroup](match)
+
+    def search(self, text):
+        """First match in text order, whichever rule it belongs to"""
+        return self.pattern.search(text)
+
+
+# Discount shown on a card: 15%OFF, $10OFF, $8CREDITS, GIFTCARD
+DISCOUNT = FieldRule([
+    ('percent', r'(?P<percent_n>\d+)%\s*(?:OFF|off|savings)', lambda m: f"{m.group('percent_n')}%OFF", '%'),
+    ('dollar', r'\$(?P<dollar_n>\d+)\s*(?:OFF|off|savings)', lambda m: f"${m.group('dollar_n')}OFF", '$'),
+    ('credits_amount', r'\$(?P<credits_n>\d+)\s*CREDITS', lambda m: f"${m.group('credits_n')}CREDITS", 'CREDITS'),
+    ('credits', r'CREDITS', lambda m: '$8CREDITS', 'CREDITS'),
+    ('giftcard', r'GIFTCARD|GIFT CARD', lambda m: 'GIFTCARD', 'GIFT'),
+])
+
+# Expiry date: 31/12/2024
+EXPIRY_DATE = re.compile(r'(\d{1,2}/\d{1,2}/\d{4})')
+
+# Promo code itself: short alphanumeric token
+PROMO_CODE = re.compile(r'^[A-Za-z0-9]+$')
+
+# Lines of page text that are never a coupon title
+TITLE_SKIP = re.compile(r'^Expiry:|^\d+%?\s*OFF|Verified|arrow|SEE PROMO')
+
+# Spider: words a coupon/offer title usually contains (matched on lower-cased text)
+TITLE_KEYWORDS = re.compile(
+    r'enjoy|save|get|book|take|claim|pay|score|grab|apply|redeem|spend|discover|explore|refer|stay'
+)
+
+# Spider: text node carrying the discount
+DISCOUNT_MARKER = re.compile(r'OFF|CREDITS|GIFTCARD')
+
+
+def extract_discount(text):
+    """DISCOUNT value for text, 'N/A' if no rule matches"""
+    return DISCOUNT.first(text) or 'N/A'
+
+
+def extract_expiry(text):
+    """First dd/mm/yyyy date in text, 'N/A' if none"""
+    match = EXPIRY_DATE.search(text)
+    return match.group(1) if match else 'N/A'
+
+
+def is_title_line(line, min_len=20):
+    """Page-text line usable as a coupon title (Selenium section fallback)"""
+    return len(line) > min_len and not TITLE_SKIP.search(line)
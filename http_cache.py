@@ -0,0 +1,177 @@
+"""
+Shared on-disk HTTP cache for store and voucher pages
+- One SQLite file keyed by URL, usable from the requests scraper, the
+  async fetcher, the Selenium scraper's voucher fetches and Scrapy
+- Entries younger than the TTL are served without touching the network
+- Older entries are revalidated with If-None-Match / If-Modified-Since,
+  a 304 refreshes the entry instead of re-downloading the page
+- Total body size is bounded, least recently used entries are evicted first
+"""
+
+import json
+import re
+import sqlite3
+import threading
+import time
+from email.utils import formatdate
+from pathlib import Path
+
+
+DEFAULT_PATH = '.cache/http.sqlite'
+DEFAULT_TTL = 6 * 3600
+DEFAULT_MAX_MB = 200
+
+# Bodies are always stored decoded, so these no longer describe them
+STRIP_HEADERS = {'content-encoding', 'content-length', 'transfer-encoding'}
+CHARSET = re.compile(r'charset=["\']?([\w-]+)', re.I)
+
+
+class HttpCache:
+    """
+    URL -> (status, headers, body) store with TTL, validators and LRU eviction
+    Safe to share between threads; several processes can use the same file
+    """
+
+    def __init__(self, path=DEFAULT_PATH, ttl=DEFAULT_TTL, max_mb=DEFAULT_MAX_MB):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.ttl = ttl
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(str(self.path), timeout=30, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("""
+            CREATE TABLE IF NOT EXISTS responses (
+                url TEXT PRIMARY KEY,
+                status INTEGER,
+                headers TEXT,
+                body BLOB,
+                etag TEXT,
+                last_modified TEXT,
+                stored_at REAL,
+                accessed_at REAL,
+                size INTEGER
+            )
+        """)
+        self.db.execute("CREATE INDEX IF NOT EXISTS responses_lru ON responses (accessed_at)")
+        self.db.commit()
+
+    def get(self, url):
+        """Cached entry dict for url, or None"""
+        with self.lock:
+            row = self.db.execute(
+                "SELECT status, headers, body, etag, last_modified, stored_at FROM responses WHERE url = ?",
+                (url,)
+            ).fetchone()
+            if row is None:
+                return None
+            self.db.execute("UPDATE responses SET accessed_at = ? WHERE url = ?", (time.time(), url))
+            self.db.commit()
+        status, headers, body, etag, last_modified, stored_at = row
+        return {
+            'url': url,
+            'status': status,
+            'headers': json.loads(headers),
+            'body': body,
+            'etag': etag,
+            'last_modified': last_modified,
+            'stored_at': stored_at,
+        }
+
+    def is_fresh(self, entry):
+        """True while the entry is younger than the TTL"""
+        return entry is not None and time.time() - entry['stored_at'] < self.ttl
+
+    def conditional_headers(self, entry):
+        """If-None-Match / If-Modified-Since for revalidating a stale entry"""
+        headers = {}
+        if entry is None:
+            return headers
+        if entry['etag']:
+            headers['If-None-Match'] = entry['etag']
+        if entry['last_modified']:
+            headers['If-Modified-Since'] = entry['last_modified']
+        elif entry['etag'] is None:
+            # No validators at all: ask for changes since we stored it
+            headers['If-Modified-Since'] = formatdate(entry['stored_at'], usegmt=True)
+        return headers
+
+    def store(self, url, status, headers, body):
+        """Save a 200 response (headers: dict, body: decompressed bytes)"""
+        headers = {k: v for k, v in headers.items() if k.lower() not in STRIP_HEADERS}
+        lower = {k.lower(): v for k, v in headers.items()}
+        now = time.time()
+        with self.lock:
+            self.db.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (url, status, json.dumps(headers), body, lower.get('etag'),
+                 lower.get('last-modified'), now, now, len(body))
+            )
+            self.db.commit()
+        self.evict()
+
+    def refresh(self, url, headers=None):
+        """A 304 came back: the stored body is still current, restart its TTL"""
+        lower = {k.lower(): v for k, v in (headers or {}).items()}
+        now = time.time()
+        with self.lock:
+            self.db.execute(
+                "UPDATE responses SET stored_at = ?, accessed_at = ?, "
+                "etag = COALESCE(?, etag), last_modified = COALESCE(?, last_modified) WHERE url = ?",
+                (now, now, lower.get('etag'), lower.get('last-modified'), url)
+            )
+            self.db.commit()
+
+    def evict(self):
+        """Drop least recently used entries until the cache fits in max_bytes"""
+        with self.lock:
+            total = self.db.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+            if total <= self.max_bytes:
+                return
+            rows = self.db.execute("SELECT url, size FROM responses ORDER BY accessed_at").fetchall()
+            doomed = []
+            for url, size in rows:
+                if total <= self.max_bytes:
+                    break
+                doomed.append((url,))
+                total -= size
+            self.db.executemany("DELETE FROM responses WHERE url = ?", doomed)
+            self.db.commit()
+
+    def close(self):
+        with self.lock:
+            self.db.close()
+
+
+def entry_text(entry):
+    """Cached body decoded with the charset from its Content-Type (utf-8 if none)"""
+    content_type = next((v for k, v in entry['headers'].items() if k.lower() == 'content-type'), '')
+    match = CHARSET.search(content_type)
+    try:
+        return entry['body'].decode(match.group(1) if match else 'utf-8', errors='replace')
+    except LookupError:
+        return entry['body'].decode('utf-8', errors='replace')
+
+
+def cached_get(session, url, cache, **kwargs):
+    """
+    requests GET through the cache
+    Returns (text, source) with source 'cache', 'revalidated' or 'network';
+    raises the usual requests exceptions on HTTP errors
+    """
+    entry = cache.get(url)
+    if cache.is_fresh(entry):
+        return entry_text(entry), 'cache'
+
+    headers = dict(kwargs.pop('headers', None) or {})
+    headers.update(cache.conditional_headers(entry))
+    response = session.get(url, headers=headers, **kwargs)
+
+    if response.status_code == 304 and entry is not None:
+        cache.refresh(url, response.headers)
+        return entry_text(entry), 'revalidated'
+
+    response.raise_for_status()
+    # requests has already undone gzip/deflate, so .content is the plain body
+    cache.store(url, response.status_code, dict(response.headers), response.content)
+    return response.text, 'network'
@@ -0,0 +1,78 @@
+"""
+Page load profiles for the Selenium scraper
+The store page is loaded again for every coupon, so anything the scraper
+never reads (images, fonts, media, ad and analytics scripts) is blocked at
+the network layer with CDP Network.setBlockedURLs instead of being fetched
+on every load. The lean profile also returns from driver.get() at
+DOMContentLoaded (eager page load strategy); the waits that follow already
+check for the coupon buttons themselves.
+
+setBlockedURLs only covers the tab it was sent to, so the scraper applies
+the profile again to every voucher tab it switches to. Images are also
+switched off browser-wide with a content setting, which covers a tab opened
+by a click from its very first request.
+"""
+
+# URL patterns per kind of resource (CDP wildcards, * matches anything)
+BLOCK_PATTERNS = {
+    'images': ['*.png*', '*.jpg*', '*.jpeg*', '*.gif*', '*.webp*', '*.avif*', '*.ico*', '*.svg*'],
+    'fonts': ['*.woff*', '*.woff2*', '*.ttf*', '*.otf*', '*.eot*'],
+    'media': ['*.mp4*', '*.webm*', '*.mp3*', '*.m3u8*'],
+    'third_party': [
+        '*googletagmanager.com*', '*google-analytics.com*', '*doubleclick.net*',
+        '*googlesyndication.com*', '*adservice.google.*', '*googleadservices.com*',
+        '*connect.facebook.net*', '*facebook.com/tr*', '*hotjar.com*', '*clarity.ms*',
+        '*criteo.*', '*taboola.com*', '*outbrain.com*', '*scorecardresearch.com*',
+        '*analytics.tiktok.com*', '*bat.bing.com*', '*cdn.onesignal.com*', '*sentry.io*',
+    ],
+}
+
+
+class LoadProfile:
+    """
+    What a scraper browser downloads
+    - block: keys of BLOCK_PATTERNS to block on every page
+    - page_load_strategy: 'normal' waits for the load event, 'eager' for DOMContentLoaded
+    - disable_extensions: start Chrome without any extensions
+    """
+
+    def __init__(self, name, block=(), page_load_strategy='normal', disable_extensions=False):
+        self.name = name
+        self.block = tuple(block)
+        self.page_load_strategy = page_load_strategy
+        self.disable_extensions = disable_extensions
+
+    @property
+    def blocked_urls(self):
+        return [pattern for kind in self.block for pattern in BLOCK_PATTERNS[kind]]
+
+    def apply_options(self, options):
+        """Chrome options part, before the browser starts"""
+        options.page_load_strategy = self.page_load_strategy
+        if self.disable_extensions:
+            options.add_argument('--disable-extensions')
+        if 'images' in self.block:
+            options.add_experimental_option('prefs', {'profile.managed_default_content_settings.images': 2})
+
+    def apply_driver(self, driver):
+        """CDP part, on the current tab only - call it again for every tab opened later"""
+        if self.blocked_urls:
+            driver.execute_cdp_cmd('Network.enable', {})
+            driver.execute_cdp_cmd('Network.setBlockedURLs', {'urls': self.blocked_urls})
+
+
+PROFILES = {
+    'full': LoadProfile('full'),
+    'lean': LoadProfile('lean', block=('images', 'fonts', 'media', 'third_party'),
+                        page_load_strategy='eager', disable_extensions=True),
+}
+DEFAULT_PROFILE = 'lean'
+
+
+def get_profile(profile):
+    """A LoadProfile from a name in PROFILES (or a LoadProfile, returned as is)"""
+    if isinstance(profile, LoadProfile):
+        return profile
+    if profile not in PROFILES:
+        raise ValueError(f"Unknown load profile {profile!r}, choose from {', '.join(PROFILES)}")
+    return PROFILES[profile]
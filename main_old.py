@@ -8,15 +8,35 @@
 """
 
 import requests
-from bs4 import BeautifulSoup
+from lxml import etree, html as lxml_html
+from bisect import bisect_left
 import json
-import re
-import time
 import random
 from datetime import datetime
 from pathlib import Path
+from urllib.parse import urlparse
 import sys
 
+from dedupe_index import SOURCE_PAGE, DedupeIndex, coupon_key, normalize_code, normalize_title, write_unique
+from extraction_rules import EXPIRY_DATE, extract_discount
+from http_cache import HttpCache, cached_get, entry_text
+from rate_control import retry_after_of, shared as shared_rate_control
+from result_sink import STREAM_FILE, ResultSink, read_stream
+
+
+SKIP_TEXT_TAGS = {'script', 'style'}
+
+# coupons.csv holds both kinds, one row each as soon as it is written
+CSV_FIELDS = ['TYPE', 'DESCRIPTION', 'CODE_OR_DISCOUNT', 'EXPIRY_DATE', 'SCRAPED_AT']
+CSV_SPECS = {
+    'coupon': ('coupons.csv', CSV_FIELDS, lambda c: {
+        'TYPE': 'coupon', 'DESCRIPTION': c['description'], 'CODE_OR_DISCOUNT': c['code'],
+        'EXPIRY_DATE': c['expiry_date'], 'SCRAPED_AT': c['scraped_at']}),
+    'offer': ('coupons.csv', CSV_FIELDS, lambda o: {
+        'TYPE': 'offer', 'DESCRIPTION': o['description'], 'CODE_OR_DISCOUNT': o['discount'],
+        'EXPIRY_DATE': '', 'SCRAPED_AT': o['scraped_at']}),
+}
+
 
 class TravelokaScraper:
     """
@@ -26,7 +46,7 @@ class TravelokaScraper:
     - Extracts offers/deals with discounts
     """
     
-    def __init__(self):
+    def __init__(self, use_cache=True):
         self.user_agent_list = [
             'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
             'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/92.0.4515.131 Safari/537.36',
@@ -39,6 +59,10 @@ class TravelokaScraper:
         self.coupons = []
         self.offers = []
         self.current_url = None
+        # Shared on-disk page cache (TTL + ETag/Last-Modified revalidation)
+        self.cache = HttpCache() if use_cache else None
+        # Adaptive per-host pacing shared with the other fetch paths
+        self.rate = shared_rate_control()
         
     def setup_session(self):
         """Configure session to mimic real browser"""
@@ -57,16 +81,30 @@ class TravelokaScraper:
         self.session.timeout = 15
         
     def fetch_page(self, url):
-        """Fetch webpage with human-like delays"""
+        """Fetch webpage, paced per host by the adaptive rate controller"""
         try:
-            # Random delay to appear human-like
-            delay = random.uniform(1, 3)
+            if self.cache:
+                entry = self.cache.get(url)
+                if self.cache.is_fresh(entry):
+                    print(f"📦 Cached: {url}")
+                    return entry_text(entry)
+            
             print(f"📥 Fetching: {url}")
-            print(f"   (Waiting {delay:.1f}s to appear human-like)")
-            time.sleep(delay)
+            delay, _ = self.rate.limits(urlparse(url).netloc)
+            print(f"   (Pacing: {delay:.1f}s between requests to this host)")
             
-            response = self.session.get(url, allow_redirects=True, verify=True)
-            response.raise_for_status()
+            # Waits for the host's turn, then slows down or speeds up from the outcome
+            with self.rate.request(url) as outcome:
+                if self.cache:
+                    text, source = cached_get(self.session, url, self.cache, allow_redirects=True, verify=True)
+                    print(f"✅ Response: {'304 Not Modified (cached copy still current)' if source == 'revalidated' else 200}")
+                    print(f"   Size: {len(text):,} chars")
+                    return text
+                
+                response = self.session.get(url, allow_redirects=True, verify=True)
+                outcome['status'] = response.status_code
+                outcome['retry_after'] = retry_after_of(response.headers)
+                response.raise_for_status()
             
             print(f"✅ Response: {response.status_code}")
             print(f"   Size: {len(response.content):,} bytes")
@@ -87,37 +125,50 @@ class TravelokaScraper:
     
     def parse_items(self, html):
         """Extract coupons and offers from HTML"""
-        soup = BeautifulSoup(html, 'html.parser')
-        h3_tags = soup.find_all('h3')
+        root = lxml_html.fromstring(html)
+        text, spans, bounds = self._index_text(root)
+        dates = [(m.start(), m.end()) for m in EXPIRY_DATE.finditer(text)]
+        date_starts = [d[0] for d in dates]
+        h3_tags = list(root.iter('h3'))
         
         print(f"\n🔍 Extracting data from {len(h3_tags)} items...")
         
+        def first_date(start, end):
+            """First date lying wholly inside text[start:end], or None"""
+            i = bisect_left(date_starts, start)
+            if i < len(dates) and dates[i][1] <= end:
+                return dates[i]
+            return None
+        
         for h3 in h3_tags:
             try:
-                description = h3.get_text(strip=True)
+                first_piece, last_piece = spans[h3][2:]
+                description = ''.join(
+                    text[bounds[i]:bounds[i + 1]].strip() for i in range(first_piece, last_piece)
+                )
                 if not description or len(description) < 10:
                     continue
                 
-                # Find parent container with complete info
-                parent = h3
+                # Find parent container with complete info - offsets into the
+                # one document string, so no ancestor is ever re-stringified
                 full_text = description
+                expiry = 'N/A'
                 
+                parent = h3
                 for _ in range(10):
-                    parent = parent.find_parent()
-                    if not parent:
+                    parent = parent.getparent()
+                    if parent is None:
                         break
-                    parent_text = parent.get_text()
-                    if re.search(r'\d{1,2}/\d{1,2}/\d{4}', parent_text):
-                        full_text = parent_text
+                    p_start, p_end = spans[parent][:2]
+                    date = first_date(p_start, p_end)
+                    if date:
+                        full_text = text[p_start:p_end]
+                        expiry = text[date[0]:date[1]]
                         break
                 
                 # Extract discount code
                 code = self._extract_code(description, full_text)
                 
-                # Extract expiry date
-                date_match = re.search(r'(\d{1,2}/\d{1,2}/\d{4})', full_text)
-                expiry = date_match.group(1) if date_match else 'N/A'
-                
                 # Classify and store
                 if code != 'N/A' and expiry != 'N/A':
                     self.coupons.append({
@@ -140,37 +191,48 @@ class TravelokaScraper:
         
         self._remove_duplicates()
     
+    def _index_text(self, root):
+        """
+        One pass over the tree: concatenate every text node into a single
+        string and record each element's [start, end) character span and
+        [first, last) text-piece span, so any element's text is a slice
+        """
+        pieces = []
+        starts = {}
+        spans = {}
+        pos = 0
+        for event, el in etree.iterwalk(root, events=('start', 'end')):
+            is_element = isinstance(el.tag, str)
+            if event == 'start':
+                starts[el] = (pos, len(pieces))
+                if is_element and el.text and el.tag not in SKIP_TEXT_TAGS:
+                    pieces.append(el.text)
+                    pos += len(el.text)
+            else:
+                start, first_piece = starts.pop(el)
+                if is_element:
+                    spans[el] = (start, pos, first_piece, len(pieces))
+                if el.tail and el is not root:
+                    pieces.append(el.tail)
+                    pos += len(el.tail)
+        text = ''.join(pieces)
+        # Piece boundaries, so get_text(strip=True) can be rebuilt for small elements
+        bounds = [0]
+        for piece in pieces:
+            bounds.append(bounds[-1] + len(piece))
+        return text, spans, bounds
+    
     def _extract_code(self, description, full_text):
         """Extract discount code from text"""
-        combined = f"{description} {full_text}"
-        
-        # Check for percentage
-        pct = re.search(r'(\d+)%\s*(?:OFF|off|savings)', combined)
-        if pct:
-            return f"{pct.group(1)}%OFF"
-        
-        # Check for dollar amount
-        dollar = re.search(r'\$(\d+)\s*(?:OFF|off|savings)', combined)
-        if dollar:
-            return f"${dollar.group(1)}OFF"
-        
-        # Check for credits
-        if 'CREDITS' in combined:
-            credits = re.search(r'\$(\d+)\s*CREDITS', combined)
-            return f"${credits.group(1)}CREDITS" if credits else '$8CREDITS'
-        
-        # Check for gift card
-        if 'GIFTCARD' in combined or 'GIFT CARD' in combined:
-            return 'GIFTCARD'
-        
-        return 'N/A'
+        # Percentage, then dollar amount, then credits, then gift card
+        return extract_discount(f"{description} {full_text}")
     
     def _remove_duplicates(self):
-        """Remove duplicate entries"""
+        """Remove duplicate entries (compared normalized, see dedupe_index)"""
         seen = set()
         unique_coupons = []
         for c in self.coupons:
-            key = (c['description'], c['code'], c['expiry_date'])
+            key = coupon_key(c['code'], c['description'], c['expiry_date'])
             if key not in seen:
                 seen.add(key)
                 unique_coupons.append(c)
@@ -179,13 +241,13 @@ class TravelokaScraper:
         seen = set()
         unique_offers = []
         for o in self.offers:
-            key = (o['description'], o['discount'])
+            key = (normalize_title(o['description']), normalize_code(o['discount']))
             if key not in seen:
                 seen.add(key)
                 unique_offers.append(o)
         self.offers = unique_offers
     
-    def _save_as_txt(self, output_dir, url):
+    def _save_as_txt(self, output_dir, url, coupons, offers):
         """Save results as human-readable text file"""
         # Extract filename from URL (e.g., https://www.cuponation.com.sg/traveloka-promo-code -> traveloka-promo-code)
         from urllib.parse import urlparse
@@ -208,16 +270,16 @@ class TravelokaScraper:
             # Metadata
             f.write(f'Scraped on: {datetime.now().strftime("%Y-%m-%d %H:%M:%S")}\n')
             f.write(f'Source: https://www.cuponation.com.sg/traveloka-promo-code\n')
-            f.write(f'Total Coupons: {len(self.coupons)}\n')
-            f.write(f'Total Offers: {len(self.offers)}\n')
-            f.write(f'Total Items: {len(self.coupons) + len(self.offers)}\n')
+            f.write(f'Total Coupons: {len(coupons)}\n')
+            f.write(f'Total Offers: {len(offers)}\n')
+            f.write(f'Total Items: {len(coupons) + len(offers)}\n')
             f.write('\n' + '='*80 + '\n\n')
             
             # Coupons Section
             f.write('COUPONS\n')
             f.write('-'*80 + '\n\n')
             
-            for i, coupon in enumerate(self.coupons, 1):
+            for i, coupon in enumerate(coupons, 1):
                 f.write(f'{i}. {coupon["description"]}\n')
                 f.write(f'   Code: {coupon["code"]}\n')
                 f.write(f'   Expires: {coupon["expiry_date"]}\n')
@@ -229,8 +291,8 @@ class TravelokaScraper:
             f.write('OFFERS & DEALS\n')
             f.write('-'*80 + '\n\n')
             
-            if self.offers:
-                for i, offer in enumerate(self.offers, 1):
+            if offers:
+                for i, offer in enumerate(offers, 1):
                     f.write(f'{i}. {offer["description"]}\n')
                     f.write(f'   Discount: {offer["discount"]}\n')
                     f.write(f'   Scraped: {offer["scraped_at"]}\n')
@@ -245,52 +307,72 @@ class TravelokaScraper:
         
         print(f"   ✅ Working Reports/{filename}.txt")
     
-    def save_results(self, url):
-        """Save to JSON, CSV, and TXT formats"""
-        output = Path('output')
-        output.mkdir(exist_ok=True)
+    def save_results(self, url, output_dir='output'):
+        """Stream items to JSONL/CSV, then build the JSON and TXT reports from the stream"""
+        output = Path(output_dir)
         
         print(f"\n💾 Saving {len(self.coupons) + len(self.offers)} items...")
         
+        with ResultSink(output, CSV_SPECS) as sink:
+            for c in self.coupons:
+                sink.write('coupon', c)
+            for o in self.offers:
+                sink.write('offer', o)
+        print(f"   ✅ {output}/{STREAM_FILE}")
+        print(f"   ✅ {output}/coupons.csv")
+        
+        self.write_reports(url, output)
+        self._index_coupons(url)
+    
+    def _index_coupons(self, url):
+        """Record this store's coupons in the cross-store dedupe index (store memberships only)"""
+        index = DedupeIndex()
+        try:
+            # 'code' here is the discount label shown on the store page, not a
+            # promo code, so it must never be reused for a voucher
+            keys = [index.record(url, c['code'], c['description'], c['expiry_date'], source=SOURCE_PAGE)
+                    for c in self.coupons]
+            index.sync_store(url, keys)
+        finally:
+            index.close()
+    
+    def write_reports(self, url, output_dir='output'):
+        """JSON and TXT reports derived from the results.jsonl stream"""
+        output = Path(output_dir)
+        stream = read_stream(output / STREAM_FILE)
+        coupons = stream.get('coupon', [])
+        offers = stream.get('offer', [])
+        
         # JSON files
         with open(output / 'coupons.json', 'w', encoding='utf-8') as f:
-            json.dump(self.coupons, f, indent=2, ensure_ascii=False)
-        print(f"   ✅ output/coupons.json ({len(self.coupons)} items)")
+            json.dump(coupons, f, indent=2, ensure_ascii=False)
+        print(f"   ✅ {output}/coupons.json ({len(coupons)} items)")
         
         with open(output / 'offers.json', 'w', encoding='utf-8') as f:
-            json.dump(self.offers, f, indent=2, ensure_ascii=False)
-        print(f"   ✅ output/offers.json ({len(self.offers)} items)")
+            json.dump(offers, f, indent=2, ensure_ascii=False)
+        print(f"   ✅ {output}/offers.json ({len(offers)} items)")
         
         with open(output / 'all_results.json', 'w', encoding='utf-8') as f:
             json.dump({
                 'scraped_at': datetime.now().isoformat(),
                 'source': 'https://www.cuponation.com.sg/traveloka-promo-code',
                 'summary': {
-                    'total_coupons': len(self.coupons),
-                    'total_offers': len(self.offers),
-                    'total_items': len(self.coupons) + len(self.offers)
+                    'total_coupons': len(coupons),
+                    'total_offers': len(offers),
+                    'total_items': len(coupons) + len(offers)
                 },
-                'coupons': self.coupons,
-                'offers': self.offers
+                'coupons': coupons,
+                'offers': offers
             }, f, indent=2, ensure_ascii=False)
-        print(f"   ✅ output/all_results.json")
-        
-        # CSV for spreadsheets
-        with open(output / 'coupons.csv', 'w', encoding='utf-8') as f:
-            f.write('TYPE,DESCRIPTION,CODE_OR_DISCOUNT,EXPIRY_DATE,SCRAPED_AT\n')
-            for c in self.coupons:
-                desc = c['description'].replace('"', '""')
-                f.write(f'coupon,"{desc}","{c["code"]}","{c["expiry_date"]}","{c["scraped_at"]}"\n')
-            for o in self.offers:
-                desc = o['description'].replace('"', '""')
-                f.write(f'offer,"{desc}","{o["discount"]}","","{o["scraped_at"]}"\n')
-        print(f"   ✅ output/coupons.csv")
+        print(f"   ✅ {output}/all_results.json")
         
         # Save as TXT (human-readable format)
-        self._save_as_txt(output, url)
+        self._save_as_txt(output, url, coupons, offers)
     
     def run(self, url=None):
-        """Execute the scraper"""
+        """Execute the scraper (url may also be a list of store URLs)"""
+        if isinstance(url, (list, tuple)):
+            return self.run_many(url)
         if url is None:
             url = 'https://www.cuponation.com.sg/traveloka-promo-code'
         html = self.fetch_page(url)
@@ -307,6 +389,41 @@ class TravelokaScraper:
         
         print("⚠️  No data extracted")
         return False
+    
+    def run_many(self, urls, concurrency=10, per_host=4):
+        """Fetch many store pages concurrently, parsing and saving each one as its fetch completes"""
+        from async_fetcher import AsyncFetcher
+        
+        fetcher = AsyncFetcher(
+            headers=dict(self.session.headers),
+            concurrency=concurrency,
+            per_host=per_host,
+            cache=self.cache,
+            rate_control=self.rate
+        )
+        saved = []
+        
+        def save_page(url, html):
+            if not html:
+                return
+            self.coupons = []
+            self.offers = []
+            self.parse_items(html)
+            if self.coupons or self.offers:
+                self.current_url = url
+                slug = urlparse(url).path.strip('/') or 'report'
+                self.save_results(url, output_dir=Path('output') / slug)
+                saved.append(url)
+        
+        print(f"📥 Fetching {len(urls)} pages ({concurrency} connections, up to {per_host}/host, adaptive pacing)")
+        fetcher.fetch_each(urls, save_page)
+        self.rate.report()
+        
+        print(f"\n📊 {len(saved)} of {len(urls)} stores saved")
+        if saved:
+            path, unique = write_unique('output', urls)
+            print(f"   ✅ {path} ({len(unique)} unique coupons across stores)")
+        return bool(saved)
 
 
 def main():
@@ -328,13 +445,16 @@ def main():
     print(f"\n⏰ {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
     print("\n🔒 Anti-Bot Features:")
     print("   ✓ Rotating user agents")
-    print("   ✓ Random request delays (1-3 seconds)")
+    print("   ✓ Adaptive per-host request pacing (backs off on 429/5xx)")
     print("   ✓ Realistic HTTP headers")
     print("   ✓ Natural referer")
     print("   ✓ Connection pooling")
     
+    # Store URLs on the command line are fetched concurrently
+    urls = sys.argv[1:]
+    
     scraper = TravelokaScraper()
-    success = scraper.run()
+    success = scraper.run(urls if len(urls) > 1 else (urls[0] if urls else None))
     
     print("\n" + "="*70)
     if success:
@@ -0,0 +1,106 @@
+"""
+Per-stage timing for scraper runs
+Every timed stage (page load, scroll, click, read, reload, save, each
+WebDriver wait...) is appended to a JSON-lines file as it finishes and kept
+in memory, so each store gets a count / p50 / p95 / max summary per stage
+at the end of the run.
+
+One line per stage:
+    {"ts": ..., "run": "20250101-120000", "store": url, "stage": "click",
+     "seconds": 0.412, "ok": true, ...extra fields}
+"""
+
+import json
+import math
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of a list of numbers"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, math.ceil(pct / 100 * len(ordered)) - 1))
+    return ordered[rank]
+
+
+class RunMetrics:
+    """
+    Stage timers for one run, safe to share between worker threads
+    - path: JSON-lines file the events are appended to (None = memory only)
+    """
+
+    def __init__(self, path=None, run_id=None):
+        self.path = Path(path) if path else None
+        self.run_id = run_id or datetime.now().strftime('%Y%m%d-%H%M%S')
+        self.lock = threading.Lock()
+        self.durations = {}
+        self.file = None
+        if self.path:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self.file = open(self.path, 'a', encoding='utf-8')
+
+    def record(self, stage, seconds, store=None, ok=True, **fields):
+        """Add one finished stage"""
+        event = {'ts': round(time.time(), 3), 'run': self.run_id, 'store': store,
+                 'stage': stage, 'seconds': round(seconds, 4), 'ok': ok}
+        event.update(fields)
+        with self.lock:
+            self.durations.setdefault((store, stage), []).append(seconds)
+            if self.file:
+                self.file.write(json.dumps(event, ensure_ascii=False) + '\n')
+                self.file.flush()
+
+    @contextmanager
+    def stage(self, name, store=None, **fields):
+        """
+        Time a block as one stage; yields a dict for fields known only at the end
+            with metrics.stage('read', store=url, coupon=3) as extra:
+                extra['found'] = bool(code)
+        """
+        extra = dict(fields)
+        started = time.perf_counter()
+        try:
+            yield extra
+        except BaseException:
+            self.record(name, time.perf_counter() - started, store, ok=False, **extra)
+            raise
+        self.record(name, time.perf_counter() - started, store, **extra)
+
+    def summary(self, store=None):
+        """{stage: {count, total, p50, p95, max}} for one store (None = every store)"""
+        with self.lock:
+            merged = {}
+            for (s, stage), values in self.durations.items():
+                if store is None or s == store:
+                    merged.setdefault(stage, []).extend(values)
+        return {
+            stage: {
+                'count': len(values),
+                'total': sum(values),
+                'p50': percentile(values, 50),
+                'p95': percentile(values, 95),
+                'max': max(values),
+            }
+            for stage, values in merged.items()
+        }
+
+    def report(self, store=None):
+        """Print the per-stage summary, slowest total first"""
+        summary = self.summary(store)
+        if not summary:
+            return
+        print(f"\n=== Stage timing{' - ' + store if store else ''} ===")
+        print(f"  {'stage':22s} {'count':>5s} {'total s':>8s} {'p50 s':>7s} {'p95 s':>7s} {'max s':>7s}")
+        for stage, s in sorted(summary.items(), key=lambda kv: -kv[1]['total']):
+            print(f"  {stage:22s} {s['count']:5d} {s['total']:8.2f} {s['p50']:7.2f} {s['p95']:7.2f} {s['max']:7.2f}")
+
+    def close(self):
+        with self.lock:
+            if self.file:
+                self.file.close()
+                self.file = None
@@ -0,0 +1,276 @@
+"""
+Adaptive per-host rate control shared by every fetch path
+One RateController decides, per host, how long to wait between requests
+and how many may be in flight, from what the host actually does:
+- a fast successful response shortens the delay a little (additive) and,
+  after a run of them, allows one more request in flight
+- 429 / 503 / other 5xx / timeouts double the delay and halve the
+  concurrency (multiplicative), and Retry-After pauses the host
+- slow responses (above target_latency) stop the speed-up
+So a run goes as fast as the site tolerates instead of at a fixed
+worst-case pace. requests (main_old, VoucherResolver), AsyncFetcher and
+Scrapy (AdaptiveRateMiddleware) report to shared(), the HTTP controller of
+the process. Browser page loads take seconds and a pool runs one per worker,
+so the Selenium scraper, browser_pool and BrowserDownloaderMiddleware pace
+theirs with shared_browser(): same rules, a browser-sized target latency and
+a concurrency that starts at the number of browsers.
+"""
+
+import asyncio
+import random
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+from urllib.parse import urlparse
+
+
+THROTTLE_STATUSES = {429, 503}
+# A store page load in Chrome (driver.get + page ready) that takes longer than
+# this is slow; plain HTTP requests use RateController's default of 2 s
+BROWSER_TARGET_LATENCY = 10.0
+
+
+def host_of(url):
+    return urlparse(url).netloc or url
+
+
+def status_of(error):
+    """HTTP status carried by a requests / aiohttp exception, None if there is none"""
+    response = getattr(error, 'response', None)
+    status = getattr(response, 'status_code', None) or getattr(error, 'status', None)
+    return status if isinstance(status, int) else None
+
+
+def headers_of(error):
+    """Response headers carried by a requests / aiohttp exception, None if there are none"""
+    response = getattr(error, 'response', None)
+    return getattr(response, 'headers', None) or getattr(error, 'headers', None)
+
+
+def retry_after_of(headers):
+    """Seconds from a Retry-After header (delta form), None if absent"""
+    value = (headers or {}).get('Retry-After', '')
+    return float(value) if str(value).strip().isdigit() else None
+
+
+class HostRate:
+    """Current delay / concurrency and counters of one host"""
+
+    def __init__(self, delay, concurrency):
+        self.delay = delay
+        self.concurrency = concurrency
+        self.in_flight = 0
+        self.next_allowed = 0.0
+        self.streak = 0
+        self.latency = None
+        self.requests = 0
+        self.throttled = 0
+        self.errors = 0
+
+
+class RateController:
+    """
+    AIMD rate limits per host, safe to share between threads and event loops
+    - start_delay / min_delay / max_delay: seconds between request starts
+    - start_concurrency / max_concurrency: requests in flight at once
+    - step: seconds taken off the delay per fast success
+    - target_latency: responses slower than this stop the speed-up
+    - jitter: +/- fraction applied to each delay, so requests do not tick
+    - name: shown in report()
+    """
+
+    def __init__(self, start_delay=1.0, min_delay=0.25, max_delay=30.0, start_concurrency=1,
+                 max_concurrency=4, step=0.1, target_latency=2.0, jitter=0.2, name='http'):
+        self.start_delay = start_delay
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.start_concurrency = max(1, start_concurrency)
+        self.max_concurrency = max(1, max_concurrency)
+        self.step = step
+        self.target_latency = target_latency
+        self.jitter = jitter
+        self.name = name
+        self.hosts = {}
+        self.lock = threading.Lock()
+
+    def host(self, host):
+        """HostRate for a host (created on first use); call with self.lock held"""
+        if host not in self.hosts:
+            self.hosts[host] = HostRate(self.start_delay, min(self.start_concurrency, self.max_concurrency))
+        return self.hosts[host]
+
+    def widen(self, concurrency):
+        """Allow at least this many requests in flight per host, from the start (e.g. a pool's browsers)"""
+        with self.lock:
+            self.max_concurrency = max(self.max_concurrency, concurrency)
+            self.start_concurrency = max(self.start_concurrency, concurrency)
+            for h in self.hosts.values():
+                h.concurrency = max(h.concurrency, concurrency)
+
+    def try_acquire(self, host, slot=True):
+        """
+        Take a request slot for host: 0 when taken, else seconds to wait before
+        trying again. slot=False only waits for the host's turn, for a request
+        that runs under a slot already taken (e.g. the tabs of one batch)
+        """
+        now = time.monotonic()
+        with self.lock:
+            h = self.host(host)
+            if slot and h.in_flight >= h.concurrency:
+                return 0.05
+            if now < h.next_allowed:
+                return h.next_allowed - now
+            if slot:
+                h.in_flight += 1
+            h.next_allowed = now + h.delay * random.uniform(1 - self.jitter, 1 + self.jitter)
+            return 0
+
+    def acquire(self, host, slot=True):
+        """Block until a request to host may start"""
+        while True:
+            wait = self.try_acquire(host, slot)
+            if not wait:
+                return
+            time.sleep(wait)
+
+    async def acquire_async(self, host):
+        """acquire() for asyncio code"""
+        while True:
+            wait = self.try_acquire(host)
+            if not wait:
+                return
+            await asyncio.sleep(wait)
+
+    def observe(self, host, latency=None, status=None, error=False, retry_after=None):
+        """Adjust host's delay / concurrency after one response (or failure)"""
+        now = time.monotonic()
+        with self.lock:
+            h = self.host(host)
+            h.requests += 1
+            if latency is not None:
+                h.latency = latency if h.latency is None else 0.8 * h.latency + 0.2 * latency
+            if error or (status is not None and (status in THROTTLE_STATUSES or status >= 500)):
+                # Multiplicative decrease
+                h.throttled += status in THROTTLE_STATUSES
+                h.errors += status not in THROTTLE_STATUSES
+                h.delay = min(self.max_delay, max(h.delay * 2, self.start_delay))
+                h.concurrency = max(1, h.concurrency // 2)
+                h.streak = 0
+                if retry_after:
+                    h.next_allowed = max(h.next_allowed, now + min(retry_after, self.max_delay * 4))
+            elif status is None or status < 400:
+                if latency is not None and latency > self.target_latency:
+                    h.streak = 0
+                    return
+                # Additive increase
+                h.delay = max(self.min_delay, h.delay - self.step)
+                h.streak += 1
+                if h.streak >= h.concurrency * 4 and h.concurrency < self.max_concurrency:
+                    h.concurrency += 1
+                    h.streak = 0
+
+    def free(self, host):
+        """Give back a slot taken with acquire(), without reporting a request"""
+        with self.lock:
+            h = self.host(host)
+            h.in_flight = max(0, h.in_flight - 1)
+
+    def release(self, host, latency=None, status=None, error=False, retry_after=None):
+        """Give back a slot taken with acquire() and report how the request went"""
+        self.free(host)
+        self.observe(host, latency, status, error, retry_after)
+
+    @contextmanager
+    def request(self, url):
+        """
+        Wait for a slot, run the block as one request, report it:
+            with rate.request(url) as outcome:
+                response = session.get(url)
+                outcome['status'] = response.status_code
+        An exception is judged by the HTTP status it carries, or counts as a
+        failed request (timeout, connection error) when it has none.
+        outcome['skip'] = True gives the slot back without reporting anything
+        (the request was never sent)
+        """
+        host = host_of(url)
+        self.acquire(host)
+        outcome = {'status': None, 'error': False, 'retry_after': None, 'skip': False}
+        started = time.monotonic()
+        try:
+            yield outcome
+        except BaseException as e:
+            status = outcome['status'] or status_of(e)
+            self.release(host, time.monotonic() - started, status, error=status is None,
+                         retry_after=outcome['retry_after'] or retry_after_of(headers_of(e)))
+            raise
+        if outcome['skip']:
+            self.free(host)
+        else:
+            self.release(host, time.monotonic() - started, outcome['status'], outcome['error'], outcome['retry_after'])
+
+    @asynccontextmanager
+    async def request_async(self, url):
+        """request() for asyncio code"""
+        host = host_of(url)
+        await self.acquire_async(host)
+        outcome = {'status': None, 'error': False, 'retry_after': None, 'skip': False}
+        started = time.monotonic()
+        try:
+            yield outcome
+        except BaseException as e:
+            status = outcome['status'] or status_of(e)
+            self.release(host, time.monotonic() - started, status, error=status is None,
+                         retry_after=outcome['retry_after'] or retry_after_of(headers_of(e)))
+            raise
+        if outcome['skip']:
+            self.free(host)
+        else:
+            self.release(host, time.monotonic() - started, outcome['status'], outcome['error'], outcome['retry_after'])
+
+    def limits(self, host):
+        """(delay, concurrency) currently allowed for host"""
+        with self.lock:
+            h = self.host(host)
+            return h.delay, h.concurrency
+
+    def report(self):
+        """Print where each host's limits ended up"""
+        with self.lock:
+            hosts = list(self.hosts.items())
+        if not hosts:
+            return
+        print(f"\n=== Rate control ({self.name}) ===")
+        print(f"  {'host':32s} {'requests':>8s} {'delay s':>8s} {'conc':>5s} {'latency s':>9s} {'429/503':>8s} {'errors':>7s}")
+        for host, h in sorted(hosts):
+            latency = f"{h.latency:9.2f}" if h.latency is not None else f"{'-':>9s}"
+            print(f"  {host[:32]:32s} {h.requests:8d} {h.delay:8.2f} {h.concurrency:5d} {latency} "
+                  f"{h.throttled:8d} {h.errors:7d}")
+
+
+_shared = None
+_shared_browser = None
+_shared_lock = threading.Lock()
+
+
+def shared():
+    """The process-wide RateController every scraper uses by default"""
+    global _shared
+    with _shared_lock:
+        if _shared is None:
+            _shared = RateController()
+        return _shared
+
+
+def shared_browser(browsers=1):
+    """
+    The process-wide RateController for browser page loads; browsers (the
+    size of a browser pool) is how many loads per host it allows from the start
+    """
+    global _shared_browser
+    with _shared_lock:
+        if _shared_browser is None:
+            _shared_browser = RateController(start_concurrency=browsers, max_concurrency=max(4, browsers),
+                                             target_latency=BROWSER_TARGET_LATENCY, name='browser')
+        elif browsers > _shared_browser.start_concurrency:
+            _shared_browser.widen(browsers)
+        return _shared_browser
@@ -0,0 +1,93 @@
+"""
+Streaming result writer
+Every coupon/offer is appended to <output>/results.jsonl (and its CSV file)
+the moment it is extracted and flushed to disk in small batches, so a crash
+part-way through a store keeps everything found so far. The aggregate
+JSON/TXT reports are built from the stream once the store is done.
+"""
+
+import csv
+import json
+from pathlib import Path
+
+
+STREAM_FILE = 'results.jsonl'
+
+
+class ResultSink:
+    """
+    Append-only JSONL stream plus CSV files for one output folder
+    - csv_specs: {kind: (csv filename, fieldnames, row function or None)},
+      several kinds may share one CSV file
+    - flush_every: records buffered before the files are flushed
+    - on_flush: called after every flush (e.g. to save a checkpoint that
+      must never get ahead of what is on disk)
+    """
+
+    def __init__(self, output_dir, csv_specs=None, flush_every=10, on_flush=None):
+        self.output_dir = Path(output_dir)
+        self.on_flush = on_flush
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        self.flush_every = max(1, flush_every)
+        self.pending = 0
+        self.counts = {}
+        self.stream = open(self.output_dir / STREAM_FILE, 'w', encoding='utf-8')
+        self.files = {}
+        self.rows = {}
+        writers = {}
+        for kind, (filename, fieldnames, row) in (csv_specs or {}).items():
+            if filename not in writers:
+                f = open(self.output_dir / filename, 'w', encoding='utf-8', newline='')
+                writers[filename] = csv.DictWriter(f, fieldnames=fieldnames, extrasaction='ignore')
+                writers[filename].writeheader()
+                self.files[filename] = f
+            self.rows[kind] = (writers[filename], row)
+
+    def write(self, kind, record):
+        """Append one record of the given kind ('coupon', 'offer', ...)"""
+        self.stream.write(json.dumps({'kind': kind, **record}, ensure_ascii=False) + '\n')
+        if kind in self.rows:
+            writer, row = self.rows[kind]
+            writer.writerow(row(record) if row else record)
+        self.counts[kind] = self.counts.get(kind, 0) + 1
+        self.pending += 1
+        if self.pending >= self.flush_every:
+            self.flush()
+
+    def flush(self):
+        self.stream.flush()
+        for f in self.files.values():
+            f.flush()
+        self.pending = 0
+        if self.on_flush:
+            self.on_flush()
+
+    def close(self):
+        if self.stream.closed:
+            return
+        self.flush()
+        self.stream.close()
+        for f in self.files.values():
+            f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def read_stream(path):
+    """{kind: [records]} from a results.jsonl, ignoring a half-written last line"""
+    records = {}
+    path = Path(path)
+    if not path.exists():
+        return records
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            records.setdefault(record.pop('kind'), []).append(record)
+    return records
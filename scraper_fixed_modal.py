@@ -9,71 +9,246 @@ import sys
 import io
 sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
 
-import time
 import json
-import csv
-import re
-import pyperclip
+import threading
+import time
 from datetime import datetime
 from pathlib import Path
 from urllib.parse import urlparse
 
 from selenium import webdriver
-from selenium.webdriver.common.by import By
+from selenium.common.exceptions import SessionNotCreatedException
 from selenium.webdriver.chrome.options import Options
 from selenium.webdriver.chrome.service import Service
 from webdriver_manager.chrome import ChromeDriverManager
 
+from card_snapshot import card_buttons, card_id, card_keys, cards_of_type, click_cards, snapshot_cards
+from card_state import CardStateStore, card_fingerprint
+from checkpoint import Checkpoint
+from dedupe_index import DEFAULT_PATH as DEDUPE_PATH, SOURCE_VOUCHER, DedupeIndex, voucher_identity
+from extraction_rules import EXPIRY_DATE, is_title_line
+from code_capture import looks_like_code, read_code_from_dom, read_code_via_copy_hook
+from voucher_resolver import VoucherResolver, harvest_voucher_urls
+from http_cache import DEFAULT_PATH as HTTP_CACHE_PATH, HttpCache
+from load_profile import DEFAULT_PROFILE, PROFILES, get_profile
+from metrics import RunMetrics
+from rate_control import host_of, shared as shared_rate_control, shared_browser
+from result_sink import STREAM_FILE, ResultSink, read_stream
+from waits import Waiter
+
+
+PROMO_BUTTON_XPATH = "//*[contains(text(), 'See promo code')][@role='button']"
+OFFER_BUTTON_XPATH = "//div[@title='Get deal'][@role='button'] | //div[contains(@title, 'Get deal')][@role='button']"
+ALL_BUTTONS_XPATH = PROMO_BUTTON_XPATH + " | " + OFFER_BUTTON_XPATH
+
+
+DRIVER_PATH_CACHE = Path('.cache') / 'chromedriver.json'
+_driver_path = None
+_driver_path_lock = threading.Lock()
+
+
+def chromedriver_path(refresh=False):
+    """
+    chromedriver binary for this machine. webdriver-manager resolves it once
+    and the path is kept in memory and in .cache/chromedriver.json, so later
+    launches (and later runs) skip its version check; refresh=True resolves
+    it again (e.g. after a Chrome update)
+    """
+    global _driver_path
+    with _driver_path_lock:
+        if not refresh:
+            if _driver_path and Path(_driver_path).exists():
+                return _driver_path
+            try:
+                cached = json.loads(DRIVER_PATH_CACHE.read_text(encoding='utf-8'))['path']
+            except (OSError, ValueError, KeyError):
+                cached = None
+            if cached and Path(cached).exists():
+                _driver_path = cached
+                return _driver_path
+        _driver_path = ChromeDriverManager().install()
+        DRIVER_PATH_CACHE.parent.mkdir(parents=True, exist_ok=True)
+        DRIVER_PATH_CACHE.write_text(json.dumps({
+            'path': _driver_path,
+            'resolved_at': datetime.now().isoformat()
+        }), encoding='utf-8')
+        return _driver_path
+
+
+def start_chrome(options):
+    """webdriver.Chrome on the cached chromedriver, re-resolving it once if Chrome no longer matches"""
+    try:
+        return webdriver.Chrome(service=Service(chromedriver_path()), options=options)
+    except SessionNotCreatedException:
+        return webdriver.Chrome(service=Service(chromedriver_path(refresh=True)), options=options)
+
+
+def create_driver(headless=False, profile=DEFAULT_PROFILE, network_log=False, args=()):
+    """
+    Start a Chrome WebDriver with the scraper's standard options
+    - profile: load_profile name or LoadProfile (what the browser may download)
+    - network_log: record CDP Network events for driver.get_log('performance')
+    - args: extra Chrome command line switches
+    """
+    profile = get_profile(profile)
+    options = Options()
+    options.add_argument('--no-sandbox')
+    options.add_argument('--disable-dev-shm-usage')
+    options.add_argument('--disable-popup-blocking')
+    if headless:
+        options.add_argument('--headless=new')
+    options.add_argument('--disable-gpu')
+    options.add_argument('--window-size=1920,1080')
+    for arg in args:
+        options.add_argument(arg)
+    profile.apply_options(options)
+    if network_log:
+        options.set_capability('goog:loggingPrefs', {'performance': 'ALL'})
+    driver = start_chrome(options)
+    profile.apply_driver(driver)
+    return driver
+
+
+def simplify_coupon(c):
+    """Coupon record as written to the CSV/JSON outputs"""
+    title = c.get('description', 'N/A')
+    if title == 'N/A':
+        title = c.get('code', 'N/A')
+    return {
+        'Title': title,
+        'Code': c.get('code', 'N/A'),
+        'Expires': c.get('expiry', 'N/A')
+    }
+
+
+# Streamed while scraping, one row per coupon/offer as soon as it is found
+CSV_SPECS = {
+    'coupon': ('coupons.csv', ['Title', 'Code', 'Expires'], simplify_coupon),
+    'offer': ('offers.csv', ['title'], None),
+}
+
+
+def card_title(card, max_len):
+    """Card heading if it looks like a real title, else N/A"""
+    title_text = card['title'].strip()
+    if len(title_text) > 10 and 'CODE' not in title_text.upper():
+        return title_text[:max_len]
+    return "N/A"
+
 
 class TravelokaCodeScraper:
-    def __init__(self):
+    def __init__(self, tab_batch_size=1, output_dir='output', headless=False, direct_http=False,
+                 incremental=True, state_path='.cache/cards.sqlite', checkpoint=None, metrics=None,
+                 profile=DEFAULT_PROFILE, attach=False, rate=None, http_rate=None,
+                 dedupe_path=DEDUPE_PATH, cache_path=HTTP_CACHE_PATH):
         self.coupons = []
         self.offers = []
         self.driver = None
         self.current_url = None
+        self.output_dir = output_dir
+        self.headless = headless
+        self.wait = None
+        self.sink = None
+        # 1 = click one button, read it, reload (original behaviour)
+        # N > 1 = fire N clicks per page load and read the spawned tabs together
+        self.tab_batch_size = tab_batch_size
+        # Resolve voucher URLs once and fetch them over HTTP, browser only as fallback
+        self.direct_http = direct_http
+        # http_cache.HttpCache file for those voucher fetches
+        self.cache_path = cache_path
+        # Only click cards that are new or changed since the last run
+        self.incremental = incremental
+        self.state_path = state_path
+        # Coupons seen on every store (dedupe_index): a code already read from
+        # the same voucher on another store page is reused, and each store's
+        # coupons are recorded
+        self.dedupe_path = dedupe_path
+        # checkpoint.Checkpoint recording handled cards, None = no resume support
+        self.checkpoint = checkpoint
+        # metrics.RunMetrics shared by a pool, None = own file at <output_dir>/metrics.jsonl
+        self.metrics = metrics
+        # load_profile name: 'lean' blocks images, fonts, media and trackers
+        self.profile = profile
+        # Use a tab of the running browser_daemon instead of starting Chrome
+        self.attach = attach
+        # rate_control.RateControllers pacing browser loads (store pages, voucher
+        # tabs) and voucher fetches over HTTP per host
+        self.rate = rate or shared_browser()
+        self.http_rate = http_rate or shared_rate_control()
         
     def setup_driver(self):
         """Setup Chrome driver - headless mode"""
         try:
-            options = Options()
-            options.add_argument('--no-sandbox')
-            options.add_argument('--disable-dev-shm-usage')
-            options.add_argument('--disable-popup-blocking')
-            # options.add_argument('--headless')
-            options.add_argument('--disable-gpu')
-            options.add_argument('--window-size=1920,1080')
-            service = Service(ChromeDriverManager().install())
-            self.driver = webdriver.Chrome(service=service, options=options)
+            if self.attach:
+                from browser_daemon import attach_driver
+                self.driver = attach_driver(profile=self.profile)
+                return True
+            self.driver = create_driver(headless=self.headless, profile=self.profile)
             #print("[OK] Driver ready (headless mode)")
             return True
         except Exception as e:
             print(f"[ERROR] Driver setup failed: {e}")
             return False
     
-    def run(self):
+    def run(self, url=None):
         """Main execution"""
         try:
             if not self.setup_driver():
                 return False
             
-            #url = "https://www.cuponation.com.sg/traveloka-promo-code"
-            url = "https://www.cuponation.com.sg/singapore-zoo-coupon"
+            if url is None:
+                #url = "https://www.cuponation.com.sg/traveloka-promo-code"
+                url = "https://www.cuponation.com.sg/singapore-zoo-coupon"
             
+            return self.scrape_store(url)
+        finally:
+            if self.metrics:
+                self.metrics.close()
+            if self.driver and self.attach:
+                from browser_daemon import detach_driver
+                detach_driver(self.driver)
+                print("Detached from browser daemon")
+            elif self.driver:
+                self.driver.quit()
+                print("Browser closed")
+    
+    def scrape_store(self, url):
+        """Scrape one store page with the current driver (left open for reuse)"""
+        if self.checkpoint and self.checkpoint.is_done(url):
+            print(f"Already scraped {url} (checkpoint), skipping")
+            return True
+        
+        try:
+            self.coupons = []
+            self.offers = []
             self.current_url = url
+            if self.metrics is None:
+                self.metrics = RunMetrics(Path(self.output_dir) / 'metrics.jsonl')
+            self.wait = Waiter(self.driver, metrics=self.metrics, store=url)
+            # Coupons an interrupted run already streamed, restored below if the page is unchanged
+            previous = []
+            if self.checkpoint and self.checkpoint.has_progress(url):
+                previous = read_stream(Path(self.output_dir) / STREAM_FILE).get('coupon', [])
+            self.sink = ResultSink(self.output_dir, CSV_SPECS,
+                                   on_flush=self.checkpoint.save if self.checkpoint else None)
             print(f"Loading {url}...")
-            self.driver.get(url)
-            
             print("Waiting for page to load...")
-            time.sleep(5)
+            self.load_store_page(url, step='initial_load')
             
             # Accept cookies
             try:
-                self.driver.execute_script("""
-                    const btn = Array.from(document.querySelectorAll('button, a'))
-                        .find(el => el.textContent.includes('ACCEPT'));
-                    if (btn) btn.click();
-                """)
-                time.sleep(1)
+                with self.timed('cookies'):
+                    clicked = self.driver.execute_script("""
+                        const btn = Array.from(document.querySelectorAll('button, a'))
+                            .find(el => el.textContent.includes('ACCEPT'));
+                        if (btn) btn.click();
+                        return !!btn;
+                    """)
+                    if clicked:
+                        self.wait.until('cookie_banner', lambda d: not d.execute_script("""
+                            return Array.from(document.querySelectorAll('button, a'))
+                                .some(el => el.textContent.includes('ACCEPT') && el.offsetParent !== null);
+                        """), timeout=1)
             except:
                 pass
             
@@ -82,242 +257,95 @@ class TravelokaCodeScraper:
             # ===== Extract OFFERS (GET DEAL) first =====
             print("\n=== Extracting OFFERS (GET DEAL) ===")
             
-            # Simply find GET DEAL buttons and get titles from main page (no clicking)
-            offer_buttons = self.driver.find_elements(By.XPATH,
-                "//div[@title='Get deal'][@role='button'] | //div[contains(@title, 'Get deal')][@role='button']"
-            )
-            print(f"Found {len(offer_buttons)} GET DEAL buttons")
+            # Simply read GET DEAL cards from main page (no clicking), one script call
+            with self.timed('offers') as extra:
+                offer_cards = cards_of_type(
+                    snapshot_cards(self.driver, PROMO_BUTTON_XPATH, OFFER_BUTTON_XPATH), 'deal'
+                )
+                print(f"Found {len(offer_cards)} GET DEAL buttons")
             
-            for i, btn in enumerate(offer_buttons):
-                try:
-                    # Get title from parent card
-                    title = "N/A"
-                    try:
-                        parent = btn
-                        for _ in range(10):
-                            parent_class = parent.get_attribute('class') or ""
-                            if '_6tavkoa' in parent_class:
-                                break
-                            try:
-                                parent = parent.find_element(By.XPATH, './..')
-                            except:
-                                break
-                        
-                        title_elems = parent.find_elements(By.XPATH, ".//h3 | .//h4")
-                        if title_elems:
-                            title_text = title_elems[0].text.strip()
-                            if len(title_text) > 10 and 'CODE' not in title_text.upper():
-                                title = title_text[:200]
-                    except:
-                        pass
-                    
+                for i, card in enumerate(offer_cards):
+                    title = card_title(card, 200)
                     if title != "N/A":
                         self.offers.append({
                             'title': title
                         })
+                        self.sink.write('offer', self.offers[-1])
                         print(f"  {i+1}. {title[:60]}")
-                        
-                except Exception as e:
-                    print(f"  {i+1}. [ERROR] {str(e)[:40]}")
+                extra['offers'] = len(self.offers)
             
             print(f"Extracted {len(self.offers)} offers\n")
             
             # ===== Now extract COUPONS (SEE PROMO CODE) =====
             print("=== Extracting COUPONS (SEE PROMO CODE) ===")
             
-            # Scroll to load all coupons
-            print("Scrolling to load all coupons...")
-            last_height = self.driver.execute_script("return document.body.scrollHeight")
-            
-            for scroll_attempt in range(5):
-                self.driver.execute_script("window.scrollTo(0, document.body.scrollHeight);")
-                time.sleep(2)
-                try:
-                    load_more = self.driver.find_element(By.XPATH, 
-                        "//button[contains(text(), 'Load More')] | //a[contains(text(), 'Load More')]"
-                    )
-                    self.driver.execute_script("arguments[0].click();", load_more)
-                    time.sleep(2)
-                except:
-                    pass
-                new_height = self.driver.execute_script("return document.body.scrollHeight")
-                if new_height == last_height:
-                    break
-                last_height = new_height
+            # Scroll / Load More until the card count stops growing
+            print("Loading all coupons...")
+            with self.timed('scroll') as extra:
+                loaded = self.wait.cards_loaded(ALL_BUTTONS_XPATH)
+                if loaded:
+                    extra.update(cards=loaded['count'], clicks=loaded['clicks'])
+            if loaded:
+                print(f"{loaded['count']} cards after {loaded['clicks']} Load More clicks ({loaded['ms']} ms)")
             
-            # Get all See Promo Code buttons
-            promo_buttons = self.driver.find_elements(By.XPATH, 
-                "//*[contains(text(), 'See promo code')][@role='button']"
-            )
-            max_coupons = len(promo_buttons)
+            # Snapshot all See Promo Code cards in one round trip
+            with self.timed('snapshot'):
+                coupon_cards = cards_of_type(
+                    snapshot_cards(self.driver, PROMO_BUTTON_XPATH, OFFER_BUTTON_XPATH), 'code'
+                )
+            max_coupons = len(coupon_cards)
             print(f"Found {max_coupons} coupons")
             
             # Get page text for titles
             body_text = self.driver.execute_script("return document.body.innerText;")
             sections = body_text.split("SEE PROMO CODE")
             
-            original_window = self.driver.current_window_handle
-            
-            coupon_num = 0
+            indices = list(range(max_coupons))
+            fingerprints = [card_fingerprint(card) for card in coupon_cards]
+            if self.checkpoint:
+                indices = self.resume_store(url, fingerprints, previous)
             
-            while coupon_num < max_coupons:
-                try:
-                    # Get fresh button
-                    promo_buttons = self.driver.find_elements(By.XPATH, 
-                        "//*[contains(text(), 'See promo code')][@role='button']"
-                    )
-                    
-                    if coupon_num >= len(promo_buttons):
-                        break
-                    
-                    btn = promo_buttons[coupon_num]
-                    
-                    # ===== Get title and expiry from the SAME CARD as the button =====
-                    title = "N/A"
-                    expiry = "N/A"
-                    
-                    try:
-                        # Find parent card element - look for class containing '_6tavkoa'
-                        parent = btn
-                        for _ in range(10):  # Go up max 10 levels
-                            parent_class = parent.get_attribute('class') or ""
-                            if '_6tavkoa' in parent_class:
-                                break
-                            try:
-                                parent = parent.find_element(By.XPATH, './..')
-                            except:
-                                break
-                        
-                        # Now look for expiry within this card
-                        expiry_elems = parent.find_elements(By.XPATH, 
-                            ".//span[contains(@class, 'az57m4c')] | .//span[contains(text(), 'Expiry')]"
-                        )
-                        if expiry_elems:
-                            expiry_text = expiry_elems[0].text.strip()
-                            match = re.search(r'(\d{1,2}/\d{1,2}/\d{4})', expiry_text)
-                            if match:
-                                expiry = match.group(1)
-                                print(f"  Found expiry in card: {expiry}")
-                        
-                        # Also try to find title in the card
-                        title_elems = parent.find_elements(By.XPATH, ".//h3 | .//h4")
-                        if title_elems:
-                            title_text = title_elems[0].text.strip()
-                            if len(title_text) > 10 and 'CODE' not in title_text.upper():
-                                title = title_text[:140]
-                    
-                    except Exception as e:
-                        print(f"  Could not find in card: {str(e)[:40]}")
-                    
-                    # Fallback: get from page sections
-                    if title == "N/A" or expiry == "N/A":
-                        if coupon_num + 1 < len(sections):
-                            section = sections[coupon_num + 1]
-                            lines = [l.strip() for l in section.split('\n') if l.strip()]
-                            for line in lines:
-                                if expiry == "N/A":
-                                    match = re.search(r'(\d{1,2}/\d{1,2}/\d{4})', line)
-                                    if match:
-                                        expiry = match.group(1)
-                                if title == "N/A":
-                                    if re.match(r'^Expiry:', line):
-                                        continue
-                                    if re.match(r'^\d+%?\s*OFF', line):
-                                        continue
-                                    if 'Verified' in line or 'arrow' in line or 'SEE PROMO' in line:
-                                        continue
-                                    if len(line) > 20:
-                                        title = line[:140]
-                                        break
-                    
-                    # ===== Click button and get code =====
-                    self.driver.execute_script("arguments[0].scrollIntoView(true);", btn)
-                    time.sleep(0.5)
-                    self.driver.execute_script("arguments[0].click();", btn)
-                    print(f"  Clicked button {coupon_num+1}")
-                    
-                    time.sleep(3)
-                    
-                    # Switch to new tab
-                    all_windows = self.driver.window_handles
-                    new_window = None
-                    for window in all_windows:
-                        if window != original_window:
-                            new_window = window
-                            break
-                    
-                    if new_window:
-                        self.driver.switch_to.window(new_window)
-                    
-                    time.sleep(2)
-                    
-                    # Get code from modal
-                    actual_code = None
-                    
-                    # Try COPY button
-                    copy_buttons = self.driver.find_elements(By.XPATH,
-                        "//button[contains(translate(text(), 'ABCDEFGHIJKLMNOPQRSTUVWXYZ', 'abcdefghijklmnopqrstuvwxyz'), 'copy')]"
-                    )
-                    
-                    if copy_buttons:
-                        pyperclip.copy("")
-                        time.sleep(0.2)
-                        self.driver.execute_script("arguments[0].click();", copy_buttons[0])
-                        time.sleep(0.5)
-                        actual_code = pyperclip.paste().strip()
-                    
-                    # Fallback: look in h4
-                    if not actual_code or len(actual_code) < 2:
-                        h4_elements = self.driver.find_elements(By.XPATH, "//h4")
-                        for h4 in h4_elements:
-                            text = h4.text.strip()
-                            if text and 3 <= len(text) <= 20 and re.match(r'^[A-Za-z0-9]+$', text):
-                                actual_code = text
-                                break
-                    
-                    print(f"  Title: {title[:40] if title != 'N/A' else 'N/A'}")
-                    print(f"  Code: {actual_code}")
-                    print(f"  Expiry: {expiry}")
-                    
-                    # Close and go back
-                    if new_window:
-                        self.driver.close()
-                        self.driver.switch_to.window(original_window)
-                    
-                    self.driver.get(url)
-                    time.sleep(3)
-                    
-                    if actual_code and len(actual_code) > 1:
-                        self.coupons.append({
-                            'description': title,
-                            'code': actual_code,
-                            'expiry': expiry
-                        })
-                        print(f"{coupon_num+1:2d}. {actual_code:15s} | {title[:40] if title != 'N/A' else 'N/A'} | {expiry}")
-                    
-                    coupon_num += 1
-                    
-                except Exception as e:
-                    print(f"{coupon_num+1:2d}. [ERROR] {str(e)[:60]}")
-                    try:
-                        if len(self.driver.window_handles) > 1:
-                            for w in self.driver.window_handles:
-                                if w != original_window:
-                                    self.driver.switch_to.window(w)
-                                    self.driver.close()
-                        self.driver.switch_to.window(original_window)
-                        self.driver.get(url)
-                        time.sleep(2)
-                    except:
-                        pass
-                    coupon_num += 1
-                    continue
+            state = CardStateStore(self.state_path) if self.incremental else None
+            dedupe = DedupeIndex(self.dedupe_path)
+            try:
+                if state:
+                    indices = self.reuse_known_codes(state, url, coupon_cards, sections, fingerprints, indices)
+                # Cards to remember in the store's state, including those a
+                # code read on another store answers below
+                unknown = indices
+                with self.timed('voucher_ids', cards=len(indices)):
+                    vouchers, voucher_urls = self.voucher_ids(url, coupon_cards, indices)
+                if self.incremental:
+                    indices = self.reuse_shared_codes(dedupe, coupon_cards, sections, indices, vouchers)
+                
+                with self.timed('extract', direct=self.direct_http, cards=len(indices)) as extra:
+                    if self.direct_http:
+                        self.extract_coupons_direct(url, coupon_cards, sections, indices, voucher_urls)
+                    else:
+                        self.extract_coupons_in_browser(url, coupon_cards, sections, indices)
+                    extra['coupons'] = len(self.coupons)
+                
+                # Keep the output in card order whichever path found each code
+                self.coupons.sort(key=lambda c: c['card_index'])
+                
+                if state and coupon_cards:
+                    self.remember_codes(state, url, fingerprints, unknown)
+                self.index_coupons(dedupe, url, coupon_cards, indices, vouchers)
+            finally:
+                if state:
+                    state.close()
+                dedupe.close()
             
             print(f"\nExtracted {len(self.coupons)} coupons")
             
+            self.sink.close()
             if self.coupons:
-                self.save()
+                with self.timed('save'):
+                    self.save()
+            self.metrics.report(url)
             
+            if self.checkpoint:
+                self.checkpoint.finish_store(url, ok=len(self.coupons) > 0)
             return len(self.coupons) > 0
             
         except Exception as e:
@@ -326,48 +354,489 @@ class TravelokaCodeScraper:
             traceback.print_exc()
             return False
         finally:
-            if self.driver:
-                self.driver.quit()
-                print("Browser closed")
+            # Whatever was extracted before a crash is already on disk
+            if self.sink:
+                self.sink.close()
     
-    def save(self):
-        """Save results"""
-        p = Path('output')
-        p.mkdir(exist_ok=True)
+    def resume_store(self, url, fingerprints, previous):
+        """
+        Restore what an interrupted run of this store already extracted
+        Returns the card indices still to handle (all of them for a fresh
+        store or when the page changed since the checkpoint)
+        """
+        done = self.checkpoint.start_store(url, fingerprints)
+        if not done:
+            return list(range(len(fingerprints)))
+        
+        # Streamed but not yet checkpointed counts as done too
+        for c in previous:
+            if c.get('card_index', -1) < len(fingerprints):
+                done.add(c['card_index'])
+                self.coupons.append(c)
+                self.sink.write('coupon', c)
+                self.checkpoint.mark(url, c['card_index'])
+        print(f"Resuming: {len(done)} of {len(fingerprints)} coupons already handled")
+        return [n for n in range(len(fingerprints)) if n not in done]
+    
+    def reuse_known_codes(self, state, url, coupon_cards, sections, fingerprints, indices):
+        """Add stored codes for unchanged cards, return the indices still to click"""
+        known = state.known_codes(url, fingerprints)
+        todo = []
+        for coupon_num in indices:
+            code = known.get(fingerprints[coupon_num])
+            if code:
+                title, expiry = self.get_card_info(coupon_cards[coupon_num], coupon_num, sections)
+                self.add_coupon(coupon_num, title, code, expiry)
+            else:
+                todo.append(coupon_num)
+        print(f"Unchanged since last run: {len(indices) - len(todo)}, to click: {len(todo)}")
+        return todo
+    
+    def voucher_ids(self, url, coupon_cards, indices):
+        """
+        ({card index: stable voucher identity}, {card index: voucher URL}) for
+        these cards. The identity is the card's id attribute, else (incremental
+        runs only, where a code read on another store can be reused) the
+        voucher URL its button opens, harvested in one script call with no tab
+        opening; cards with neither are left out. The harvested URLs are passed
+        on to the direct path so it does not harvest them again.
+        """
+        ids = {}
+        todo = []
+        for coupon_num in indices:
+            voucher = card_id(coupon_cards[coupon_num])
+            if voucher:
+                ids[coupon_num] = voucher
+            else:
+                todo.append(coupon_num)
+        if not todo or not self.incremental:
+            return ids, {}
         
-        print(f"Saving to output/...")
+        original_window = self.driver.current_window_handle
+        keys = [coupon_cards[n]['key'] for n in todo]
+        self.ensure_cards(keys)
+        buttons = card_buttons(self.driver, PROMO_BUTTON_XPATH, keys)
+        found = [n for n, button in zip(todo, buttons) if button is not None]
+        harvested = dict(zip(found, harvest_voucher_urls(self.driver, [b for b in buttons if b is not None])))
+        for coupon_num, voucher_url in harvested.items():
+            voucher = voucher_identity(voucher_url)
+            if voucher:
+                ids[coupon_num] = voucher
         
-        # Save COUPONS
-        simplified_coupons = []
+        # The harvest clicks may have navigated the store tab away
+        self.close_extra_windows(original_window)
+        if self.driver.current_url.split('#')[0] != url:
+            self.load_store_page(url)
+        return ids, harvested
+    
+    def reuse_shared_codes(self, dedupe, coupon_cards, sections, indices, vouchers):
+        """Add codes already read from the same voucher on another store, return the indices still to click"""
+        todo = []
+        for coupon_num in indices:
+            code = dedupe.known_code(vouchers.get(coupon_num))
+            if code:
+                title, expiry = self.get_card_info(coupon_cards[coupon_num], coupon_num, sections)
+                self.add_coupon(coupon_num, title, code, expiry)
+            else:
+                todo.append(coupon_num)
+        if len(todo) < len(indices):
+            print(f"Already read on another store: {len(indices) - len(todo)}, to click: {len(todo)}")
+        return todo
+    
+    def index_coupons(self, dedupe, url, coupon_cards, clicked, vouchers):
+        """Record this store's coupons in the dedupe index and drop the ones that left the page"""
+        clicked = set(clicked)
+        keys = [dedupe.record(url, c['code'], c['description'], c['expiry'],
+                              voucher=vouchers.get(c['card_index']) or card_id(coupon_cards[c['card_index']]),
+                              source=SOURCE_VOUCHER, read=c['card_index'] in clicked)
+                for c in self.coupons]
+        dedupe.sync_store(url, keys)
+    
+    def remember_codes(self, state, url, fingerprints, indices):
+        """Store the codes read this run and drop cards that left the page"""
+        clicked = set(indices)
         for c in self.coupons:
-            title = c.get('description', 'N/A')
-            if title == 'N/A':
-                title = c.get('code', 'N/A')
-            simplified_coupons.append({
-                'Title': title,
-                'Code': c.get('code', 'N/A'),
-                'Expires': c.get('expiry', 'N/A')
+            if c['card_index'] in clicked:
+                state.record(url, fingerprints[c['card_index']], c['code'], c['description'], c['expiry'])
+        state.sync_store(url, fingerprints)
+    
+    def timed(self, stage, **fields):
+        """Time a block as one stage of the current store in self.metrics"""
+        return self.metrics.stage(stage, store=self.current_url, **fields)
+    
+    def load_store_page(self, url, step='reload'):
+        """Open the store page and wait until its coupon buttons stop appearing"""
+        with self.timed(step):
+            # Paced like any other request to the site; a page that never gets
+            # ready counts as a failed request and slows the host down
+            with self.rate.request(url) as outcome:
+                self.driver.get(url)
+                outcome['error'] = self.wait.page_ready(step=step) is None
+            self.wait.count_stable(ALL_BUTTONS_XPATH,
+                                   step=step + '_cards', settle=0.5)
+    
+    def ensure_cards(self, keys):
+        """
+        Run Load More again on a reloaded store page when any of these cards is
+        missing: cards added by Load More are gone after every reload
+        """
+        present = set(card_keys(self.driver, PROMO_BUTTON_XPATH))
+        if all(key in present for key in keys):
+            return
+        with self.timed('reload_lazy_load', cards=len(keys)):
+            self.wait.cards_loaded(ALL_BUTTONS_XPATH, step='reload_lazy_load')
+    
+    def get_card_info(self, card, coupon_num, sections):
+        """Get title and expiry from the SAME CARD as the button (snapshot entry)"""
+        title = card_title(card, 140)
+        expiry = card['expiry']
+        if expiry != "N/A":
+            print(f"  Found expiry in card: {expiry}")
+        
+        # Fallback: get from page sections
+        if title == "N/A" or expiry == "N/A":
+            if coupon_num + 1 < len(sections):
+                section = sections[coupon_num + 1]
+                lines = [l.strip() for l in section.split('\n') if l.strip()]
+                for line in lines:
+                    if expiry == "N/A":
+                        match = EXPIRY_DATE.search(line)
+                        if match:
+                            expiry = match.group(1)
+                    if title == "N/A" and is_title_line(line):
+                        title = line[:140]
+                        break
+        
+        return title, expiry
+    
+    def read_code(self):
+        """Read the promo code from the modal in the current window"""
+        # Try COPY button - the page's clipboard write is captured in the page,
+        # never through the OS clipboard, so parallel/headless runs are safe
+        actual_code = read_code_via_copy_hook(self.driver, self.wait)
+        
+        # Fallback: value shown next to the COPY button
+        if not actual_code or len(actual_code) < 2:
+            actual_code = read_code_from_dom(self.driver)
+        
+        # Fallback: look in h4
+        if not actual_code or len(actual_code) < 2:
+            h4_texts = self.driver.execute_script(
+                "return Array.from(document.querySelectorAll('h4')).map(h => h.innerText.trim());"
+            )
+            for text in h4_texts or []:
+                if looks_like_code(text):
+                    actual_code = text
+                    break
+        
+        return actual_code
+    
+    def add_coupon(self, coupon_num, title, actual_code, expiry):
+        """Store a coupon if a usable code was found"""
+        if self.checkpoint:
+            self.checkpoint.mark(self.current_url, coupon_num)
+        if actual_code and len(actual_code) > 1:
+            self.coupons.append({
+                'description': title,
+                'code': actual_code,
+                'expiry': expiry,
+                'card_index': coupon_num
             })
+            if self.sink:
+                self.sink.write('coupon', self.coupons[-1])
+            print(f"{coupon_num+1:2d}. {actual_code:15s} | {title[:40] if title != 'N/A' else 'N/A'} | {expiry}")
+    
+    def switch_to_tab(self, window):
+        """Switch to a tab a click opened and block there what the load profile blocks (CDP blocking is per tab)"""
+        self.driver.switch_to.window(window)
+        get_profile(self.profile).apply_driver(self.driver)
+    
+    def close_extra_windows(self, original_window):
+        """Close every tab except the store page and switch back to it"""
+        # Tabs that were open before an attached job started are not ours to close
+        keep = getattr(self.driver, 'keep_windows', ())
+        for w in self.driver.window_handles:
+            if w != original_window and w not in keep:
+                self.driver.switch_to.window(w)
+                self.driver.close()
+        self.driver.switch_to.window(original_window)
+    
+    def extract_coupons_in_browser(self, url, coupon_cards, sections, indices=None):
+        """Click the coupons at `indices` (default all) in the browser"""
+        if indices is None:
+            indices = list(range(len(coupon_cards)))
+        if self.tab_batch_size > 1:
+            self.extract_coupons_batched(url, coupon_cards, sections, indices)
+        else:
+            self.extract_coupons_sequential(url, coupon_cards, sections, indices)
+    
+    def extract_coupons_direct(self, url, coupon_cards, sections, indices=None, voucher_urls=None):
+        """
+        Harvest every voucher URL from the store page in one script call, then
+        fetch each voucher page over HTTP. Coupons whose code is not in the
+        server HTML, or whose card is not on the page, go through the normal
+        click path afterwards.
+        - voucher_urls: {card index: voucher URL} already harvested (voucher_ids)
+        """
+        if indices is None:
+            indices = list(range(len(coupon_cards)))
+        if not indices:
+            return
+        voucher_urls = dict(voucher_urls or {})
+        fallback = []
+        todo = [n for n in indices if n not in voucher_urls]
+        if todo:
+            original_window = self.driver.current_window_handle
+            with self.timed('harvest', cards=len(todo)):
+                keys = [coupon_cards[n]['key'] for n in todo]
+                self.ensure_cards(keys)
+                buttons = card_buttons(self.driver, PROMO_BUTTON_XPATH, keys)
+                # A card missing from the page is clicked after the reload below
+                fallback = [n for n, button in zip(todo, buttons) if button is None]
+                found = [n for n, button in zip(todo, buttons) if button is not None]
+                voucher_urls.update(zip(found, harvest_voucher_urls(self.driver, [b for b in buttons if b is not None])))
+            # The harvest clicks may have navigated the store tab away
+            self.close_extra_windows(original_window)
+        indices = [n for n in indices if n not in fallback]
+        print(f"  Resolved {sum(1 for n in indices if voucher_urls.get(n))} of {len(indices)} voucher URLs")
         
+        cache = HttpCache(self.cache_path)
+        try:
+            resolver = VoucherResolver(
+                cookies=self.driver.get_cookies(),
+                referer=url,
+                user_agent=self.driver.execute_script("return navigator.userAgent;"),
+                cache=cache,
+                rate=self.http_rate
+            )
+            for coupon_num in indices:
+                with self.timed('voucher_fetch', coupon=coupon_num) as extra:
+                    actual_code = resolver.fetch_code(voucher_urls.get(coupon_num))
+                    extra['found'] = bool(actual_code)
+                if not actual_code:
+                    fallback.append(coupon_num)
+                    continue
+                title, expiry = self.get_card_info(coupon_cards[coupon_num], coupon_num, sections)
+                self.add_coupon(coupon_num, title, actual_code, expiry)
+        finally:
+            cache.close()
+        
+        if fallback:
+            print(f"  {len(fallback)} codes not read over HTTP - clicking them in the browser")
+            self.load_store_page(url)
+            self.extract_coupons_in_browser(url, coupon_cards, sections, sorted(fallback))
+    
+    def extract_coupons_sequential(self, url, coupon_cards, sections, indices):
+        """Click one button at a time, read its tab, reload the store page"""
+        original_window = self.driver.current_window_handle
+        
+        for coupon_num in indices:
+            try:
+                card = coupon_cards[coupon_num]
+                title, expiry = self.get_card_info(card, coupon_num, sections)
+                
+                # ===== Click button and get code =====
+                self.ensure_cards([card['key']])
+                # The click loads a voucher page from the same site, so it waits its turn too
+                with self.timed('click', coupon=coupon_num), self.rate.request(url) as outcome:
+                    # The reloaded page's button is found by the card's snapshot key
+                    if not click_cards(self.driver, PROMO_BUTTON_XPATH, [card['key']]):
+                        print(f"{coupon_num+1:2d}. [WARN] Card not on the reloaded page")
+                        # Nothing was loaded, so nothing to tell the controller
+                        outcome['skip'] = True
+                        continue
+                    print(f"  Clicked button {coupon_num+1}")
+                    
+                    # Switch to new tab
+                    new_windows = self.wait.new_window([original_window], timeout=5)
+                    new_window = new_windows[0] if new_windows else None
+                
+                with self.timed('read', coupon=coupon_num) as extra:
+                    if new_window:
+                        self.switch_to_tab(new_window)
+                    
+                    self.wait.code_visible(timeout=5)
+                    
+                    actual_code = self.read_code()
+                    extra['found'] = bool(actual_code)
+                
+                print(f"  Title: {title[:40] if title != 'N/A' else 'N/A'}")
+                print(f"  Code: {actual_code}")
+                print(f"  Expiry: {expiry}")
+                
+                # Close and go back
+                if new_window:
+                    self.driver.close()
+                    self.driver.switch_to.window(original_window)
+                
+                self.load_store_page(url)
+                
+                self.add_coupon(coupon_num, title, actual_code, expiry)
+                
+            except Exception as e:
+                print(f"{coupon_num+1:2d}. [ERROR] {str(e)[:60]}")
+                try:
+                    if len(self.driver.window_handles) > 1:
+                        self.close_extra_windows(original_window)
+                    self.driver.switch_to.window(original_window)
+                    self.load_store_page(url)
+                except:
+                    pass
+                continue
+    
+    def extract_coupons_batched(self, url, coupon_cards, sections, indices):
+        """
+        Harvest the voucher URLs of a whole batch of buttons in one script
+        call, open each one in a tab of our own, then read the tabs. The tabs
+        load in parallel inside the browser, so one store page load serves a
+        full batch instead of a single coupon, and every tab is known to
+        belong to its card (window_handles order is not guaranteed).
+        """
+        original_window = self.driver.current_window_handle
+        batch_size = self.tab_batch_size
+        host = host_of(url)
+        
+        for start in range(0, len(indices), batch_size):
+            # A batch holds one slot of the host while its tabs load; the tabs
+            # still start one host delay apart and each one is reported as a
+            # request. The slot is given back before any store page reload,
+            # which takes a slot of its own
+            self.rate.acquire(host)
+            held = True
+            try:
+                batch = indices[start:start + batch_size]
+                cards = {}
+                for coupon_num in batch:
+                    cards[coupon_num] = self.get_card_info(coupon_cards[coupon_num], coupon_num, sections)
+                keys = [coupon_cards[n]['key'] for n in batch]
+                self.ensure_cards(keys)
+                
+                # All clicks run in the same JS task with window.open intercepted,
+                # so no tab opens and a navigation cannot detach the later buttons
+                tabs = {}
+                unresolved = []
+                with self.timed('batch_click', coupons=len(batch)):
+                    buttons = card_buttons(self.driver, PROMO_BUTTON_XPATH, keys)
+                    missing = [n for n, button in zip(batch, buttons) if button is None]
+                    if missing:
+                        print(f"  [WARN] {len(missing)} cards not on the reloaded page")
+                    batch = [n for n, button in zip(batch, buttons) if button is not None]
+                    if not batch:
+                        continue
+                    voucher_urls = harvest_voucher_urls(self.driver, [b for b in buttons if b is not None])
+                    print(f"  Clicked buttons {batch[0]+1}-{batch[-1]+1}")
+                    
+                    opened = {}
+                    for coupon_num, voucher_url in zip(batch, voucher_urls):
+                        if not voucher_url:
+                            unresolved.append(coupon_num)
+                            continue
+                        if tabs:
+                            self.rate.acquire(host, slot=False)
+                        self.driver.switch_to.new_window('tab')
+                        get_profile(self.profile).apply_driver(self.driver)
+                        # Navigate without waiting, so the next tab starts loading right away
+                        self.driver.execute_script("location.href = arguments[0];", voucher_url)
+                        tabs[coupon_num] = self.driver.current_window_handle
+                        opened[coupon_num] = time.monotonic()
+                    unresolved += batch[len(voucher_urls):]
+                
+                # The tabs load side by side, so only the first wait here costs real time
+                for coupon_num, window in tabs.items():
+                    title, expiry = cards[coupon_num]
+                    try:
+                        with self.timed('read', coupon=coupon_num) as extra:
+                            self.driver.switch_to.window(window)
+                            visible = self.wait.code_visible(timeout=5)
+                            # A voucher tab that never shows its code counts as a failed load
+                            self.rate.observe(host, time.monotonic() - opened[coupon_num], error=visible is None)
+                            actual_code = self.read_code()
+                            extra['found'] = bool(actual_code)
+                        self.driver.close()
+                    except Exception as e:
+                        print(f"{coupon_num+1:2d}. [ERROR] {str(e)[:60]}")
+                        continue
+                    self.add_coupon(coupon_num, title, actual_code, expiry)
+                
+                self.rate.free(host)
+                held = False
+                self.driver.switch_to.window(original_window)
+                
+                if unresolved:
+                    print(f"  [WARN] No voucher URL for {len(unresolved)} cards - clicking them one by one")
+                    self.close_extra_windows(original_window)
+                    self.load_store_page(url)
+                    for coupon_num in unresolved:
+                        self.extract_single_from_fresh_page(url, original_window, coupon_num,
+                                                            coupon_cards[coupon_num]['key'], cards[coupon_num])
+                # Only reload when the clicks navigated the store tab away
+                elif start + batch_size < len(indices) and self.driver.current_url.split('#')[0] != url:
+                    self.load_store_page(url)
+                    
+            except Exception as e:
+                print(f"  [ERROR] Batch starting at {indices[start]+1}: {str(e)[:60]}")
+                if held:
+                    self.rate.free(host)
+                    held = False
+                try:
+                    self.close_extra_windows(original_window)
+                    self.load_store_page(url)
+                except:
+                    pass
+            finally:
+                if held:
+                    self.rate.free(host)
+    
+    def extract_single_from_fresh_page(self, url, original_window, coupon_num, key, card):
+        """Click one card on a fresh store page and read its tab (cards whose voucher URL was not harvested)"""
+        title, expiry = card
+        try:
+            self.ensure_cards([key])
+            known_windows = set(self.driver.window_handles)
+            # The click loads a voucher page from the same site, so it waits its turn too
+            with self.rate.request(url) as outcome:
+                if not click_cards(self.driver, PROMO_BUTTON_XPATH, [key]):
+                    outcome['skip'] = True
+                    return
+                new_windows = self.wait.new_window(known_windows, timeout=5)
+                if new_windows:
+                    self.switch_to_tab(new_windows[0])
+                    outcome['error'] = self.wait.code_visible(timeout=5) is None
+            actual_code = self.read_code()
+            self.close_extra_windows(original_window)
+            self.load_store_page(url)
+            self.add_coupon(coupon_num, title, actual_code, expiry)
+        except Exception as e:
+            print(f"{coupon_num+1:2d}. [ERROR] {str(e)[:60]}")
+            try:
+                self.close_extra_windows(original_window)
+                self.load_store_page(url)
+            except:
+                pass
+    
+    def save(self):
+        """Write the aggregate reports from the streamed results"""
+        p = Path(self.output_dir)
+        p.mkdir(parents=True, exist_ok=True)
+        
+        print(f"Saving to {p}/...")
+        
+        # The stream holds every coupon/offer written during the run, in the
+        # order they were found; reports keep card order
+        stream = read_stream(p / STREAM_FILE)
+        coupons = sorted(stream.get('coupon', []), key=lambda c: c.get('card_index', 0))
+        offers = stream.get('offer', [])
+        simplified_coupons = [simplify_coupon(c) for c in coupons]
+        print(f"   {STREAM_FILE}, coupons.csv, offers.csv (streamed)")
+        
+        # Save COUPONS
         (p / 'coupons.json').write_text(json.dumps(simplified_coupons, ensure_ascii=False, indent=2), encoding='utf-8')
         print("   coupons.json")
         
-        with open(p / 'coupons.csv', 'w', encoding='utf-8', newline='') as f:
-            writer = csv.DictWriter(f, fieldnames=['Title', 'Code', 'Expires'])
-            writer.writeheader()
-            writer.writerows(simplified_coupons)
-        print("   coupons.csv")
-        
         # Save OFFERS
-        (p / 'offers.json').write_text(json.dumps(self.offers, ensure_ascii=False, indent=2), encoding='utf-8')
+        (p / 'offers.json').write_text(json.dumps(offers, ensure_ascii=False, indent=2), encoding='utf-8')
         print("   offers.json")
         
-        with open(p / 'offers.csv', 'w', encoding='utf-8', newline='') as f:
-            writer = csv.DictWriter(f, fieldnames=['title'])
-            writer.writeheader()
-            writer.writerows(self.offers)
-        print("   offers.csv")
-        
         # Save combined text report - to Working Reports folder (outside project)
         # Extract brand name from URL (e.g., https://www.cuponation.com.sg/traveloka-promo-code -> TRAVELOKA)
         parsed_url = urlparse(self.current_url)
@@ -387,7 +856,7 @@ class TravelokaCodeScraper:
         txt = f"{brand_name} OFFERS (GET DEAL - No Code Required)\n"
         txt += "="*60 + "\n\n"
         
-        for o in self.offers:
+        for o in offers:
             txt += f"Title: {o.get('title', 'N/A')}\n\n"
         
         txt += "\n" + "="*60 + "\n"
@@ -422,15 +891,37 @@ class TravelokaCodeScraper:
         (p / 'all_results.json').write_text(json.dumps({
             'timestamp': datetime.now().isoformat(),
             'total_coupons': len(simplified_coupons),
-            'total_offers': len(self.offers),
+            'total_offers': len(offers),
             'coupons': simplified_coupons,
-            'offers': self.offers
+            'offers': offers
         }, ensure_ascii=False, indent=2), encoding='utf-8')
         print("   all_results.json")
         
-        print(f"\nTotal: {len(simplified_coupons)} coupons, {len(self.offers)} offers")
+        print(f"\nTotal: {len(simplified_coupons)} coupons, {len(offers)} offers")
         print("All files saved!")
 
 
 if __name__ == "__main__":
-    TravelokaCodeScraper().run()
+    import argparse
+    
+    parser = argparse.ArgumentParser(description="Scrape promo codes from a Cuponation store page")
+    parser.add_argument('url', nargs='?', help="store page URL (default: the Singapore Zoo page); "
+                                               "for many stores use browser_pool.py")
+    parser.add_argument('--tabs', type=int, default=1,
+                        help="coupons to click per store page load (1 = one at a time)")
+    parser.add_argument('--headless', action='store_true', help="run Chrome without a window")
+    parser.add_argument('--direct', action='store_true',
+                        help="fetch voucher pages over HTTP instead of clicking each coupon")
+    parser.add_argument('--full', action='store_true',
+                        help="click every coupon, ignoring codes remembered from earlier runs")
+    parser.add_argument('--resume', action='store_true',
+                        help="continue an interrupted run from its checkpoint (output/checkpoint.json)")
+    parser.add_argument('--profile', choices=sorted(PROFILES), default=DEFAULT_PROFILE,
+                        help="page load profile: 'lean' skips images/fonts/media/trackers, 'full' loads everything")
+    parser.add_argument('--attach', action='store_true',
+                        help="use the running browser daemon (python browser_daemon.py) instead of starting Chrome")
+    args = parser.parse_args()
+    
+    TravelokaCodeScraper(tab_batch_size=args.tabs, headless=args.headless, direct_http=args.direct,
+                         incremental=not args.full, profile=args.profile, attach=args.attach,
+                         checkpoint=Checkpoint(Path('output') / 'checkpoint.json', resume=args.resume)).run(args.url)
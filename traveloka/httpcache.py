@@ -0,0 +1,82 @@
+"""
+Scrapy HTTP cache backed by the project-wide http_cache.HttpCache, so the
+spider shares cached store pages with the requests and Selenium scrapers
+"""
+import time
+import zlib
+
+from scrapy.extensions.httpcache import RFC2616Policy
+from scrapy.http import Headers
+from scrapy.responsetypes import responsetypes
+from scrapy.utils.gz import gunzip
+
+from http_cache import DEFAULT_MAX_MB, DEFAULT_PATH, DEFAULT_TTL, HttpCache
+
+
+STORED_AT_HEADER = 'X-Cache-Stored-At'
+
+
+class SharedCacheStorage:
+    """HTTPCACHE_STORAGE reading/writing the shared SQLite cache"""
+
+    def __init__(self, settings):
+        self.path = settings.get('SHARED_HTTP_CACHE_PATH', DEFAULT_PATH)
+        self.ttl = settings.getint('SHARED_HTTP_CACHE_TTL', DEFAULT_TTL)
+        self.max_mb = settings.getint('SHARED_HTTP_CACHE_MAX_MB', DEFAULT_MAX_MB)
+        self.cache = None
+
+    def open_spider(self, spider):
+        self.cache = HttpCache(self.path, ttl=self.ttl, max_mb=self.max_mb)
+        spider.logger.info(f'Shared HTTP cache: {self.path}')
+
+    def close_spider(self, spider):
+        self.cache.close()
+
+    def retrieve_response(self, spider, request):
+        entry = self.cache.get(request.url)
+        if entry is None:
+            return None
+        headers = Headers(entry['headers'])
+        headers[STORED_AT_HEADER] = str(entry['stored_at'])
+        respcls = responsetypes.from_args(headers=headers, url=request.url, body=entry['body'])
+        return respcls(url=request.url, headers=headers, status=entry['status'], body=entry['body'])
+
+    def store_response(self, spider, request, response):
+        # The cache sits before HttpCompressionMiddleware, so bodies can still be encoded
+        body = response.body
+        encoding = response.headers.get('Content-Encoding', b'').lower()
+        try:
+            if encoding in (b'gzip', b'x-gzip'):
+                body = gunzip(body)
+            elif encoding == b'deflate':
+                try:
+                    body = zlib.decompress(body)
+                except zlib.error:
+                    body = zlib.decompress(body, -15)
+            elif encoding:
+                return
+        except (OSError, zlib.error):
+            return
+        headers = {
+            k.decode('latin-1'): b','.join(v).decode('latin-1')
+            for k, v in response.headers.items()
+            if k.decode('latin-1').lower() != STORED_AT_HEADER.lower()
+        }
+        self.cache.store(request.url, response.status, headers, body)
+
+
+class SharedCachePolicy(RFC2616Policy):
+    """
+    RFC 2616 revalidation (ETag / Last-Modified) plus the shared TTL:
+    anything stored less than SHARED_HTTP_CACHE_TTL seconds ago is served as is
+    """
+
+    def __init__(self, settings):
+        super().__init__(settings)
+        self.ttl = settings.getint('SHARED_HTTP_CACHE_TTL', DEFAULT_TTL)
+
+    def is_cached_response_fresh(self, cachedresponse, request):
+        stored_at = cachedresponse.headers.get(STORED_AT_HEADER)
+        if stored_at and time.time() - float(stored_at) < self.ttl:
+            return True
+        return super().is_cached_response_fresh(cachedresponse, request)
@@ -0,0 +1,25 @@
+"""
+Items yielded by the Traveloka spider
+"""
+import scrapy
+
+
+class CouponItem(scrapy.Item):
+    """Coupon with a discount code and an expiry date"""
+    type = scrapy.Field()
+    store_url = scrapy.Field()
+    description = scrapy.Field()
+    code = scrapy.Field()
+    expiry_date = scrapy.Field()
+    scraped_at = scrapy.Field()
+    # Voucher page the code was read from; empty for a discount label off the store page
+    voucher_url = scrapy.Field()
+
+
+class OfferItem(scrapy.Item):
+    """Deal without an expiry date, discount only"""
+    type = scrapy.Field()
+    store_url = scrapy.Field()
+    description = scrapy.Field()
+    discount = scrapy.Field()
+    scraped_at = scrapy.Field()
@@ -0,0 +1,215 @@
+"""
+Downloader middlewares
+BrowserDownloaderMiddleware renders selected requests in a headless browser.
+Only requests with meta={'browser': True} go to Chrome; everything else
+stays on Scrapy's normal Twisted HTTP downloader. Renders run in the reactor
+thread pool, at most BROWSER_POOL_SIZE at a time, each on its own
+long-lived Chrome. Renders never reach Scrapy's downloader slots, so they are
+paced by rate_control.shared_browser() instead (one load per browser from
+the start, backing off on slow or failed loads).
+
+Extra meta keys for browser requests:
+    browser_actions: list of steps to run after the page loads
+        'load_more'  scroll / click Load More until the card count stops growing
+        'vouchers'   resolve every SEE PROMO CODE button to its voucher URL
+                     (response.meta['voucher_urls'], response.meta['cards'])
+        'code'       wait for a voucher modal's code to be visible
+
+AdaptiveRateMiddleware paces every host's HTTP requests with
+rate_control.RateController (the same AIMD controller the other scrapers
+use) instead of AutoThrottle.
+"""
+import queue
+from urllib.parse import urlparse
+
+from scrapy import signals
+from scrapy.exceptions import NotConfigured
+from scrapy.http import HtmlResponse
+from twisted.internet import defer, threads
+
+
+class BrowserDownloaderMiddleware:
+    def __init__(self, pool_size=2, pages_per_browser=50, timeout=15, profile='lean'):
+        self.pool_size = max(1, pool_size)
+        self.pages_per_browser = pages_per_browser
+        self.timeout = timeout
+        self.profile = profile
+        self.slots = defer.DeferredSemaphore(self.pool_size)
+        self.rate = None
+        # Idle browsers as (driver, pages rendered)
+        self.idle = queue.LifoQueue()
+        self.drivers = []
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        mw = cls(
+            pool_size=crawler.settings.getint('BROWSER_POOL_SIZE', 2),
+            pages_per_browser=crawler.settings.getint('BROWSER_PAGES_PER_DRIVER', 50),
+            timeout=crawler.settings.getint('BROWSER_TIMEOUT', 15),
+            profile=crawler.settings.get('BROWSER_LOAD_PROFILE', 'lean')
+        )
+        crawler.signals.connect(mw.spider_closed, signal=signals.spider_closed)
+        return mw
+
+    def process_request(self, request, spider):
+        if not request.meta.get('browser'):
+            return None
+        # The rendered DOM must not end up in the shared HTTP cache under the page URL
+        request.meta['dont_cache'] = True
+        return self.slots.run(threads.deferToThread, self.render, request, spider)
+
+    def checkout(self, spider):
+        """An idle browser, or a new one while the pool is not full"""
+        try:
+            return self.idle.get_nowait()
+        except queue.Empty:
+            pass
+        # Imported here so plain HTTP crawls never load Selenium
+        from scraper_fixed_modal import create_driver
+        driver = create_driver(headless=True, profile=self.profile)
+        self.drivers.append(driver)
+        spider.logger.info(f'Browser {len(self.drivers)} started')
+        return driver, 0
+
+    def checkin(self, driver, pages, spider):
+        """Return a browser to the pool, quitting it once it has rendered enough pages"""
+        if pages >= self.pages_per_browser:
+            self.quit(driver)
+            spider.logger.info('Browser recycled')
+        else:
+            self.idle.put((driver, pages))
+
+    def quit(self, driver):
+        try:
+            driver.quit()
+        except Exception:
+            pass
+        if driver in self.drivers:
+            self.drivers.remove(driver)
+
+    def render(self, request, spider):
+        """Load the page in Chrome and return the DOM as an HtmlResponse (worker thread)"""
+        from card_snapshot import cards_of_type, snapshot_cards
+        from scraper_fixed_modal import OFFER_BUTTON_XPATH, PROMO_BUTTON_XPATH
+        from selenium.webdriver.common.by import By
+        from rate_control import shared_browser
+        from voucher_resolver import harvest_voucher_urls
+        from waits import Waiter
+
+        if self.rate is None:
+            self.rate = shared_browser(self.pool_size)
+        driver, pages = self.checkout(spider)
+        try:
+            wait = Waiter(driver, timeout=self.timeout)
+            # A page that never gets ready counts as a failed load and slows the host down
+            with self.rate.request(request.url) as outcome:
+                driver.get(request.url)
+                outcome['error'] = wait.page_ready() is None
+            actions = request.meta.get('browser_actions', [])
+            meta = {}
+
+            if 'load_more' in actions or 'vouchers' in actions:
+                wait.count_stable(PROMO_BUTTON_XPATH + " | " + OFFER_BUTTON_XPATH, settle=0.5)
+            if 'load_more' in actions:
+                self.load_more(driver, wait)
+            if 'code' in actions:
+                wait.code_visible(timeout=5)
+
+            body = driver.page_source
+            url = driver.current_url
+
+            if 'vouchers' in actions:
+                meta['cards'] = cards_of_type(
+                    snapshot_cards(driver, PROMO_BUTTON_XPATH, OFFER_BUTTON_XPATH), 'code'
+                )
+                buttons = driver.find_elements(By.XPATH, PROMO_BUTTON_XPATH)
+                meta['voucher_urls'] = harvest_voucher_urls(driver, buttons)
+                # The harvest clicks can open or navigate tabs; leave one clean tab
+                handles = driver.window_handles
+                for handle in handles[1:]:
+                    driver.switch_to.window(handle)
+                    driver.close()
+                driver.switch_to.window(handles[0])
+        except Exception:
+            self.quit(driver)
+            raise
+
+        self.checkin(driver, pages + 1, spider)
+        request.meta.update(meta)
+        return HtmlResponse(url=url, body=body, encoding='utf-8', request=request, flags=['browser'])
+
+    def load_more(self, driver, wait):
+        """Same lazy-load loop as the Selenium scraper"""
+        from scraper_fixed_modal import OFFER_BUTTON_XPATH, PROMO_BUTTON_XPATH
+
+        wait.cards_loaded(PROMO_BUTTON_XPATH + " | " + OFFER_BUTTON_XPATH, timeout=self.timeout)
+
+    def spider_closed(self, spider):
+        for driver in list(self.drivers):
+            self.quit(driver)
+        if self.rate:
+            self.rate.report()
+
+
+class AdaptiveRateMiddleware:
+    """
+    Feeds each downloaded response's latency and status (and each download
+    error) to a RateController and applies the host's resulting delay and
+    concurrency to its Scrapy downloader slot. Cached responses did not come
+    from the network and are ignored; browser renders are paced and observed
+    by BrowserDownloaderMiddleware.
+    """
+
+    def __init__(self, crawler, controller):
+        self.crawler = crawler
+        self.controller = controller
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        from rate_control import RateController
+
+        settings = crawler.settings
+        if not settings.getbool('ADAPTIVE_RATE_ENABLED'):
+            raise NotConfigured
+        controller = RateController(
+            start_delay=settings.getfloat('DOWNLOAD_DELAY', 1.0),
+            min_delay=settings.getfloat('ADAPTIVE_RATE_MIN_DELAY', 0.25),
+            max_delay=settings.getfloat('ADAPTIVE_RATE_MAX_DELAY', 30.0),
+            max_concurrency=settings.getint('ADAPTIVE_RATE_MAX_CONCURRENCY', 4),
+            target_latency=settings.getfloat('ADAPTIVE_RATE_TARGET_LATENCY', 2.0)
+        )
+        mw = cls(crawler, controller)
+        crawler.signals.connect(mw.spider_closed, signal=signals.spider_closed)
+        return mw
+
+    def process_response(self, request, response, spider):
+        if 'cached' in response.flags or 'browser' in response.flags:
+            return response
+        retry_after = response.headers.get('Retry-After', b'').decode('latin-1').strip()
+        self.controller.observe(
+            urlparse(request.url).netloc,
+            latency=request.meta.get('download_latency'),
+            status=response.status,
+            retry_after=float(retry_after) if retry_after.isdigit() else None
+        )
+        self.apply(request)
+        return response
+
+    def process_exception(self, request, exception, spider):
+        if request.meta.get('browser'):
+            return None
+        self.controller.observe(urlparse(request.url).netloc, error=True)
+        self.apply(request)
+        return None
+
+    def apply(self, request):
+        """Copy the host's current limits onto its downloader slot"""
+        # The downloader records the slot key in meta when it queues the request
+        slot = self.crawler.engine.downloader.slots.get(request.meta.get('download_slot'))
+        if slot is None:
+            return
+        slot.delay, slot.concurrency = self.controller.limits(urlparse(request.url).netloc)
+
+    def spider_closed(self, spider):
+        self.controller.report()
+
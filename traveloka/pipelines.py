@@ -1,14 +1,90 @@
 """
 Pipeline to process and save scraped items
+Items are cleaned, checked and written per store to
+output/<store>/results.jsonl + coupons.csv in batches (result_sink), the same
+layout the requests scraper uses. Coupons also go to the cross-store dedupe
+index, and the crawl ends with output/unique_coupons.json
 """
-import json
 from pathlib import Path
+from urllib.parse import urlparse
+
+from itemadapter import ItemAdapter
+from scrapy.exceptions import DropItem
+
+from dedupe_index import DEFAULT_PATH as DEDUPE_PATH, SOURCE_PAGE, SOURCE_VOUCHER, DedupeIndex, voucher_identity, write_unique
+from result_sink import ResultSink
+
+
+CSV_FIELDS = ['TYPE', 'DESCRIPTION', 'CODE_OR_DISCOUNT', 'EXPIRY_DATE', 'SCRAPED_AT']
+CSV_SPECS = {
+    'coupon': ('coupons.csv', CSV_FIELDS, lambda c: {
+        'TYPE': 'coupon', 'DESCRIPTION': c['description'], 'CODE_OR_DISCOUNT': c['code'],
+        'EXPIRY_DATE': c['expiry_date'], 'SCRAPED_AT': c['scraped_at']}),
+    'offer': ('coupons.csv', CSV_FIELDS, lambda o: {
+        'TYPE': 'offer', 'DESCRIPTION': o['description'], 'CODE_OR_DISCOUNT': o['discount'],
+        'EXPIRY_DATE': '', 'SCRAPED_AT': o['scraped_at']}),
+}
 
 
 class TravelokaPipeline:
-    def __init__(self):
-        self.output_dir = Path('output')
+    def __init__(self, output_dir='output', batch_size=50, dedupe_path=DEDUPE_PATH):
+        self.output_dir = Path(output_dir)
         self.output_dir.mkdir(exist_ok=True)
-        
+        self.batch_size = batch_size
+        self.sinks = {}
+        # None = no dedupe index
+        self.dedupe = DedupeIndex(dedupe_path) if dedupe_path else None
+        self.dedupe_path = dedupe_path
+        # {store URL: coupon keys seen in this crawl}
+        self.store_keys = {}
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        return cls(
+            output_dir=crawler.settings.get('PIPELINE_OUTPUT_DIR', 'output'),
+            batch_size=crawler.settings.getint('PIPELINE_BATCH_SIZE', 50),
+            dedupe_path=crawler.settings.get('DEDUPE_INDEX_PATH', DEDUPE_PATH)
+        )
+
+    def sink_for(self, store_url):
+        """One ResultSink per store, opened on its first item"""
+        slug = urlparse(store_url).path.strip('/').replace('/', '_') or 'report'
+        if slug not in self.sinks:
+            self.sinks[slug] = ResultSink(self.output_dir / slug, CSV_SPECS, flush_every=self.batch_size)
+        return self.sinks[slug]
+
     def process_item(self, item, spider):
+        adapter = ItemAdapter(item)
+        description = ' '.join((adapter.get('description') or '').split())
+        if not description:
+            raise DropItem('Item without description')
+        adapter['description'] = description
+
+        kind = adapter.get('type')
+        if kind not in CSV_SPECS:
+            raise DropItem(f'Unknown item type: {kind}')
+
+        store_url = adapter.get('store_url') or 'report'
+        self.sink_for(store_url).write(kind, adapter.asdict())
+        if self.dedupe and kind == 'coupon':
+            # Only codes read from a voucher page count as promo codes; the
+            # page pass yields discount labels
+            voucher_url = adapter.get('voucher_url')
+            self.store_keys.setdefault(store_url, set()).add(self.dedupe.record(
+                store_url, adapter['code'], description, adapter.get('expiry_date'),
+                voucher=voucher_identity(voucher_url), source=SOURCE_VOUCHER if voucher_url else SOURCE_PAGE
+            ))
         return item
+
+    def close_spider(self, spider):
+        for slug, sink in self.sinks.items():
+            sink.close()
+            spider.logger.info(f'{self.output_dir / slug}: ' +
+                               ', '.join(f'{n} {k}s' for k, n in sink.counts.items()))
+        if self.dedupe:
+            for store_url, keys in self.store_keys.items():
+                self.dedupe.sync_store(store_url, keys)
+            self.dedupe.close()
+            if self.store_keys:
+                path, unique = write_unique(self.output_dir, self.store_keys, self.dedupe_path)
+                spider.logger.info(f'{path}: {len(unique)} unique coupons across {len(self.store_keys)} stores')
@@ -13,8 +13,9 @@ ROBOTSTXT_OBEY = True
 # Configure maximum concurrent requests per domain
 CONCURRENT_REQUESTS = 16
 
-# Configure a delay for requests for the same website
-DOWNLOAD_DELAY = 2  # 2 second delay between requests
+# Starting delay between requests to the same website; AdaptiveRateMiddleware
+# moves it (and the per-host concurrency) from there
+DOWNLOAD_DELAY = 2
 
 # Disable cookies to appear more like a browser
 COOKIES_ENABLED = False
@@ -36,22 +37,49 @@ DEFAULT_REQUEST_HEADERS = {
 # Obey robots.txt rules
 ROBOTSTXT_OBEY = True
 
-# AutoThrottle settings
-AUTOTHROTTLE_ENABLED = True
-AUTOTHROTTLE_START_DELAY = 2
-AUTOTHROTTLE_MAX_DELAY = 10
-AUTOTHROTTLE_TARGET_CONCURRENCY = 2.0
-AUTOTHROTTLE_DEBUG = False
+# Adaptive per-host rate control (rate_control.RateController, shared logic
+# with the requests and Selenium scrapers); replaces AutoThrottle
+AUTOTHROTTLE_ENABLED = False
+ADAPTIVE_RATE_ENABLED = True
+ADAPTIVE_RATE_MIN_DELAY = 0.25  # fastest pace on a healthy host, seconds
+ADAPTIVE_RATE_MAX_DELAY = 30  # slowest pace after repeated 429/5xx, seconds
+ADAPTIVE_RATE_MAX_CONCURRENCY = 4  # requests in flight per host at most
+ADAPTIVE_RATE_TARGET_LATENCY = 2.0  # no speed-up while responses are slower than this
 
 # Enable and configure HTTP caching to avoid re-downloading pages
+# Shared with main_old.py / scraper_fixed_modal.py through http_cache.HttpCache
 HTTPCACHE_ENABLED = True
-HTTPCACHE_EXPIRATION_SECS = 0  # Don't use cache for freshness
+HTTPCACHE_EXPIRATION_SECS = 0  # Expiry handled by SHARED_HTTP_CACHE_TTL + revalidation
+HTTPCACHE_STORAGE = 'traveloka.httpcache.SharedCacheStorage'
+HTTPCACHE_POLICY = 'traveloka.httpcache.SharedCachePolicy'
+HTTPCACHE_IGNORE_RESPONSE_CACHE_CONTROLS = ['no-cache', 'no-store']
+SHARED_HTTP_CACHE_PATH = '.cache/http.sqlite'
+SHARED_HTTP_CACHE_TTL = 6 * 3600  # Serve without revalidating for 6 hours
+SHARED_HTTP_CACHE_MAX_MB = 200  # LRU eviction above this size
+
+# Render requests flagged meta={'browser': True} in pooled headless Chrome
+DOWNLOADER_MIDDLEWARES = {
+    'traveloka.middlewares.BrowserDownloaderMiddleware': 543,
+    # Next to the downloader, so it sees every response before retries / the cache
+    'traveloka.middlewares.AdaptiveRateMiddleware': 950,
+}
+BROWSER_POOL_SIZE = 2  # Chrome instances rendering at the same time
+BROWSER_PAGES_PER_DRIVER = 50  # relaunch a browser after this many pages
+BROWSER_TIMEOUT = 15  # ceiling for each in-page wait, seconds
+BROWSER_LOAD_PROFILE = 'lean'  # load_profile.PROFILES: 'lean' skips images/fonts/media/trackers
 
 # Configure item pipelines
 ITEM_PIPELINES = {
     'traveloka.pipelines.TravelokaPipeline': 300,
 }
 
+# Per-store output written by TravelokaPipeline (output/<store>/results.jsonl, coupons.csv)
+PIPELINE_OUTPUT_DIR = 'output'
+PIPELINE_BATCH_SIZE = 50  # items buffered per store before flushing to disk
+# Coupons seen on every store across crawls (dedupe_index), '' to switch off;
+# the crawl ends with output/unique_coupons.json
+DEDUPE_INDEX_PATH = '.cache/dedupe.sqlite'
+
 # Export settings
 FEEDS = {
     'output/coupons.jsonl': {
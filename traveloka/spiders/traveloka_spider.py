@@ -1,38 +1,102 @@
+import re
 import scrapy
-import json
 from datetime import datetime
+from pathlib import Path
 import random
-import time
+
+from scrapy.utils.gz import gunzip
+from scrapy.utils.sitemap import Sitemap
+
+from dedupe_index import coupon_key, normalize_code, normalize_title
+from extraction_rules import DISCOUNT_MARKER, TITLE_KEYWORDS
+from traveloka.items import CouponItem, OfferItem
+from voucher_resolver import code_from_html
 
 
 class TravelokaCouponSpider(scrapy.Spider):
     """
     Spider to scrape Traveloka coupons and offers from Singapore
     Configured to mimic real user behavior and avoid bot detection
+    
+    Store pages to crawl (spider arguments, default: the Traveloka page):
+        scrapy crawl traveloka_coupon -a url=https://www.cuponation.com.sg/agoda-promo-code
+        scrapy crawl traveloka_coupon -a urls_file=stores.txt
+        scrapy crawl traveloka_coupon -a sitemap=https://www.cuponation.com.sg/sitemap.xml
+    sitemap_filter (regex) picks store pages out of the sitemap
+    
+    -a codes=1 renders store pages in the pooled headless browser
+    (BrowserDownloaderMiddleware) to resolve every SEE PROMO CODE voucher,
+    then fetches the vouchers over plain HTTP, using the browser again only
+    for vouchers whose code is not in the server HTML
     """
-    names = 'traveloka_coupon'
+    name = 'traveloka_coupon'
     allowed_domains = ['cuponation.com.sg']
     start_urls = ['https://www.cuponation.com.sg/traveloka-promo-code']
     
-    def __init__(self, *args, **kwargs):
+    def __init__(self, url=None, urls_file=None, sitemap=None,
+                 sitemap_filter=r'-(promo-code|coupon|discount-code|voucher)s?/?$', codes=False,
+                 *args, **kwargs):
         super(TravelokaCouponSpider, self).__init__(*args, **kwargs)
-        self.coupons = []
-        self.offers = []
+        if urls_file:
+            self.start_urls = self.read_urls(urls_file)
+        elif url:
+            self.start_urls = [url]
+        self.sitemap = sitemap
+        self.sitemap_filter = re.compile(sitemap_filter)
+        self.codes = codes not in (False, '0', 'false', 'no')
+    
+    @staticmethod
+    def read_urls(path):
+        """Store URLs from a text file, one per line (# comments allowed)"""
+        urls = []
+        for line in Path(path).read_text(encoding='utf-8').splitlines():
+            line = line.strip()
+            if line and not line.startswith('#'):
+                urls.append(line)
+        return urls
     
     def start_requests(self):
         """Override to add random delays and proper headers"""
+        if self.sitemap:
+            yield scrapy.Request(self.sitemap, callback=self.parse_sitemap)
+            return
         for url in self.start_urls:
-            # Add random delay to simulate human browsing
-            yield scrapy.Request(
-                url,
-                callback=self.parse,
-                headers={
-                    'User-Agent': self.get_random_user_agent(),
-                    'Referer': 'https://www.google.com/',
-                },
-                dont_obey_robotstxt=False,
-                meta={'dont_cache': True}
-            )
+            yield self.store_request(url)
+    
+    def store_request(self, url):
+        """Request for one store page"""
+        meta = {'store_url': url}
+        if self.codes:
+            meta.update(browser=True, browser_actions=['load_more', 'vouchers'])
+        return scrapy.Request(
+            url,
+            callback=self.parse,
+            headers={
+                'User-Agent': self.get_random_user_agent(),
+                'Referer': 'https://www.google.com/',
+            },
+            meta=meta
+        )
+    
+    def parse_sitemap(self, response):
+        """Follow nested sitemaps and request every store page listed"""
+        body = response.body
+        if response.url.endswith('.gz'):
+            body = gunzip(body)
+        try:
+            sitemap = Sitemap(body)
+        except Exception as e:
+            self.logger.warning(f'Unreadable sitemap {response.url}: {e}')
+            return
+        
+        if sitemap.type == 'sitemapindex':
+            for entry in sitemap:
+                yield scrapy.Request(entry['loc'], callback=self.parse_sitemap)
+        else:
+            stores = [entry['loc'] for entry in sitemap if self.sitemap_filter.search(entry['loc'])]
+            self.logger.info(f'{len(stores)} store pages in {response.url}')
+            for url in stores:
+                yield self.store_request(url)
     
     def get_random_user_agent(self):
         """Return a random user agent to avoid bot detection"""
@@ -50,6 +114,8 @@ class TravelokaCouponSpider(scrapy.Spider):
         Parse the main page to extract coupons and offers
         """
         self.logger.info(f'Parsing: {response.url}')
+        store_url = response.meta.get('store_url', response.url)
+        seen = set()
         
         # Extract all coupon containers
         coupon_items = response.css('article.coupon-code, div.coupon-item')
@@ -70,87 +136,149 @@ class TravelokaCouponSpider(scrapy.Spider):
                 code_text = parent.xpath('.//text()[contains(., "OFF") or contains(., "CREDITS") or contains(., "GIFTCARD")]').getall()
                 expiry_text = parent.xpath('.//text()[contains(., "/")]').getall()
                 
-                coupon_code = next((t.strip() for t in code_text if 'OFF' in t or 'CREDITS' in t or 'GIFTCARD' in t), 'N/A')
+                coupon_code = next((t.strip() for t in code_text if DISCOUNT_MARKER.search(t)), 'N/A')
                 expiry_date = next((t.strip() for t in expiry_text if '/' in t and len(t) <= 15), 'N/A')
                 
-                if description:
-                    self.coupons.append({
-                        'type': 'coupon',
-                        'description': description,
-                        'code': coupon_code,
-                        'expiry_date': expiry_date,
-                        'scraped_at': datetime.now().isoformat()
-                    })
+                if not description or coupon_code == 'N/A':
+                    continue
+                seen.add((normalize_title(description), normalize_code(coupon_code)))
+                if expiry_date != 'N/A':
                     coupons_parsed += 1
+                    yield CouponItem(
+                        type='coupon',
+                        store_url=store_url,
+                        description=description,
+                        code=coupon_code,
+                        expiry_date=expiry_date,
+                        scraped_at=datetime.now().isoformat()
+                    )
+                else:
+                    yield OfferItem(
+                        type='offer',
+                        store_url=store_url,
+                        description=description,
+                        discount=coupon_code,
+                        scraped_at=datetime.now().isoformat()
+                    )
             except Exception as e:
                 self.logger.warning(f'Error parsing coupon: {e}')
                 continue
         
         self.logger.info(f'Parsed {coupons_parsed} coupons')
         
-        # Log and save results
-        self.logger.info(f'Total coupons found: {len(self.coupons)}')
+        # Text-based pass as fallback for better results (skipping what the
+        # heading pass already yielded)
+        for item in self.parse_with_text(response):
+            key = (normalize_title(item['description']), normalize_code(item.get('code', item.get('discount'))))
+            if key not in seen:
+                seen.add(key)
+                yield item
         
-        # Parse using BeautifulSoup as fallback for better results
-        yield self.parse_with_text(response)
+        # Voucher URLs resolved by the browser middleware (-a codes=1)
+        cards = response.meta.get('cards', [])
+        for i, voucher_url in enumerate(response.meta.get('voucher_urls') or []):
+            if voucher_url and i < len(cards):
+                yield scrapy.Request(
+                    voucher_url,
+                    callback=self.parse_voucher,
+                    headers={'Referer': store_url},
+                    meta={'store_url': store_url, 'card': cards[i]},
+                    dont_filter=True
+                )
+    
+    def parse_voucher(self, response):
+        """Promo code from a voucher page; re-render it in the browser if the HTML lacks it"""
+        card = response.meta['card']
+        code = code_from_html(response.text)
+        if code:
+            yield CouponItem(
+                type='coupon',
+                store_url=response.meta['store_url'],
+                description=card['title'].strip()[:140] or 'N/A',
+                code=code,
+                expiry_date=card['expiry'],
+                scraped_at=datetime.now().isoformat(),
+                voucher_url=response.request.url
+            )
+        elif not response.meta.get('browser'):
+            yield response.request.replace(
+                meta=dict(response.meta, browser=True, browser_actions=['code']),
+                dont_filter=True
+            )
+        else:
+            self.logger.warning(f'No code found for "{card["title"][:40]}" at {response.url}')
     
     def parse_with_text(self, response):
         """
         Alternative parsing method using text content
         This is more reliable for dynamic content
+        
+        Single pass over the text nodes: each node is classified once (discount
+        marker / short date) and next-marker / last-date indexes give every
+        title its code and expiry from the following 9 nodes in O(1)
         """
+        store_url = response.meta.get('store_url', response.url)
+        scraped_at = datetime.now().isoformat()
+        
         # Extract all text nodes containing titles and relevant info
-        all_text = response.xpath('//text()').getall()
+        # (plain lxml strings, no Selector object per node)
+        all_text = response.selector.root.xpath('//text()', smart_strings=False)
+        n = len(all_text)
+        stripped = [t.strip() for t in all_text]
+        
+        # next_marker[j]: first node >= j with a discount marker (n if none)
+        next_marker = [n] * (n + 1)
+        for j in range(n - 1, -1, -1):
+            next_marker[j] = j if DISCOUNT_MARKER.search(stripped[j]) else next_marker[j + 1]
+        # last_date[j]: last node < j that looks like a date (-1 if none)
+        last_date = [-1] * (n + 1)
+        for j, t in enumerate(stripped):
+            last_date[j + 1] = j if '/' in t and len(t) <= 15 else last_date[j]
         
         coupon_patterns = []
         offer_patterns = []
+        seen = set()
         
         # Look for patterns in the extracted text
         for i, text in enumerate(all_text):
-            text_lower = text.lower().strip()
-            
             # Check if this looks like a coupon/offer title
-            if any(keyword in text_lower for keyword in ['enjoy', 'save', 'get', 'book', 'take', 'claim', 'pay', 'score', 'grab', 'apply', 'redeem', 'spend', 'discover', 'explore', 'refer', 'stay']):
-                if len(text) > 10 and len(text) < 250:
-                    # Look ahead for code and expiry
-                    code = 'N/A'
-                    expiry = 'N/A'
-                    
-                    # Check next few items for code (OFF, %)
-                    for j in range(i+1, min(i+10, len(all_text))):
-                        next_text = all_text[j].strip()
-                        if 'OFF' in next_text or 'CREDITS' in next_text or 'GIFTCARD' in next_text:
-                            code = next_text
-                            break
-                        if '/' in next_text and len(next_text) <= 15:
-                            expiry = next_text
-                    
-                    # If we found code or expiry, it's likely a coupon
-                    if code != 'N/A' and expiry != 'N/A':
-                        coupon_patterns.append({
-                            'type': 'coupon',
-                            'description': text.strip(),
-                            'code': code,
-                            'expiry_date': expiry,
-                            'scraped_at': datetime.now().isoformat()
-                        })
-                    elif code != 'N/A':
-                        offer_patterns.append({
-                            'type': 'offer',
-                            'description': text.strip(),
-                            'discount': code,
-                            'scraped_at': datetime.now().isoformat()
-                        })
-        
-        # Remove duplicates
-        seen = set()
-        unique_coupons = []
-        for coupon in coupon_patterns:
-            key = (coupon['description'], coupon['code'])
-            if key not in seen:
-                seen.add(key)
-                unique_coupons.append(coupon)
+            if not (10 < len(text) < 250) or not TITLE_KEYWORDS.search(text.lower()):
+                continue
+            
+            # Look ahead (next 9 nodes) for code (OFF, %) and expiry before it
+            end = min(i + 10, n)
+            code_at = next_marker[i + 1]
+            if code_at >= end:
+                continue
+            code = stripped[code_at]
+            expiry_at = last_date[code_at]
+            description = text.strip()
+            
+            # If we found code and expiry, it's likely a coupon
+            if expiry_at > i:
+                key = coupon_key(code, description, stripped[expiry_at])
+                if key not in seen:
+                    seen.add(key)
+                    coupon_patterns.append(CouponItem(
+                        type='coupon',
+                        store_url=store_url,
+                        description=description,
+                        code=code,
+                        expiry_date=stripped[expiry_at],
+                        scraped_at=scraped_at
+                    ))
+            else:
+                key = ('offer', normalize_title(description), normalize_code(code))
+                if key not in seen:
+                    seen.add(key)
+                    offer_patterns.append(OfferItem(
+                        type='offer',
+                        store_url=store_url,
+                        description=description,
+                        discount=code,
+                        scraped_at=scraped_at
+                    ))
         
         # Yield all extracted items
-        for coupon in unique_coupons:
-            yield coupon
+        for item in coupon_patterns + offer_patterns:
+            yield item
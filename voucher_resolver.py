@@ -0,0 +1,153 @@
+"""
+Direct voucher-URL resolution
+Harvests the voucher page URL behind every SEE PROMO CODE button from the
+store page in one script call (window.open and target=_blank links are
+intercepted, so no tabs open), then fetches each voucher page over plain
+HTTP and reads the code from the HTML - no click, tab switch or store page
+reload per coupon. Vouchers whose modal is only rendered client-side come
+back as None so the caller can fall back to the browser.
+"""
+
+import random
+import re
+
+import requests
+from bs4 import BeautifulSoup
+
+from code_capture import looks_like_code
+from http_cache import cached_get
+from rate_control import retry_after_of, shared as shared_rate_control
+
+
+USER_AGENTS = [
+    'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
+    'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/92.0.4515.131 Safari/537.36',
+    'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
+    'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
+]
+
+# Clicks every button in one JS task with window.open and link navigation
+# intercepted; returns the URL each click tried to open (null if none)
+HARVEST_JS = """
+const buttons = arguments[0];
+let current = [];
+const fakeWindow = () => {
+    const loc = {};
+    Object.defineProperty(loc, 'href', {set: v => current.push(String(v)), get: () => ''});
+    const w = {focus() {}, close() {}, opener: null};
+    Object.defineProperty(w, 'location', {set: v => current.push(String(v)), get: () => loc});
+    return w;
+};
+const realOpen = window.open;
+window.open = function (url) {
+    if (url) current.push(new URL(url, location.href).href);
+    return fakeWindow();
+};
+const onLink = e => {
+    const a = e.target.closest && e.target.closest('a[href]');
+    if (a && a.target === '_blank') {
+        current.push(a.href);
+        e.preventDefault();
+    }
+};
+document.addEventListener('click', onLink, true);
+
+const urls = buttons.map(btn => {
+    current = [];
+    try { btn.click(); } catch (e) {}
+    return current.length ? current[0] : null;
+});
+
+document.removeEventListener('click', onLink, true);
+window.open = realOpen;
+return urls;
+"""
+
+COPY_TEXT = re.compile(r'copy', re.I)
+
+
+def harvest_voucher_urls(driver, promo_buttons):
+    """Voucher URL for each button (same order), None where the click opened nothing"""
+    return driver.execute_script(HARVEST_JS, promo_buttons) or []
+
+
+def code_from_html(html):
+    """Promo code from a server-rendered voucher modal, or None"""
+    soup = BeautifulSoup(html, 'html.parser')
+
+    # Value shown next to the COPY button
+    for btn in soup.find_all('button', string=COPY_TEXT):
+        box = btn.parent
+        for _ in range(4):
+            if box is None:
+                break
+            for field in box.find_all(['input', 'textarea']):
+                value = (field.get('value') or field.get_text()).strip()
+                if looks_like_code(value):
+                    return value
+            for el in box.find_all(['h4', 'code']):
+                text = el.get_text(strip=True)
+                if looks_like_code(text):
+                    return text
+            for el in box.find_all(['span', 'div', 'p']):
+                if el.find(True) is None:
+                    text = el.get_text(strip=True)
+                    if looks_like_code(text, leaf=True) and not COPY_TEXT.fullmatch(text):
+                        return text
+            box = box.parent
+
+    # Same h4 fallback as the browser path
+    for h4 in soup.find_all('h4'):
+        text = h4.get_text(strip=True)
+        if looks_like_code(text):
+            return text
+
+    return None
+
+
+class VoucherResolver:
+    """
+    Fetch voucher pages over a plain requests session
+    Carries over the browser's cookies so the voucher page sees the same
+    consent/session state as the tab the click would have opened
+    Network fetches are paced by rate (default: the shared RateController)
+    """
+
+    def __init__(self, cookies=None, referer=None, user_agent=None, timeout=15, cache=None, rate=None):
+        self.session = requests.Session()
+        self.session.headers.update({
+            'User-Agent': user_agent or random.choice(USER_AGENTS),
+            'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
+            'Accept-Language': 'en-US,en;q=0.5',
+            'Accept-Encoding': 'gzip, deflate',
+            'Connection': 'keep-alive',
+            'Referer': referer or 'https://www.google.com/',
+        })
+        for c in cookies or []:
+            self.session.cookies.set(c['name'], c['value'], domain=c.get('domain'), path=c.get('path', '/'))
+        self.timeout = timeout
+        self.cache = cache
+        self.rate = rate or shared_rate_control()
+
+    def fetch_code(self, voucher_url):
+        """Code from a voucher page, None if it is missing or not in the HTML"""
+        if not voucher_url:
+            return None
+        try:
+            if self.cache and self.cache.is_fresh(self.cache.get(voucher_url)):
+                html, _ = cached_get(self.session, voucher_url, self.cache)
+            else:
+                with self.rate.request(voucher_url) as outcome:
+                    if self.cache:
+                        html, _ = cached_get(self.session, voucher_url, self.cache,
+                                             timeout=self.timeout, allow_redirects=True)
+                    else:
+                        response = self.session.get(voucher_url, timeout=self.timeout, allow_redirects=True)
+                        outcome['status'] = response.status_code
+                        outcome['retry_after'] = retry_after_of(response.headers)
+                        response.raise_for_status()
+                        html = response.text
+        except requests.exceptions.RequestException as e:
+            print(f"  [WARN] Voucher fetch failed: {str(e)[:60]}")
+            return None
+        return code_from_html(html)
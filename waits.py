@@ -0,0 +1,182 @@
+"""
+Event-driven waits for the Selenium scraper
+Every wait returns as soon as its DOM condition holds, with a timeout ceiling
+instead of a fixed sleep, and records how long it actually took per step
+"""
+
+import time
+
+from selenium.common.exceptions import TimeoutException, WebDriverException
+from selenium.webdriver.common.by import By
+from selenium.webdriver.support.ui import WebDriverWait
+
+
+COPY_BUTTON_XPATH = "//button[contains(translate(text(), 'ABCDEFGHIJKLMNOPQRSTUVWXYZ', 'abcdefghijklmnopqrstuvwxyz'), 'copy')]"
+LOAD_MORE_XPATH = "//button[contains(text(), 'Load More')] | //a[contains(text(), 'Load More')]"
+
+# Runs inside the page (execute_async_script): scroll to the bottom, click a
+# visible Load More, and let a MutationObserver watch the card count. Every
+# time new cards arrive it scrolls / clicks again; once no card has arrived
+# for settle ms (pending ms right after a Load More click, which has to go to
+# the network) it calls back with the final count
+LAZY_LOAD_JS = """
+const [cardXPath, moreXPath, settleMs, pendingMs, timeoutMs, done] = arguments;
+const started = performance.now();
+
+function count() {
+    return document.evaluate('count(' + cardXPath + ')', document, null, XPathResult.NUMBER_TYPE, null).numberValue;
+}
+
+function loadMore() {
+    const btn = document.evaluate(moreXPath, document, null, XPathResult.FIRST_ORDERED_NODE_TYPE, null).singleNodeValue;
+    return btn && btn.offsetParent !== null && !btn.disabled ? btn : null;
+}
+
+let last = count(), clicks = 0, rounds = 0, finished = false, settleTimer = null;
+
+function finish(timedOut) {
+    if (finished) return;
+    finished = true;
+    observer.disconnect();
+    clearTimeout(settleTimer);
+    clearTimeout(limit);
+    done({count: count(), clicks: clicks, rounds: rounds, timed_out: timedOut,
+          ms: Math.round(performance.now() - started)});
+}
+
+function nudge() {
+    rounds++;
+    window.scrollTo(0, document.body.scrollHeight);
+    const more = loadMore();
+    if (more) {
+        more.click();
+        clicks++;
+    }
+    clearTimeout(settleTimer);
+    settleTimer = setTimeout(() => finish(false), more ? pendingMs : settleMs);
+}
+
+const observer = new MutationObserver(() => {
+    const now = count();
+    if (now !== last) {
+        last = now;
+        nudge();
+    }
+});
+observer.observe(document.body, {childList: true, subtree: true});
+const limit = setTimeout(() => finish(true), timeoutMs);
+nudge();
+"""
+
+
+class Waiter:
+    """
+    Wraps WebDriverWait with per-step timing stats
+    - timeout: default ceiling in seconds for every wait
+    - poll: how often conditions are re-checked
+    - metrics / store: also report every wait to a metrics.RunMetrics as
+      stage 'wait.<step>' for that store
+    """
+
+    def __init__(self, driver, timeout=10, poll=0.1, metrics=None, store=None):
+        self.driver = driver
+        self.timeout = timeout
+        self.poll = poll
+        self.stats = {}
+        self.metrics = metrics
+        self.store = store
+        # Under the eager page load strategy the load event is not waited for
+        capabilities = getattr(driver, 'capabilities', None) or {}
+        self.eager = capabilities.get('pageLoadStrategy') == 'eager'
+
+    def record(self, step, seconds, timed_out):
+        """Add one wait duration to the stats for a step"""
+        s = self.stats.setdefault(step, {'count': 0, 'total': 0.0, 'max': 0.0, 'timeouts': 0})
+        s['count'] += 1
+        s['total'] += seconds
+        s['max'] = max(s['max'], seconds)
+        if timed_out:
+            s['timeouts'] += 1
+        if self.metrics:
+            self.metrics.record(f'wait.{step}', seconds, self.store, ok=not timed_out)
+
+    def until(self, step, condition, timeout=None):
+        """Poll condition(driver) until it returns something truthy, None on timeout"""
+        started = time.time()
+        try:
+            result = WebDriverWait(
+                self.driver, timeout if timeout is not None else self.timeout,
+                poll_frequency=self.poll,
+                ignored_exceptions=(WebDriverException,)
+            ).until(condition)
+            self.record(step, time.time() - started, False)
+            return result
+        except TimeoutException:
+            self.record(step, time.time() - started, True)
+            return None
+
+    def page_ready(self, step='page_ready', timeout=None):
+        """document.readyState == 'complete' ('interactive' is enough for an eager driver)"""
+        ready = ('interactive', 'complete') if self.eager else ('complete',)
+        return self.until(
+            step,
+            lambda d: d.execute_script("return document.readyState") in ready,
+            timeout
+        )
+
+    def count_stable(self, xpath, step='count_stable', settle=1.0, timeout=None):
+        """Wait until at least one element matches and the count stops changing for `settle` seconds"""
+        state = {'count': -1, 'since': time.time()}
+
+        def stable(d):
+            count = len(d.find_elements(By.XPATH, xpath))
+            now = time.time()
+            if count != state['count']:
+                state['count'] = count
+                state['since'] = now
+                return False
+            if count > 0 and now - state['since'] >= settle:
+                return count
+            return False
+
+        return self.until(step, stable, timeout)
+
+    def new_window(self, known_windows, expected=1, step='new_window', timeout=None):
+        """Wait until `expected` window handles exist that are not in known_windows"""
+        def opened(d):
+            new = [w for w in d.window_handles if w not in known_windows]
+            return new if len(new) >= expected else False
+
+        return self.until(step, opened, timeout)
+
+    def code_visible(self, step='code_visible', timeout=None):
+        """Wait for the voucher modal: a COPY button or an h4 holding the code"""
+        def visible(d):
+            for el in d.find_elements(By.XPATH, COPY_BUTTON_XPATH + " | //h4"):
+                if el.is_displayed() and el.text.strip():
+                    return True
+            return False
+
+        return self.until(step, visible, timeout)
+
+    def cards_loaded(self, card_xpath, load_more_xpath=LOAD_MORE_XPATH, step='lazy_load',
+                     settle=0.8, pending=3.0, timeout=30):
+        """
+        Load every lazily added card: scroll / click Load More until the number
+        of card_xpath matches stops growing (see LAZY_LOAD_JS). Returns
+        {count, clicks, rounds, timed_out, ms}, None if the script failed.
+        A short page returns after `settle` seconds; a long one keeps going
+        for as long as cards keep arriving, up to `timeout`.
+        """
+        started = time.time()
+        result = None
+        try:
+            self.driver.set_script_timeout(timeout + 5)
+            result = self.driver.execute_async_script(
+                LAZY_LOAD_JS, card_xpath, load_more_xpath,
+                int(settle * 1000), int(pending * 1000), int(timeout * 1000)
+            )
+        except WebDriverException:
+            pass
+        self.record(step, time.time() - started, not result or result['timed_out'])
+        return result